@@ -0,0 +1,321 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+import dejavu
+
+def make_payload(items, rng):
+    return [
+        {
+            "id": i,
+            "name": f"customer-{i}",
+            "active": rng.random() < 0.5,
+            "balance": round(rng.uniform(0, 10000), 2),
+            "address": {"street": f"{i} Main St", "city": "Madison", "zip": str(53700 + i % 100).zfill(5)},
+            "tags": ["a", "b", "c"]
+        }
+        for i in range(items)
+    ]
+
+def diverge(payload, changes, rng):
+    payload = json.loads(json.dumps(payload))
+    for _ in range(changes):
+        item = rng.choice(payload)
+        item["balance"] = round(item["balance"] + 1, 2)
+        item["address"].pop("zip", None)
+    return payload
+
+def make_response(payload, indent=None):
+    response = requests.Response()
+    response.status_code = 200
+    response._content = json.dumps(payload, indent=indent).encode()
+    response.encoding = "utf-8"
+    return response
+
+def time_engine(engine, legacy_response, migrated_response, repeat):
+    dejavu.diff_rules = dejavu.validate_diff({"engine": engine})
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        removed, changes = dejavu.compare_responses(legacy_response, migrated_response)
+        best = min(best, time.perf_counter() - start)
+    return best, len(removed) + len(changes)
+
+def benchmark_diff(args):
+    rng = random.Random(args.seed)
+    payload = make_payload(args.items, rng)
+    legacy_response = make_response(payload)
+
+    print(f"Diffing {args.items} item responses ({len(legacy_response.content) / 1024 / 1024:.1f} MB), best of {args.repeat}")
+    print(f"{'Migrated'.ljust(22)}{'deepdiff'.rjust(12)}{'fast'.rjust(12)}{'Speedup'.rjust(10)}")
+    cases = [
+        ("identical bytes", make_response(payload)),
+        ("equal, reformatted", make_response(payload, indent=1)),
+        ("1 change", make_response(diverge(payload, 1, rng))),
+        ("1% changed", make_response(diverge(payload, args.items // 100, rng))),
+        ("10% changed", make_response(diverge(payload, args.items // 10, rng)))
+    ]
+    for name, migrated_response in cases:
+        deepdiff_time, deepdiff_found = time_engine("deepdiff", legacy_response, migrated_response, args.repeat)
+        fast_time, fast_found = time_engine("fast", legacy_response, migrated_response, args.repeat)
+        if deepdiff_found != fast_found:
+            print(f"Engines disagree on {name}: deepdiff found {deepdiff_found} discrepencies, fast found {fast_found}...")
+        speedup = deepdiff_time / fast_time if fast_time > 0 else float("inf")
+        print(f"{name.ljust(22)}{dejavu.format_time(deepdiff_time).rjust(12)}{dejavu.format_time(fast_time).rjust(12)}{f'x{speedup:.1f}'.rjust(10)}")
+
+class StubHandler(BaseHTTPRequestHandler):
+    # Headers and body go out in one segment so delayed ACKs do not stall keep-alive connections
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def handle_one_request(self):
+        start = time.thread_time()
+        super().handle_one_request()
+        self.server.add_cpu(time.thread_time() - start)
+
+    def do_POST(self):
+        data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        content = self.server.respond(data)
+        time.sleep(self.server.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+class StubServer(ThreadingHTTPServer):
+    # Runs in the benchmarked process, so the CPU time of its handlers is counted and taken out of DejaVu's
+    daemon_threads = True
+
+    def __init__(self, latency, content, diverged_content, divergence):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.latency = latency
+        self.content = content
+        self.diverged_content = diverged_content
+        self.divergence = divergence
+        self.cpu = 0.0
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/items"
+
+    def respond(self, data):
+        # The same request always diverges or not, whatever order the tests run in
+        DIVERGENCE_BUCKETS = 10000
+        if zlib.crc32(data) % DIVERGENCE_BUCKETS < self.divergence * DIVERGENCE_BUCKETS:
+            return self.diverged_content
+        return self.content
+
+    def add_cpu(self, seconds):
+        with self.lock:
+            self.cpu += seconds
+
+def make_config(variations, fields, legacy_url, migrated_url, engine):
+    # The first value of every field is the stable one, every other value is one test
+    per_field, extra = divmod(variations, fields)
+    return {
+        "body": {f"field{i}": [f"$range(0, {per_field + (i < extra) + 1})"] for i in range(fields) if per_field + (i < extra) > 0},
+        "endpoints": {"legacy": legacy_url, "migrated": migrated_url, "method": "POST"},
+        "diff": {"engine": engine},
+        # Only the stubs' divergence should fail tests, not a migrated stub that happened to be a bit slower once
+        "latency": {"threshold": 1000}
+    }
+
+def peak_rss():
+    # ru_maxrss is in bytes on macOS and kilobytes everywhere else
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+def run_suite(variations, args):
+    rng = random.Random(args.seed)
+    payload = make_payload(args.items, rng)
+    content = json.dumps(payload).encode()
+    diverged_content = json.dumps(diverge(payload, 1, rng)).encode()
+    legacy = StubServer(args.latency / 1000, content, content, 0)
+    migrated = StubServer(args.latency / 1000, content, diverged_content, args.divergence)
+    config = make_config(variations, args.fields, legacy.url, migrated.url, args.engine)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    # Reports are still formatted and results still written, only to places nobody reads
+    with tempfile.TemporaryDirectory() as directory, open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        setup_start = time.perf_counter()
+        if args.headless:
+            dejavu.headless = True
+            dejavu.progress = dejavu.Progress()
+        dejavu.start_executors(args.concurrency)
+        dejavu.reset_input()
+        dejavu.validate_input(config)
+        dejavu.establish_baseline()
+        setup_seconds = time.perf_counter() - setup_start
+
+        stream = dejavu.ResultStream(os.path.join(directory, "benchmark.results.ndjson"))
+        sections = dejavu.make_sections(stream)
+        stub_cpu = legacy.cpu + migrated.cpu
+        cpu_start = time.process_time()
+        start = time.perf_counter()
+        for _, _, discrepencies, run_section in sections:
+            run_section(discrepencies)
+        stream.close()
+        seconds = time.perf_counter() - start
+        cpu = time.process_time() - cpu_start
+        stub_cpu = legacy.cpu + migrated.cpu - stub_cpu
+    traced_peak = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+    tracemalloc.stop()
+    legacy.shutdown()
+    migrated.shutdown()
+
+    tests = sum(discrepencies.passed + discrepencies.failed for _, _, discrepencies, _ in sections)
+    return {
+        "variations": variations,
+        "tests": tests,
+        "failed": sum(discrepencies.failed for _, _, discrepencies, _ in sections),
+        "discrepencies": sum(len(discrepencies) for _, _, discrepencies, _ in sections),
+        "setup_seconds": setup_seconds,
+        "seconds": seconds,
+        "tests_per_second": tests / seconds if seconds > 0 else None,
+        "cpu_per_test": (cpu - stub_cpu) / tests if tests > 0 else None,
+        "stub_cpu_per_test": stub_cpu / tests if tests > 0 else None,
+        "peak_rss_bytes": peak_rss(),
+        "peak_traced_bytes": traced_peak
+    }
+
+def git_revision():
+    directory = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=directory, capture_output=True, text=True)
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=directory, capture_output=True, text=True)
+    except OSError:
+        return None, None
+    if commit.returncode != 0:
+        return None, None
+    return commit.stdout.strip(), len(status.stdout.strip()) > 0
+
+def format_bytes(size):
+    if size is None:
+        return "-"
+    BYTES_IN_MEGABYTE = 1024 * 1024
+    return f"{size / BYTES_IN_MEGABYTE:.1f} MB"
+
+def format_rate(rate):
+    return "-" if rate is None else f"{rate:.1f}"
+
+def format_cpu(seconds):
+    MICROSECONDS_IN_SECOND = 1000000
+    return "-" if seconds is None else f"{seconds * MICROSECONDS_IN_SECOND:.0f} us"
+
+def print_suite_run(run):
+    print(f"{str(run['variations']).rjust(10)}{str(run['tests']).rjust(10)}{str(run['failed']).rjust(10)}{format_rate(run['tests_per_second']).rjust(12)}{format_cpu(run['cpu_per_test']).rjust(14)}{format_cpu(run['stub_cpu_per_test']).rjust(14)}{format_bytes(run['peak_rss_bytes']).rjust(12)}{format_bytes(run['peak_traced_bytes']).rjust(12)}")
+
+def compare_suite(previous, suite):
+    if previous["settings"] != suite["settings"]:
+        print(f"The runs in {previous['commit']} used different settings, {previous['settings']}, so they may not be comparable...")
+    previous_runs = {run["variations"]: run for run in previous["runs"]}
+    print(f"\nCompared to {previous['commit'] or 'an unknown commit'}{' (with uncommitted changes)' if previous['dirty'] else ''} from {previous['time']}")
+    print(f"{'Variations'.rjust(10)}{'Tests/sec'.rjust(22)}{'Change'.rjust(10)}{'CPU/test'.rjust(26)}{'Change'.rjust(10)}")
+    for run in suite["runs"]:
+        before = previous_runs.get(run["variations"])
+        if before is None or None in [before["tests_per_second"], run["tests_per_second"], before["cpu_per_test"], run["cpu_per_test"]]:
+            continue
+        rates = f"{format_rate(before['tests_per_second'])} -> {format_rate(run['tests_per_second'])}"
+        rate_change = 100 * (run["tests_per_second"] / before["tests_per_second"] - 1)
+        cpus = f"{format_cpu(before['cpu_per_test'])} -> {format_cpu(run['cpu_per_test'])}"
+        cpu_change = 100 * (run["cpu_per_test"] / before["cpu_per_test"] - 1) if before["cpu_per_test"] > 0 else 0
+        print(f"{str(run['variations']).rjust(10)}{rates.rjust(22)}{f'{rate_change:+.1f}%'.rjust(10)}{cpus.rjust(26)}{f'{cpu_change:+.1f}%'.rjust(10)}")
+
+def benchmark_suite(args):
+    if args.previous is not None and not os.path.isfile(args.previous):
+        print(f"Previous benchmark {args.previous} does not exist...")
+        sys.exit()
+    commit, dirty = git_revision()
+    settings = {
+        "items": args.items,
+        "latency": args.latency,
+        "divergence": args.divergence,
+        "concurrency": args.concurrency,
+        "fields": args.fields,
+        "engine": args.engine,
+        "seed": args.seed,
+        "tracemalloc": args.tracemalloc,
+        "headless": args.headless
+    }
+    print(f"Benchmarking DejaVu at {commit or 'an unknown commit'}{' (with uncommitted changes)' if dirty else ''} against local stubs, {args.items} item responses, {args.latency}ms latency, {100 * args.divergence:g}% divergence, concurrency {args.concurrency}{', headless' if args.headless else ''}")
+    print(f"{'Variations'.rjust(10)}{'Tests'.rjust(10)}{'Failed'.rjust(10)}{'Tests/sec'.rjust(12)}{'CPU/test'.rjust(14)}{'Stub/test'.rjust(14)}{'Peak RSS'.rjust(12)}{'Traced'.rjust(12)}")
+    runs = []
+    for variations in args.variations:
+        # A fresh process per size keeps its peak memory from being hidden by a larger size's
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            runs.append(pool.submit(run_suite, variations, args).result())
+        print_suite_run(runs[-1])
+
+    suite = {
+        "commit": commit,
+        "dirty": dirty,
+        "time": dejavu.report_time().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": settings,
+        "runs": runs
+    }
+    output_file_path = args.output
+    if output_file_path is None:
+        os.makedirs("results", exist_ok=True)
+        output_file_path = os.path.join("results", f"benchmark-{commit or 'unknown'}-{dejavu.report_time().strftime('%Y-%m-%d_%H;%M;%S')}.json")
+    with open(output_file_path, 'w') as file:
+        json.dump(suite, file, indent=4)
+    print(f"\nSaved to {output_file_path}")
+
+    if args.previous is not None:
+        compare_suite(dejavu.read_json(args.previous), suite)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark DejaVu itself.")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    diff_parser = subparsers.add_parser("diff", help="Compare the fast and deepdiff diff engines on large responses")
+    diff_parser.add_argument('--items', type=int, default=20000, help="Number of items in the benchmarked list responses")
+    diff_parser.add_argument('--repeat', type=int, default=3, help="Number of times to time each engine")
+    diff_parser.add_argument('--seed', type=int, default=0, help="Seed for the generated responses")
+
+    suite_parser = subparsers.add_parser("suite", help="Run DejaVu end to end against local stub servers and measure its own overhead")
+    suite_parser.add_argument('--variations', type=int, nargs='+', default=[10, 1000, 10000], help="Number of variations in each synthetic config, up to 100000")
+    suite_parser.add_argument('--items', type=int, default=20, help="Number of items in every stub response")
+    suite_parser.add_argument('--latency', type=float, default=0, help="Milliseconds the stubs wait before responding")
+    suite_parser.add_argument('--divergence', type=float, default=0.1, help="Fraction of variations migrated responds differently to")
+    suite_parser.add_argument('--concurrency', type=int, default=8, help="Number of variations DejaVu tests at once")
+    suite_parser.add_argument('--fields', type=int, default=4, help="Number of body fields the variations are spread across")
+    suite_parser.add_argument('--engine', type=str, default="fast", choices=dejavu.DIFF_ENGINES, help="Diff engine to benchmark")
+    suite_parser.add_argument('--headless', action='store_true', help="Benchmark DejaVu the way --headless runs it, without printing every test")
+    suite_parser.add_argument('--tracemalloc', action='store_true', help="Also trace the peak Python heap, which slows DejaVu down")
+    suite_parser.add_argument('--output', type=str, help="Path to save the results to, results/benchmark-<commit>-<time>.json by default")
+    suite_parser.add_argument('--compare', dest='previous', type=str, help="Path to a saved benchmark to compare against")
+    suite_parser.add_argument('--seed', type=int, default=0, help="Seed for the stub responses")
+
+    args = parser.parse_args()
+    if args.benchmark == "diff":
+        benchmark_diff(args)
+    elif args.benchmark == "suite":
+        if any(variations < 1 for variations in args.variations) or not 0 <= args.divergence <= 1 or args.latency < 0 or args.concurrency < 1 or args.fields < 1 or args.items < 1:
+            print(f"Variations, items, concurrency and fields must be positive, latency non-negative and divergence between 0 and 1...")
+            sys.exit()
+        benchmark_suite(args)
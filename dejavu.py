@@ -2,47 +2,802 @@ import argparse
 import sys
 import json
 import requests
-from deepdiff import DeepDiff
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib.parse import urlsplit, parse_qsl
 from requests.packages.urllib3.exceptions import InsecureRequestWarning # type: ignore
 import time
-from colorama import Fore, Back, Style, init
 import math
 import os
-from datetime import datetime
-import pytz
+import copy
+import glob
+import shutil
+import threading
+import socket
+import struct
+import hashlib
+import re
+import random
+import bisect
+import itertools
+import heapq
+import mmap
+from array import array
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import datetime, timedelta
+import atexit
+import gc
+import sqlite3
+import statistics
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+class NoColor():
+    # Stands in for colorama's Fore, Back and Style until color is turned on, so headless runs never import colorama
+    def __getattr__(self, name):
+        return ""
+
+Fore = Back = Style = NoColor()
 
 class Discrepencies():
-    def __init__(self):
-        self.discrepencies = []
+    # Discrepencies with the same fingerprint are clustered as they come in, so memory and the report
+    # grow with the number of distinct problems instead of the number of tests
+    MAX_EXAMPLES = 3
+
+    def __init__(self, section, stream=None, journal=None):
+        self.section = section
+        self.stream = stream
+        self.journal = journal
+        self.discrepencies = 0
         self.failed = 0
         self.passed = 0
+        self.clusters = {}
 
     def __len__(self):
-        return len(self.discrepencies)
-    
-    def fail(self):
-        self.failed += 1
-    
-    def success(self):
-        self.passed += 1
-
-    def add(self, attr, val, legacy_code, migrated_code):
-        self.discrepencies.append([attr, val, legacy_code, migrated_code])
+        return self.discrepencies
+
+    def add(self, result, journaled=False):
+        result["section"] = self.section
+        self.discrepencies += len(result["discrepencies"])
+        if result["passed"]: self.passed += 1
+        else: self.failed += 1
+        clustered = set()
+        for discrepency in result["discrepencies"]:
+            discrepency["fingerprint"] = fingerprint(discrepency)
+            # A test counts once towards each cluster, however many array items it changed
+            if discrepency["fingerprint"] not in clustered:
+                clustered.add(discrepency["fingerprint"])
+                self.cluster(result, discrepency)
+        if self.stream is not None:
+            self.stream.write(result)
+        if self.journal is not None and not journaled:
+            self.journal.write(result)
+        if progress is not None:
+            progress.add(result)
+
+    def cluster(self, result, discrepency):
+        cluster = self.clusters.get(discrepency["fingerprint"])
+        if cluster is None:
+            cluster = {
+                "kind": discrepency["kind"],
+                "path": collapse_indices(discrepency.get("path", "")),
+                "legacy": discrepency["legacy"],
+                "migrated": discrepency["migrated"],
+                "tests": 0,
+                "examples": []
+            }
+            self.clusters[discrepency["fingerprint"]] = cluster
+        cluster["tests"] += 1
+        if len(cluster["examples"]) < self.MAX_EXAMPLES:
+            cluster["examples"].append((result["attr"], result["value"]))
 
     def tablify(self, name):
         if self.__len__() > 0:
-            table = "|Attributes|Input|Legacy|Migrated|\n"
-            table += "|:-:|:-:|:-:|:-:|\n"
-            for attr, val, legacy_code, migrated_code in self.discrepencies:
-                val = '"' + val + '"' if type(val) == str else val
-                table += f"|`{attr}`|`{val}`|{legacy_code}|{migrated_code}|\n"
-            return table
+            yield "|Discrepency|Path|Tests|Legacy|Migrated|Examples|\n"
+            yield "|:-:|:-:|:-:|:-:|:-:|:-:|\n"
+            for cluster in sorted(self.clusters.values(), key=lambda cluster: -cluster["tests"]):
+                examples = ", ".join(f"`{attr}`: `{get_report_value(value)}`" for attr, value in cluster["examples"])
+                if cluster["tests"] > len(cluster["examples"]):
+                    examples += ", ..."
+                path = f"`{cluster['path']}`" if cluster["path"] else ""
+                yield f"|{CLUSTER_TITLES[cluster['kind']]}|{path}|{cluster['tests']}|{cluster['legacy']}|{cluster['migrated']}|{examples}|\n"
         elif self.passed == 0 and self.failed == 0:
-            return f"No testing done for **{name}**..."
+            yield f"No testing done for **{name}**..."
         else:
-            return f"No discrepencies found in the **{name} testing**..."
+            yield f"No discrepencies found in the **{name} testing**..."
+
+def collapse_indices(json_path):
+    return ARRAY_INDEX.sub(lambda match: match.group(1) or "[*]", json_path)
+
+def fingerprint(discrepency):
+    # The same problem at any position of an array, or from any input, has the same fingerprint
+    if discrepency["kind"] in ["status", "error", "compression"]:
+        return f"{discrepency['kind']} {discrepency['legacy']} {discrepency['migrated']}"
+    if discrepency["kind"] == "conditional":
+        return f"conditional {discrepency['migrated'].split()[0]}"
+    if discrepency["kind"] in ["removed", "changed", "size", "cache"]:
+        return f"{discrepency['kind']} {collapse_indices(discrepency['path'])}"
+    return discrepency["kind"]
+
+def get_report_value(value):
+    return '"' + value + '"' if type(value) == str else value
+
+class ResultStream():
+    # Each finished test is appended as one JSON line so that a crash or Ctrl-C keeps everything up to the last flush
+    BUFFER_BYTES = 64 * 1024
+    FLUSH_SECONDS = 1
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.file = open(file_path, 'a', buffering=self.BUFFER_BYTES)
+        self.flushed = time.monotonic()
+
+    def write(self, result):
+        self.file.write(json.dumps(result, default=str) + "\n")
+        if time.monotonic() - self.flushed >= self.FLUSH_SECONDS:
+            self.file.flush()
+            self.flushed = time.monotonic()
+
+    def close(self):
+        self.file.close()
+
+class Progress():
+    # Headless runs print one line every INTERVAL_SECONDS instead of a few lines for every test
+    INTERVAL_SECONDS = 10
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.printed = self.start
+        self.passed = 0
+        self.failed = 0
+
+    def add(self, result):
+        if result["passed"]: self.passed += 1
+        else: self.failed += 1
+        now = time.monotonic()
+        if now - self.printed >= self.INTERVAL_SECONDS:
+            self.printed = now
+            print(f"{self.passed + self.failed} tests, {self.failed} failed, {self.rate(now):.1f} tests/sec after {format_time(now - self.start)}", flush=True)
+
+    def rate(self, now):
+        return (self.passed + self.failed) / (now - self.start) if now > self.start else 0
+
+    def summary(self):
+        now = time.monotonic()
+        print(f"Tested {self.passed + self.failed} in {format_time(now - self.start)}, {self.rate(now):.1f} tests/sec")
+
+class Spending():
+    # Checked before each test is sent, a test already in flight always finishes and is reported
+    MIN_ERROR_REQUESTS = 20
+
+    def __init__(self, limits):
+        self.limits = limits
+        self.lock = threading.Lock()
+        self.start = time.monotonic()
+        # Every shard gets its part of the requests
+        self.max_requests = limits["requests"] / shard["count"] if limits["requests"] is not None else None
+        self.requests_per_test = requests_per_test()
+        self.sent = {"legacy": 0, "migrated": 0}
+        self.errors = {"legacy": 0, "migrated": 0}
+        self.stopped = None
+        self.attributes = {}
+
+    def record(self, side, failed):
+        with self.lock:
+            self.sent[side] += 1
+            self.errors[side] += failed
+
+    def exhausted(self, in_flight):
+        if self.stopped is None:
+            self.stopped = self.overspent(in_flight)
+        return self.stopped is not None
+
+    def overspent(self, in_flight):
+        if self.limits["time"] is not None and time.monotonic() - self.start >= self.limits["time"]:
+            return f"the time budget of {format_time(self.limits['time'])} ran out"
+        if self.max_requests is not None and sum(self.sent.values()) + (in_flight + 1) * self.requests_per_test > self.max_requests:
+            return f"the next test would have gone over the budget of {self.limits['requests']} requests"
+        if self.limits["error_rate"] is not None:
+            for side, sent in self.sent.items():
+                if sent >= self.MIN_ERROR_REQUESTS and self.errors[side] > self.limits["error_rate"] * sent:
+                    return f"{side} failed {self.errors[side] / sent:.0%} of its requests, over the budget of {self.limits['error_rate']:.0%}"
+        return None
+
+    def attribute(self, section, attr):
+        key = (section, attr)
+        state = self.attributes.get(key)
+        if state is None:
+            state = {"section": section, "attr": attr, "seen": 0, "tested": 0, "unchanged": 0, "fingerprints": set(), "probe": None}
+            self.attributes[key] = state
+        return state
+
+    def sample(self, section, attr):
+        # A converged attribute is only probed at every doubling of its position, which finds a late change in
+        # a long range with a handful of tests and leaves the rest of the budget to the attributes after it
+        state = self.attribute(section, attr)
+        state["seen"] += 1
+        if state["probe"] is not None:
+            if state["seen"] < state["probe"]:
+                return False
+            state["probe"] *= 2
+        state["tested"] += 1
+        return True
+
+    def observe(self, section, attr, result):
+        state = self.attribute(section, attr)
+        # Timing is too noisy to tell whether an attribute is still finding something new
+        fingerprints = set(discrepency["fingerprint"] for discrepency in result["discrepencies"] if discrepency["kind"] != "time")
+        if not fingerprints <= state["fingerprints"]:
+            state["fingerprints"] |= fingerprints
+            state["unchanged"] = 0
+            state["probe"] = None
+            return
+        state["unchanged"] += 1
+        if self.limits["converge"] is not None and state["unchanged"] >= self.limits["converge"] and state["probe"] is None:
+            state["probe"] = 2 * state["seen"]
+
+    def summary(self):
+        return {
+            "stopped": self.stopped,
+            "attributes": [
+                {"section": state["section"], "attr": state["attr"], "seen": state["seen"], "tested": state["tested"], "converged": state["probe"] is not None}
+                for state in self.attributes.values()
+            ]
+        }
+
+class Journal():
+    # Finished tests are fsynced in batches so a killed run loses at most the last batch
+    SYNC_RESULTS = 256
+    SYNC_SECONDS = 1
+
+    def __init__(self, file_path, resume=False):
+        self.file_path = file_path
+        self.finished = {}
+        self.resumed = 0
+        if resume and os.path.exists(file_path):
+            for result in read_results(file_path, partial=True):
+                self.finished.setdefault(self.key(result["section"], result["attr"], result["value"]), deque()).append(result)
+        if resume and os.path.exists(file_path):
+            self.truncate_partial_line()
+        self.file = open(file_path, 'a' if resume else 'w')
+        self.unsynced = 0
+        self.synced = time.monotonic()
+
+    def truncate_partial_line(self):
+        # A killed run can leave half of its last line behind, new results must not be appended onto it
+        CHUNK = 64 * 1024
+        with open(self.file_path, 'r+b') as file:
+            end = file.seek(0, os.SEEK_END)
+            position = end
+            while position > 0:
+                start = max(position - CHUNK, 0)
+                file.seek(start)
+                newline = file.read(position - start).rfind(b"\n")
+                if newline != -1:
+                    position = start + newline + 1
+                    break
+                position = start
+            if position < end:
+                file.truncate(position)
+
+    def __len__(self):
+        return sum(len(results) for results in self.finished.values())
+
+    def key(self, section, attr, value):
+        return json.dumps([section, attr, value], default=str)
+
+    def pop(self, section, attr, value):
+        # The same option can be tested more than once, so each saved result is only used once
+        results = self.finished.get(self.key(section, attr, value))
+        if not results:
+            return None
+        self.resumed += 1
+        return results.popleft()
+
+    def write(self, result):
+        self.file.write(json.dumps(result, default=str) + "\n")
+        self.unsynced += 1
+        if self.unsynced >= self.SYNC_RESULTS or time.monotonic() - self.synced >= self.SYNC_SECONDS:
+            self.sync()
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.synced = time.monotonic()
+
+    def close(self):
+        self.sync()
+        self.file.close()
+
+    def remove(self):
+        os.remove(self.file_path)
+
+class History():
+    # Every test of every run, clustered by variation so the last runs of one variation are a single index range
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS runs (
+            id INTEGER PRIMARY KEY,
+            config_hash TEXT NOT NULL,
+            config TEXT NOT NULL,
+            time TEXT NOT NULL,
+            interrupted INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS runs_by_config ON runs (config_hash, id);
+        CREATE TABLE IF NOT EXISTS tests (
+            config_hash TEXT NOT NULL,
+            test TEXT NOT NULL,
+            run INTEGER NOT NULL,
+            legacy_status INTEGER,
+            migrated_status INTEGER,
+            legacy_seconds REAL,
+            migrated_seconds REAL,
+            passed INTEGER NOT NULL,
+            fingerprints TEXT NOT NULL,
+            PRIMARY KEY (config_hash, test, run)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS tests_by_run ON tests (run);
+    """
+    COLUMNS = ["test", "run", "legacy_status", "migrated_status", "legacy_seconds", "migrated_seconds", "passed", "fingerprints"]
+
+    def __init__(self, file_path):
+        self.connection = sqlite3.connect(file_path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(self.SCHEMA)
+
+    def record(self, config_digest, config_path, central_time, interrupted, results):
+        with self.connection:
+            run = self.connection.execute(
+                "INSERT INTO runs (config_hash, config, time, interrupted) VALUES (?, ?, ?, ?)",
+                (config_digest, config_path, central_time.isoformat(), int(interrupted))
+            ).lastrowid
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO tests VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                ((config_digest, test_identity(result), run, *history_values(result)) for result in results)
+            )
+        return run
+
+    def runs(self, config_digest, count):
+        # Most recent first
+        return self.connection.execute("SELECT id, time, interrupted FROM runs WHERE config_hash = ? ORDER BY id DESC LIMIT ?", (config_digest, count)).fetchall()
+
+    def run_tests(self, run):
+        rows = self.connection.execute(f"SELECT {', '.join(self.COLUMNS)} FROM tests WHERE run = ?", (run,))
+        return {row[0]: dict(zip(self.COLUMNS, row)) for row in rows}
+
+    def variation(self, config_digest, test, count):
+        # The last count runs of one variation, most recent first
+        rows = self.connection.execute(f"SELECT {', '.join(self.COLUMNS)} FROM tests WHERE config_hash = ? AND test = ? ORDER BY run DESC LIMIT ?", (config_digest, test, count))
+        return [dict(zip(self.COLUMNS, row)) for row in rows]
+
+    def close(self):
+        self.connection.close()
+
+def test_identity(result):
+    return json.dumps([result["section"], result["attr"], result["value"]], default=str)
+
+def history_values(result):
+    return (
+        result["legacy"]["status"],
+        result["migrated"]["status"],
+        percentile(result["legacy"]["durations"], 50) if result["legacy"]["durations"] else None,
+        percentile(result["migrated"]["durations"], 50) if result["migrated"]["durations"] else None,
+        int(result["passed"]),
+        "\n".join(sorted(set(discrepency["fingerprint"] for discrepency in result["discrepencies"])))
+    )
+
+def config_hash(config):
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+def read_results(file_path, partial=False):
+    with open(file_path, 'r') as file:
+        for line in file:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # A run that was killed mid write leaves half of its last line behind
+                if not partial:
+                    raise
+
+def write_sections(file, sections):
+    for title, name, discrepencies in sections:
+        file.write(f"## {title}\n")
+        for line in discrepencies.tablify(name):
+            file.write(line)
+        file.write("\n")
+
+class TimedConnection():
+    # Adds the time spent in each phase of a request to the current thread's connection_events.timings, see call_api
+    def _new_conn(self):
+        start = time.perf_counter()
+        try:
+            addresses = socket.getaddrinfo(self._dns_host.strip("[]"), self.port, 0, socket.SOCK_STREAM)
+        except socket.gaierror:
+            # Let urllib3 raise its own error for a name that does not resolve
+            return super()._new_conn()
+        resolved = time.perf_counter()
+        connection_events.timings["dns"] += resolved - start
+
+        # Connecting to the resolved addresses in order keeps the address fallback without resolving twice
+        dns_host = self._dns_host
+        error = None
+        for address in dict.fromkeys(address[4][0] for address in addresses):
+            self._dns_host = address
+            try:
+                sock = super()._new_conn()
+                connection_events.timings["connect"] += time.perf_counter() - resolved
+                return sock
+            except Exception as e:
+                error = e
+            finally:
+                self._dns_host = dns_host
+        raise error
+
+    def connect(self):
+        connection_events.opened = True
+        start = time.perf_counter()
+        dns_connect = connection_events.timings["dns"] + connection_events.timings["connect"]
+        super().connect()
+        # Whatever connect spent beyond opening the socket went to the TLS handshake
+        connection_events.timings["tls"] += max(time.perf_counter() - start - (connection_events.timings["dns"] + connection_events.timings["connect"] - dns_connect), 0)
+
+    def request(self, *args, **kwargs):
+        start = time.perf_counter()
+        super().request(*args, **kwargs)
+        connection_events.sent = time.perf_counter()
+        connection_events.timings["send"] += connection_events.sent - start
+
+    def getresponse(self, *args, **kwargs):
+        response = super().getresponse(*args, **kwargs)
+        connection_events.headers = time.perf_counter()
+        connection_events.timings["ttfb"] += connection_events.headers - connection_events.sent
+        return response
+
+class CountingHTTPConnection(TimedConnection, HTTPConnection):
+    pass
+
+class CountingHTTPSConnection(TimedConnection, HTTPSConnection):
+    pass
+
+class CountingHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = CountingHTTPConnection
+
+class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = CountingHTTPSConnection
+
+class PooledAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": CountingHTTPConnectionPool, "https": CountingHTTPSConnectionPool}
+
+class Cassette():
+    # Index entries are (sha256 key, offset, length) and are kept in least to most recently used order
+    ENTRY = struct.Struct("<32sQI")
+    # Records are (sha256 key, status, elapsed seconds, headers length, body length) followed by the headers JSON and body bytes,
+    # so the index can be rebuilt from the records when a run was killed before it was written
+    RECORD = struct.Struct("<32sHdII")
+    MAGIC = b"DJVCAS2\n"
+
+    def __init__(self, path, max_bytes, replay):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.max_bytes = max_bytes
+        self.replay = replay
+        self.lock = threading.Lock()
+        self.index = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            self.file = open(self.path, 'w+b')
+            self.file.write(self.MAGIC)
+            return
+
+        self.file = open(self.path, 'a+b')
+        self.file.seek(0)
+        if self.file.read(len(self.MAGIC)) != self.MAGIC:
+            print(f"{self.path} is not a cassette recorded by this version of DejaVu, record a new one...")
+            sys.exit()
+        data_size = self.file.seek(0, os.SEEK_END)
+        indexed_end = len(self.MAGIC)
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'rb') as file:
+                for key, offset, length in self.ENTRY.iter_unpack(file.read()):
+                    if offset + length <= data_size:
+                        self.index[key] = (offset, length)
+                        self.size += length
+                        indexed_end = max(indexed_end, offset + length)
+        self.recover(indexed_end, data_size)
+        self.evict()
+
+    def recover(self, offset, data_size):
+        # Records are only ever appended, so the ones a killed run wrote are everything after the last indexed one
+        self.file.seek(offset)
+        while offset + self.RECORD.size <= data_size:
+            key, _, _, headers_len, body_len = self.RECORD.unpack(self.file.read(self.RECORD.size))
+            length = self.RECORD.size + headers_len + body_len
+            if offset + length > data_size:
+                break
+            if key in self.index:
+                self.size -= self.index.pop(key)[1]
+            self.index[key] = (offset, length)
+            self.size += length
+            offset += length
+            self.file.seek(offset)
+        # Only a half written last record is cut off
+        if offset < data_size:
+            self.file.truncate(offset)
+
+    def __len__(self):
+        return len(self.index)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.index.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.index.move_to_end(key)
+            self.file.seek(entry[0])
+            record = self.file.read(entry[1])
+            self.hits += 1
+
+        _, status, elapsed, headers_len, body_len = self.RECORD.unpack_from(record)
+        headers_end = self.RECORD.size + headers_len
+        response = requests.Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict(json.loads(record[self.RECORD.size:headers_end]))
+        response._content = record[headers_end:headers_end + body_len]
+        response.elapsed = timedelta(seconds=elapsed)
+        return response, elapsed
+
+    def put(self, key, response, elapsed):
+        headers_bytes = json.dumps(dict(response.headers)).encode()
+        record = self.RECORD.pack(key, response.status_code, elapsed, len(headers_bytes), len(response.content)) + headers_bytes + response.content
+
+        with self.lock:
+            self.file.seek(0, os.SEEK_END)
+            offset = self.file.tell()
+            self.file.write(record)
+            if key in self.index:
+                self.size -= self.index.pop(key)[1]
+            self.index[key] = (offset, len(record))
+            self.size += len(record)
+            self.recorded += 1
+            self.evict()
+
+    def evict(self):
+        while self.size > self.max_bytes and len(self.index) > 1:
+            _, (_, length) = self.index.popitem(last=False)
+            self.size -= length
+
+    def close(self):
+        with self.lock:
+            self.file.seek(0, os.SEEK_END)
+            # Evicted and overwritten records are only reclaimed once they make up most of the file
+            if self.file.tell() > 2 * self.size:
+                self.compact()
+            self.file.close()
+
+            temp_path = self.index_path + ".tmp"
+            with open(temp_path, 'wb') as file:
+                file.write(b"".join(self.ENTRY.pack(key, offset, length) for key, (offset, length) in self.index.items()))
+            os.replace(temp_path, self.index_path)
+
+    def compact(self):
+        # The old index points into the old file, without it a crash mid compaction is recovered from the records
+        if os.path.exists(self.index_path):
+            os.remove(self.index_path)
+        temp_path = self.path + ".tmp"
+        compacted = OrderedDict()
+        with open(temp_path, 'wb') as file:
+            file.write(self.MAGIC)
+            for key, (offset, length) in self.index.items():
+                self.file.seek(offset)
+                compacted[key] = (file.tell(), length)
+                file.write(self.file.read(length))
+        self.file.close()
+        os.replace(temp_path, self.path)
+        self.file = open(self.path, 'a+b')
+        self.index = compacted
+
+class TokenBucket():
+    def __init__(self, rps, burst):
+        self.rps = rps
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        waited = 0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rps)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rps
+            time.sleep(wait)
+            waited += wait
+
+class CircuitBreaker():
+    # Opens after `failures` failures in a row and pauses the endpoint for `cooldown` seconds, a failure right after reopening opens it again
+    def __init__(self, side, failures, cooldown):
+        self.side = side
+        self.failures = failures
+        self.cooldown = cooldown
+        self.consecutive = 0
+        self.open_until = 0
+        self.trial = False
+        self.opened = 0
+        self.reported = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        waited = 0
+        while True:
+            with self.lock:
+                wait = self.open_until - time.monotonic()
+            if wait <= 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    def record(self, failed):
+        with self.lock:
+            if not failed:
+                self.consecutive = 0
+                self.trial = False
+                return
+            self.consecutive += 1
+            if self.consecutive < self.failures and not self.trial:
+                return
+            self.consecutive = 0
+            self.trial = True
+            self.opened += 1
+            self.open_until = time.monotonic() + self.cooldown
+
+    def report(self):
+        # Printed by the main thread between tests, never from the threads sending the requests
+        with self.lock:
+            pauses = self.opened - self.reported
+            self.reported = self.opened
+        if pauses > 0:
+            print(Style.BRIGHT + Fore.YELLOW + f"{self.side.capitalize()} was paused{f' {pauses} times' if pauses > 1 else ''} for {format_time(self.cooldown)} after {self.failures} failures in a row...")
+
+class Options():
+    # Lazy sequence of options chained from literal values and special function sources like $range
+    def __init__(self, segments):
+        self.segments = segments
+        self.ends = list(itertools.accumulate(len(segment) for segment in segments))
+
+    def __len__(self):
+        return self.ends[-1] if self.ends else 0
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        segment = bisect.bisect_right(self.ends, index)
+        start = self.ends[segment - 1] if segment > 0 else 0
+        return self.segments[segment][index - start]
+
+    def __iter__(self):
+        for segment in self.segments:
+            yield from segment
+
+class ZfillRange():
+    def __init__(self, numbers, zfill):
+        self.numbers = numbers
+        self.zfill = zfill
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def __getitem__(self, index):
+        return str(self.numbers[index]).zfill(self.zfill)
+
+    def __iter__(self):
+        return (str(number).zfill(self.zfill) for number in self.numbers)
+
+class FileSource():
+    # Only every CHECKPOINT-th line offset is kept, so random access scans at most CHECKPOINT lines
+    CHECKPOINT = 1024
+    CHUNK = 1024 * 1024
+
+    def __init__(self, file_path, parse_json):
+        self.parse_json = parse_json
+        self.file = open(file_path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(self.file.fileno()).st_size > 0 else b""
+        # The n-th newline ends line n, so every CHECKPOINT-th one marks where a checkpointed line starts
+        newlines = re.finditer(rb"\n", self.data)
+        self.checkpoints = array("Q", [0])
+        self.checkpoints.extend(newline.end() for newline in itertools.islice(newlines, self.CHECKPOINT - 1, None, self.CHECKPOINT))
+        self.length = sum(self.data[start:start + self.CHUNK].count(b"\n") for start in range(0, len(self.data), self.CHUNK))
+        if len(self.data) > 0 and self.data[-1:] != b"\n":
+            self.length += 1
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError(index)
+        position = self.checkpoints[index // self.CHECKPOINT]
+        for _ in range(index % self.CHECKPOINT):
+            position = self.line_end(position) + 1
+        return self.decode(position, self.line_end(position))
+
+    def __iter__(self):
+        position = 0
+        while position < len(self.data):
+            end = self.line_end(position)
+            yield self.decode(position, end)
+            position = end + 1
+
+    def line_end(self, position):
+        end = self.data.find(b"\n", position)
+        return len(self.data) if end == -1 else end
+
+    def decode(self, start, end):
+        line = self.data[start:end].decode().rstrip("\r")
+        return json.loads(line) if self.parse_json else line
+
+class Sample():
+    def __init__(self, source, k, seed):
+        self.source = source
+        self.indices = sorted(random.Random(seed).sample(range(len(source)), min(k, len(source))))
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, index):
+        return self.source[self.indices[index]]
+
+    def __iter__(self):
+        return (self.source[index] for index in self.indices)
 
 SPECIAL_CODES = ["$omit"]
+SPECIAL_FUNCTIONS = ["$range", "$file", "$jsonl"]
+PHASES = ["dns", "connect", "tls", "send", "ttfb", "transfer"]
+PHASE_BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+IDEMPOTENT_METHODS = ["GET", "HEAD", "OPTIONS", "PUT", "DELETE"]
+STRATEGIES = ["one-at-a-time", "pairwise", "exhaustive"]
+DIFF_ENGINES = ["fast", "deepdiff"]
+JSON_PATH_TOKEN = re.compile(r"\['((?:[^'\\]|\\.)*)'\]|\[(\d+|\*)\]")
+# Marks an ignored path in an ignore tree built by build_ignore_tree
+IGNORED = object()
+# Keys are matched too so that a key such as '[3]' is never mistaken for an index
+ARRAY_INDEX = re.compile(r"""(\['(?:[^'\\]|\\.)*'\]|\["(?:[^"\\]|\\.)*"\])|\[\d+\]""")
+JSON_WHITESPACE = re.compile(rb"[ \t\n\r]*")
+LONG_DIGITS = re.compile(rb"\d{19}")
+JSON_WHITESPACE_TEXT = re.compile(r"[ \t\n\r]*")
+HISTORY_FILE_PATH = os.path.join("results", "history.sqlite")
+COMPRESSED_ENCODINGS = ["gzip", "x-gzip", "br", "deflate", "zstd", "compress"]
+CACHE_HEADERS = ["ETag", "Cache-Control"]
+# Headers that belong to the captured connection rather than the request, requests sets its own. A browser's
+# Accept-Encoding can ask for br or zstd, which urllib3 cannot decode without optional packages
+CONNECTION_HEADERS = ["host", "content-length", "connection", "keep-alive", "transfer-encoding", "te", "upgrade", "proxy-connection", "accept-encoding"]
+HAR_ENTRIES = re.compile(r'(?<!\\)"entries"\s*:\s*\[')
+TRAFFIC_EXTENSIONS = {".har": "har", ".jsonl": "jsonl", ".ndjson": "jsonl", ".log": "jsonl"}
+CLUSTER_TITLES = {"status": "Status Code", "error": "Request Failed", "removed": "Removed", "changed": "Changed", "time": "Slower", "size": "Larger", "compression": "Compression", "cache": "Cache Header", "conditional": "If-None-Match"}
 
 custom = {}
 path = {}
@@ -53,11 +808,94 @@ headers = {
     "Accept": "application/json"
 }
 endpoints = {}
+strategy = {
+    "name": "one-at-a-time",
+    "strength": 2
+}
+latency = {
+    "warmup": 0,
+    "samples": 1,
+    "alpha": 0.05,
+    "threshold": 1.25
+}
+load = {
+    "rps": [10],
+    "duration": 30,
+    "workers": 64,
+    "weights": {},
+    "seed": 0
+}
+diff_rules = {
+    "engine": "fast",
+    "ignore": [],
+    "ignore_tree": {},
+    "incremental_bytes": 64 * 1024 * 1024
+}
+payload = {
+    "size": 1.5,
+    "compression": True,
+    "cache": True,
+    "conditional": False
+}
+budget = {
+    "requests": None,
+    "time": None,
+    "error_rate": None,
+    "converge": None
+}
+
+# What every config starts from before validate_input applies it, so configs run one after another do not leak into each other
+DEFAULT_INPUT = copy.deepcopy({
+    "custom": custom,
+    "path": path,
+    "query": query,
+    "body": body,
+    "headers": headers,
+    "strategy": strategy,
+    "latency": latency,
+    "load": load,
+    "diff_rules": diff_rules,
+    "payload": payload,
+    "budget": budget
+})
 
 config = {}
 
-# Appropiate requests API function eg. requests.get, requests.post, etc...
-call_api = None
+# Keep-alive requests.Session for each of "legacy" and "migrated"
+sessions = {}
+# Sessions by side, host and pool settings, so configs that target the same host share its warm connections
+host_sessions = {}
+connection_stats = {"opened": 0, "reused": 0}
+connection_lock = threading.Lock()
+# Threads comparing bodies with the garbage collector paused, see pause_gc
+gc_pause = {"lock": threading.Lock(), "comparing": 0, "collecting": True}
+# Set by the connection classes below when the current thread's request had to open a new connection
+connection_events = threading.local()
+
+# Number of variations in flight at once, each firing legacy and migrated together
+concurrency = 1
+executor = None
+side_executor = None
+
+# Cassette of recorded responses when running with --record or --replay
+cassette = None
+journal = None
+# Capture files replayed instead of the config's variations with --traffic, and how many of their requests were replayed
+traffic = None
+# Set by --headless, which prints Progress lines instead of every test
+headless = False
+progress = None
+# TokenBucket and CircuitBreaker of each side when the endpoints configure them
+limiters = {}
+breakers = {}
+# Spending of the budget attribute by the sections being run
+spending = None
+# The stable requests and splice points compiled by compile_plan
+plan = {}
+
+# Tests are numbered in plan order and a shard only runs the ones that land on it
+shard = {"index": 0, "count": 1}
+plan_positions = itertools.count()
 requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 
 def read_json(file_path):
@@ -88,23 +926,129 @@ def get_stable_elements(data, in_legacy):
     for key, value in data.items():
         if type(value) == dict:
             result[key] = get_stable_elements(value, in_legacy)
-        elif type(value) == list:
+        elif type(value) == Options:
             result[key] = get_keyword_code(value[0], in_legacy)
         else:
             result[key] = get_keyword_code(value, in_legacy)
 
     return result
 
-def remove_omit_keys(dict):
-    omit_keys = [attr for attr, value in dict.items() if value == "$omit"]
-    for key in omit_keys:
-        del dict[key]
+def strip_omits(data):
+    return {key: strip_omits(value) if type(value) == dict else value for key, value in data.items() if value != "$omit"}
 
 def get_stable_url(url, in_legacy):
     for path_pattern, path_variable in get_stable_elements(path, in_legacy=in_legacy).items():
         url = url.replace(path_pattern, str(path_variable))
     return url
 
+def serialize_body(data, keys, pieces, spans, offset):
+    # Matches json.dumps(data, allow_nan=False), which is what requests sends for json=, while noting where the
+    # member of every key sits, and whether other members surround it, so a variation can be spliced into the bytes
+    items = list(data.items())
+    after = [False] * len(items)
+    for i in range(len(items) - 2, -1, -1):
+        after[i] = after[i + 1] or items[i + 1][1] != "$omit"
+
+    pieces.append("{")
+    offset += 1
+    before = False
+    for i, (key, value) in enumerate(items):
+        if value == "$omit":
+            # An omitted key has an empty span where it would be inserted
+            spans[keys + (key,)] = (offset, offset, before, after[i])
+            continue
+        if before:
+            pieces.append(", ")
+            offset += 2
+        start = offset
+        member_key = json.dumps(key) + ": "
+        pieces.append(member_key)
+        offset += len(member_key)
+        if type(value) == dict:
+            offset = serialize_body(value, keys + (key,), pieces, spans, offset)
+        else:
+            member_value = json.dumps(value, allow_nan=False)
+            pieces.append(member_value)
+            offset += len(member_value)
+        spans[keys + (key,)] = (start, offset, before, after[i])
+        before = True
+    pieces.append("}")
+    return offset + 1
+
+def splice_body(template, keys, value):
+    data = template["data"]
+    start, end, before, after = template["spans"][keys]
+    if value == "$omit":
+        if start == end:
+            return data
+        # Take a neighbouring ", " along with the member
+        if before:
+            return data[:start - 2] + data[end:]
+        if after:
+            return data[:start] + data[end + 2:]
+        return data[:start] + data[end:]
+    member = (json.dumps(keys[-1]) + ": " + json.dumps(value, allow_nan=False)).encode()
+    if start == end:
+        if before:
+            member = b", " + member
+        elif after:
+            member = member + b", "
+    return data[:start] + member + data[end:]
+
+def compile_side(in_legacy):
+    side = "legacy" if in_legacy else "migrated"
+    stable_path = get_stable_elements(path, in_legacy)
+    url = get_stable_url(endpoints[side], in_legacy)
+    # Every other path variable is already stable, so a path variation only has to fill in the gaps of its own pattern
+    path_parts = {}
+    for path_pattern in path:
+        other_url = endpoints[side]
+        for other_pattern, path_variable in stable_path.items():
+            if other_pattern != path_pattern:
+                other_url = other_url.replace(other_pattern, str(path_variable))
+        path_parts[path_pattern] = other_url.split(path_pattern)
+
+    params = get_stable_elements(query, in_legacy)
+    body_tree = get_stable_elements(body, in_legacy)
+    pieces = []
+    spans = {}
+    serialize_body(body_tree, (), pieces, spans, 0)
+
+    request_headers = headers
+    if not any(key.lower() == "content-type" for key in headers):
+        request_headers = {**headers, "Content-Type": "application/json"}
+
+    return {
+        "url": url,
+        "path_parts": path_parts,
+        "params": strip_omits(params),
+        "params_tree": params,
+        "body_tree": body_tree,
+        "data": "".join(pieces).encode(),
+        "spans": spans,
+        "headers": request_headers
+    }
+
+def compile_plan():
+    # The stable request of each side is built and serialized once, every variation is a delta on top of it
+    global plan
+    plan = {"legacy": compile_side(in_legacy=True), "migrated": compile_side(in_legacy=False)}
+
+def reset_input():
+    global custom, path, query, body, headers, strategy, latency, load, diff_rules, payload, budget
+    defaults = copy.deepcopy(DEFAULT_INPUT)
+    custom = defaults["custom"]
+    path = defaults["path"]
+    query = defaults["query"]
+    body = defaults["body"]
+    headers = defaults["headers"]
+    strategy = defaults["strategy"]
+    latency = defaults["latency"]
+    load = defaults["load"]
+    diff_rules = defaults["diff_rules"]
+    payload = defaults["payload"]
+    budget = defaults["budget"]
+
 def validate_input(config):
     if "custom" in config:
         global custom
@@ -130,6 +1074,30 @@ def validate_input(config):
         global headers
         headers = config["headers"]
 
+    if "strategy" in config or "strength" in config:
+        global strategy
+        strategy = validate_strategy(config.get("strategy", "pairwise"), config.get("strength", 2))
+
+    if "latency" in config:
+        global latency
+        latency = validate_latency(config["latency"])
+
+    if "load" in config:
+        global load
+        load = validate_load(config["load"])
+
+    if "diff" in config:
+        global diff_rules
+        diff_rules = validate_diff(config["diff"])
+
+    if "payload" in config:
+        global payload
+        payload = validate_payload(config["payload"])
+
+    if "budget" in config:
+        global budget
+        budget = validate_budget(config["budget"])
+
     if "endpoints" in config:
         global endpoints
         endpoints = config["endpoints"]
@@ -138,6 +1106,8 @@ def validate_input(config):
         print(f"The endpoints attribute is required...")
         sys.exit()
 
+    compile_plan()
+
 def validate_custom(custom):
     # validate custom
     MIN_KEYWORD_SIZE = 2
@@ -190,12 +1160,137 @@ def validate_body(body_sub, prefix=""):
                 print(f"Custom keywords like {attr_full} in {body} must be defined in custom attribute...")
                 sys.exit()
 
+def validate_strategy(name, strength):
+    if name not in STRATEGIES:
+        print(f"The strategy must be one of {STRATEGIES}, but {name} was not...")
+        sys.exit()
+    if type(strength) != int or strength < 2:
+        print(f"The strength must be an integer of atleast 2, but {strength} was not...")
+        sys.exit()
+    return {"name": name, "strength": strength}
+
+def validate_latency(latency):
+    EXPECTED_LATENCY_FIELDS = ["warmup", "samples", "alpha", "threshold"]
+    if type(latency) != dict or not all(attr in EXPECTED_LATENCY_FIELDS for attr in latency.keys()):
+        print(f"The latency attribute must be an object with only the fields {EXPECTED_LATENCY_FIELDS}...")
+        sys.exit()
+    warmup = latency.get("warmup", 0)
+    if type(warmup) != int or warmup < 0:
+        print(f"The latency warmup must be a non-negative integer, but {warmup} was not...")
+        sys.exit()
+    samples = latency.get("samples", 1)
+    if type(samples) != int or samples < 1:
+        print(f"The latency samples must be a positive integer, but {samples} was not...")
+        sys.exit()
+    alpha = latency.get("alpha", 0.05)
+    if type(alpha) not in [int, float] or not 0 < alpha < 1:
+        print(f"The latency alpha must be between 0 and 1, but {alpha} was not...")
+        sys.exit()
+    threshold = latency.get("threshold", 1.25)
+    if type(threshold) not in [int, float] or threshold < 1:
+        print(f"The latency threshold must be atleast 1, but {threshold} was not...")
+        sys.exit()
+    return {"warmup": warmup, "samples": samples, "alpha": alpha, "threshold": threshold}
+
+def validate_load(load):
+    EXPECTED_LOAD_FIELDS = ["rps", "duration", "workers", "weights", "seed"]
+    if type(load) != dict or not all(attr in EXPECTED_LOAD_FIELDS for attr in load.keys()):
+        print(f"The load attribute must be an object with only the fields {EXPECTED_LOAD_FIELDS}...")
+        sys.exit()
+    rps = load.get("rps", [10])
+    rps = rps if type(rps) == list else [rps]
+    if len(rps) < 1 or not all(type(level) in [int, float] and level > 0 for level in rps):
+        print(f"The load rps must be a positive number or an array of positive numbers, but {load['rps']} was not...")
+        sys.exit()
+    duration = load.get("duration", 30)
+    if type(duration) not in [int, float] or duration <= 0:
+        print(f"The load duration must be a positive number of seconds, but {duration} was not...")
+        sys.exit()
+    workers = load.get("workers", 64)
+    if type(workers) != int or workers < 1:
+        print(f"The load workers must be a positive integer, but {workers} was not...")
+        sys.exit()
+    weights = load.get("weights", {})
+    if type(weights) != dict or not all(type(weight) in [int, float] and weight >= 0 for weight in weights.values()):
+        print(f"The load weights must map attributes (or $stable) to non-negative numbers, but {weights} does not...")
+        sys.exit()
+    seed = load.get("seed", 0)
+    if type(seed) != int:
+        print(f"The load seed must be an integer, but {seed} was not...")
+        sys.exit()
+    return {"rps": rps, "duration": duration, "workers": workers, "weights": weights, "seed": seed}
+
+def validate_diff(diff):
+    EXPECTED_DIFF_FIELDS = ["engine", "ignore", "incremental"]
+    BYTES_IN_MEGABYTE = 1024 * 1024
+    if type(diff) != dict or not all(attr in EXPECTED_DIFF_FIELDS for attr in diff.keys()):
+        print(f"The diff attribute must be an object with only the fields {EXPECTED_DIFF_FIELDS}...")
+        sys.exit()
+    engine = diff.get("engine", "fast")
+    if engine not in DIFF_ENGINES:
+        print(f"The diff engine must be one of {DIFF_ENGINES}, but {engine} was not...")
+        sys.exit()
+    ignore = diff.get("ignore", [])
+    if type(ignore) != list:
+        print(f"The diff ignore attribute must be an array of paths like root['updated_at'], but {ignore} was not...")
+        sys.exit()
+    for json_path in ignore:
+        if parse_json_path(json_path) is None:
+            print(f"Ignored diff paths must look like root['items'][*]['id'], but {json_path} does not...")
+            sys.exit()
+    incremental = diff.get("incremental", 64)
+    if type(incremental) not in [int, float] or incremental < 0:
+        print(f"The diff incremental attribute must be a non-negative number of megabytes, but {incremental} was not...")
+        sys.exit()
+    return {"engine": engine, "ignore": ignore, "ignore_tree": build_ignore_tree(ignore), "incremental_bytes": incremental * BYTES_IN_MEGABYTE}
+
+def validate_payload(payload):
+    EXPECTED_PAYLOAD_FIELDS = ["size", "compression", "cache", "conditional"]
+    if type(payload) != dict or not all(attr in EXPECTED_PAYLOAD_FIELDS for attr in payload.keys()):
+        print(f"The payload attribute must be an object with only the fields {EXPECTED_PAYLOAD_FIELDS}...")
+        sys.exit()
+    size = payload.get("size", 1.5)
+    if size is not False and (type(size) not in [int, float] or size < 1):
+        print(f"The payload size must be atleast 1, or false to not compare sizes, but {size} was not...")
+        sys.exit()
+    checks = {}
+    for attr in ["compression", "cache", "conditional"]:
+        checks[attr] = payload.get(attr, attr != "conditional")
+        if type(checks[attr]) != bool:
+            print(f"The payload {attr} attribute must be true or false, but {checks[attr]} was not...")
+            sys.exit()
+    return {"size": size, **checks}
+
+def validate_budget(budget):
+    EXPECTED_BUDGET_FIELDS = ["requests", "time", "error_rate", "converge"]
+    if type(budget) != dict or not all(attr in EXPECTED_BUDGET_FIELDS for attr in budget.keys()):
+        print(f"The budget attribute must be an object with only the fields {EXPECTED_BUDGET_FIELDS}...")
+        sys.exit()
+    requests_budget = budget.get("requests")
+    if requests_budget is not None and (type(requests_budget) != int or requests_budget < 1):
+        print(f"The budget requests must be a positive integer, but {requests_budget} was not...")
+        sys.exit()
+    time_budget = budget.get("time")
+    if time_budget is not None and (type(time_budget) not in [int, float] or time_budget <= 0):
+        print(f"The budget time must be a positive number of seconds, but {time_budget} was not...")
+        sys.exit()
+    error_rate = budget.get("error_rate")
+    if error_rate is not None and (type(error_rate) not in [int, float] or not 0 <= error_rate < 1):
+        print(f"The budget error_rate must be atleast 0 and less than 1, but {error_rate} was not...")
+        sys.exit()
+    converge = budget.get("converge")
+    if converge is not None and (type(converge) != int or converge < 1):
+        print(f"The budget converge must be a positive integer, but {converge} was not...")
+        sys.exit()
+    return {"requests": requests_budget, "time": time_budget, "error_rate": error_rate, "converge": converge}
+
 def validate_endpoints(endpoints):
     EXPECTED_ENDPOINT_FIELDS = ["legacy", "migrated", "method"]
-    if len(endpoints.keys()) != len(EXPECTED_ENDPOINT_FIELDS) or not all(attr in endpoints.keys() for attr in EXPECTED_ENDPOINT_FIELDS):
-        print(f"Expected {len(EXPECTED_ENDPOINT_FIELDS)} fields in endpoints attribute: {EXPECTED_ENDPOINT_FIELDS}...")
+    OPTIONAL_ENDPOINT_FIELDS = ["pool", "rate_limit", "retry", "breaker"]
+    if not all(attr in endpoints.keys() for attr in EXPECTED_ENDPOINT_FIELDS) or not all(attr in EXPECTED_ENDPOINT_FIELDS + OPTIONAL_ENDPOINT_FIELDS for attr in endpoints.keys()):
+        print(f"Expected {len(EXPECTED_ENDPOINT_FIELDS)} fields in endpoints attribute: {EXPECTED_ENDPOINT_FIELDS} and optionally {OPTIONAL_ENDPOINT_FIELDS}...")
         sys.exit()
-    if not all(type(value) == str for value in endpoints.values()):
+    if not all(type(endpoints[attr]) == str for attr in EXPECTED_ENDPOINT_FIELDS):
         print(f"All values in endpoints attribute must be strings...")
         sys.exit()
     EXPECTED_ENDPOINT_METHODS = ["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS", "HEAD"]
@@ -203,106 +1298,462 @@ def validate_endpoints(endpoints):
     if method not in EXPECTED_ENDPOINT_METHODS:
         print(f"The endpoint method in {endpoints} must be in {EXPECTED_ENDPOINT_FIELDS}, but {endpoints["method"]} was not...")
         sys.exit()
-    else:
-        global call_api
-        if method == "GET": call_api = requests.get
-        elif method == "POST": call_api = requests.post
-        elif method == "PUT": call_api = requests.put
-        elif method == "DELETE": call_api = requests.delete
-        elif method == "PATCH": call_api = requests.patch
-        elif method == "OPTIONS": call_api = requests.options
-        elif method == "HEAD": call_api = requests.head
+    endpoints["method"] = method
+    endpoints["pool"] = validate_pool(endpoints.get("pool", {}))
+    endpoints["rate_limit"] = validate_rate_limit(endpoints.get("rate_limit", {}))
+    endpoints["retry"] = validate_retry(endpoints.get("retry", {"attempts": 0}))
+    endpoints["breaker"] = validate_breaker(endpoints.get("breaker", None))
+    open_sessions(endpoints["pool"])
+    open_guards(endpoints)
+
+def validate_rate_limit(rate_limit):
+    if type(rate_limit) != dict or not all(side in ["legacy", "migrated"] for side in rate_limit.keys()):
+        print(f"The rate_limit attribute in endpoints must be an object with a legacy and/or migrated field, but {rate_limit} was not...")
+        sys.exit()
+    validated = {}
+    for side, limit in rate_limit.items():
+        if type(limit) != dict or not all(attr in ["rps", "burst"] for attr in limit.keys()):
+            print(f"The {side} rate_limit must be an object with only the fields ['rps', 'burst'], but {limit} was not...")
+            sys.exit()
+        rps = limit.get("rps", None)
+        if type(rps) not in [int, float] or rps <= 0:
+            print(f"The {side} rate_limit rps must be a positive number, but {rps} was not...")
+            sys.exit()
+        burst = limit.get("burst", 1)
+        if type(burst) != int or burst < 1:
+            print(f"The {side} rate_limit burst must be a positive integer, but {burst} was not...")
+            sys.exit()
+        validated[side] = {"rps": rps, "burst": burst}
+    return validated
+
+def validate_retry(retry):
+    EXPECTED_RETRY_FIELDS = ["attempts", "backoff", "max_backoff", "statuses", "methods"]
+    if type(retry) != dict or not all(attr in EXPECTED_RETRY_FIELDS for attr in retry.keys()):
+        print(f"The retry attribute in endpoints must be an object with only the fields {EXPECTED_RETRY_FIELDS}...")
+        sys.exit()
+    attempts = retry.get("attempts", 3)
+    if type(attempts) != int or attempts < 0:
+        print(f"The retry attempts must be a non-negative integer, but {attempts} was not...")
+        sys.exit()
+    backoff = retry.get("backoff", 0.5)
+    max_backoff = retry.get("max_backoff", 30)
+    if type(backoff) not in [int, float] or type(max_backoff) not in [int, float] or backoff < 0 or max_backoff < backoff:
+        print(f"The retry backoff and max_backoff must be numbers with 0 <= backoff <= max_backoff, but {backoff} and {max_backoff} were not...")
+        sys.exit()
+    statuses = retry.get("statuses", [429, 502, 503, 504])
+    if type(statuses) != list or not all(type(status) == int for status in statuses):
+        print(f"The retry statuses must be an array of status codes, but {statuses} was not...")
+        sys.exit()
+    # Only idempotent methods are retried unless the config allows others
+    methods = retry.get("methods", [])
+    if type(methods) != list or not all(type(method) == str for method in methods):
+        print(f"The retry methods must be an array of methods, but {methods} was not...")
+        sys.exit()
+    return {"attempts": attempts, "backoff": backoff, "max_backoff": max_backoff, "statuses": statuses, "methods": [method.upper() for method in methods]}
+
+def validate_breaker(breaker):
+    if breaker is None:
+        return None
+    if type(breaker) != dict or not all(attr in ["failures", "cooldown"] for attr in breaker.keys()):
+        print(f"The breaker attribute in endpoints must be an object with only the fields ['failures', 'cooldown'], but {breaker} was not...")
+        sys.exit()
+    failures = breaker.get("failures", 5)
+    if type(failures) != int or failures < 1:
+        print(f"The breaker failures must be a positive integer, but {failures} was not...")
+        sys.exit()
+    cooldown = breaker.get("cooldown", 30)
+    if type(cooldown) not in [int, float] or cooldown < 0:
+        print(f"The breaker cooldown must be a non-negative number of seconds, but {cooldown} was not...")
+        sys.exit()
+    return {"failures": failures, "cooldown": cooldown}
+
+def open_guards(endpoints):
+    limiters.clear()
+    breakers.clear()
+    for side, limit in endpoints["rate_limit"].items():
+        limiters[side] = TokenBucket(limit["rps"], limit["burst"])
+    if endpoints["breaker"] is not None:
+        for side in ["legacy", "migrated"]:
+            breakers[side] = CircuitBreaker(side, endpoints["breaker"]["failures"], endpoints["breaker"]["cooldown"])
+
+def validate_pool(pool):
+    if type(pool) != dict:
+        print(f"The pool attribute in endpoints must be an object, but {pool} was not...")
+        sys.exit()
+    EXPECTED_POOL_FIELDS = ["size", "keep_alive"]
+    for attr in pool.keys():
+        if attr not in EXPECTED_POOL_FIELDS:
+            print(f"Expected only {EXPECTED_POOL_FIELDS} in the pool attribute, but {attr} was given...")
+            sys.exit()
+    # Without a size the pool grows to the number of requests that can be in flight at once
+    size = pool.get("size", None)
+    if size is not None and (type(size) != int or size < 1):
+        print(f"The pool size must be a positive integer, but {size} was not...")
+        sys.exit()
+    keep_alive = pool.get("keep_alive", True)
+    if type(keep_alive) != bool:
+        print(f"The pool keep_alive must be true or false, but {keep_alive} was not...")
+        sys.exit()
+    return {"size": size, "keep_alive": keep_alive}
+
+def open_sessions(pool):
+    for side in ["legacy", "migrated"]:
+        url = urlsplit(endpoints[side])
+        key = (side, url.scheme, url.netloc, pool["size"] or concurrency, pool["keep_alive"])
+        if key not in host_sessions:
+            session = requests.Session()
+            # pool_block keeps the number of open connections at the pool size instead of opening throwaway ones
+            adapter = PooledAdapter(pool_connections=1, pool_maxsize=pool["size"] or concurrency, pool_block=True)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            if not pool["keep_alive"]:
+                session.headers["Connection"] = "close"
+            host_sessions[key] = session
+        sessions[side] = host_sessions[key]
+
+def call_api(side, url, **kwargs):
+    connection_events.opened = False
+    connection_events.timings = {phase: 0.0 for phase in PHASES}
+    start = time.perf_counter()
+    connection_events.headers = start
+    response = sessions[side].request(endpoints["method"], url, **kwargs)
+    end = time.perf_counter()
+    with connection_lock:
+        connection_stats["opened" if connection_events.opened else "reused"] += 1
+
+    timings = connection_events.timings
+    timings["transfer"] = end - connection_events.headers
+    # Time in requests and the pool that is not in any phase, such as waiting for a free connection
+    timings["other"] = max(end - start - sum(timings.values()), 0)
+    timings["reused"] = not connection_events.opened
+    timings["request_bytes"] = len(kwargs.get("data") or b"")
+    timings["response_bytes"] = len(response.content)
+    timings["wire_bytes"] = response.raw.tell() if response.raw is not None else len(response.content)
+    response.timings = timings
+    return response
+
+def connection_counts():
+    return connection_stats["opened"], connection_stats["reused"]
 
 def is_custom_or_special_function(keyword):
     if keyword in custom:
         return True
-    elif keyword[:6] == "$range":
+    elif is_special_function(keyword):
         return True
     else:
         return False
 
+def is_special_function(keyword):
+    return type(keyword) == str and any(keyword.strip().startswith(function) for function in SPECIAL_FUNCTIONS)
+
+def get_function_args(keyword):
+    return [arg.strip() for arg in keyword[keyword.index("(") + 1:keyword.rindex(")")].split(",")]
+
 def preprocess(options):
-    remove = []
-    ranges = []
-    for i, keyword in enumerate(options):
-        if type(keyword) == str and len(keyword) >= len("$range") and keyword[:6] == "$range":
-            keyword = keyword.strip()
-            args = [arg.strip() for arg in keyword[7:-1].split(",")]
-
-            if len(args) < 2:
-                pass
-            if not args[0].isdigit() or not args[1].isdigit():
-                pass
-            start, end = int(args[0]), int(args[1])
-
-            step = 1 if end > start else -1
-            zfill = 0
-            for arg in args[2:]:
-                if len(arg) > len("step=") and arg[:5] == "step=" and arg[5:].strip().isdigit():
-                    step = int(arg[5:].strip())
-                elif len(arg) > len("zfill=") and arg[:6] == "zfill=" and arg[6:].strip().isdigit():
-                    zfill = int(arg[6:].strip())
-
-            my_range = range(start, end, step)
-            if zfill != 0: my_range = [str(num).zfill(zfill) for num in my_range]
-
-            remove.append(i)
-            ranges.append(my_range)
-
-    temp = 0
-    for i, rng in zip(remove, ranges):
-        options[i+temp:i+temp+1] = rng
-        temp += len(rng) - 1
-
-    return options
+    segments = []
+    literals = []
+    for keyword in options:
+        if is_special_function(keyword):
+            if len(literals) > 0:
+                segments.append(literals)
+                literals = []
+            segments.append(parse_source(keyword))
+        else:
+            literals.append(keyword)
+    if len(literals) > 0:
+        segments.append(literals)
+
+    return Options(segments)
+
+def parse_source(keyword):
+    # A source may be followed by modifiers, eg. "$file(ids.txt) | $sample(1000)"
+    stages = [stage.strip() for stage in keyword.split("|")]
+    source_keyword = stages[0]
+    if "(" not in source_keyword or not source_keyword.endswith(")"):
+        print(f"Special functions must be called like $range(0, 10), but {keyword} was not...")
+        sys.exit()
 
-def establish_baseline():
-    legacy_url = endpoints['legacy']
-    for path_match, path_variable in get_stable_elements(path, in_legacy=False).items():
-        legacy_url = legacy_url.replace(path_match, str(path_variable))
-    legacy_stable_query = get_stable_elements(query, in_legacy=True)
-    legacy_stable_body = get_stable_elements(body, in_legacy=True)
-    remove_omit_keys(legacy_stable_query)
-    remove_omit_keys(legacy_stable_body)
-
-    legacy_response = call_api(
-        legacy_url, 
-        headers=headers,
-        params=legacy_stable_query,
-        json=legacy_stable_body,
-        verify=False
-    )
+    if source_keyword.startswith("$range"):
+        source = parse_range(source_keyword)
+    else:
+        file_path = get_function_args(source_keyword)[0]
+        if not os.path.isfile(file_path):
+            print(f"The file {file_path} in {keyword} does not exist...")
+            sys.exit()
+        source = FileSource(file_path, parse_json=source_keyword.startswith("$jsonl"))
 
-    migrated_url = endpoints['migrated']
-    for path_match, path_variable in get_stable_elements(path, in_legacy=False).items():
-        migrated_url = migrated_url.replace(path_match, str(path_variable))
-    migrated_stable_query = get_stable_elements(query, in_legacy=False)
-    migrated_stable_body = get_stable_elements(body, in_legacy=False)
-    remove_omit_keys(migrated_stable_query)
-    remove_omit_keys(migrated_stable_body)
-    
-    migrated_response = call_api(
-        migrated_url,
-        headers=headers,
-        params=migrated_stable_query,
-        json=migrated_stable_body,
+    for stage in stages[1:]:
+        if not stage.startswith("$sample(") or not stage.endswith(")"):
+            print(f"Only $sample(k) can follow a | in {keyword}, but {stage} was given...")
+            sys.exit()
+        args = get_function_args(stage)
+        seed = 0
+        for arg in args[1:]:
+            if len(arg) > len("seed=") and arg[:5] == "seed=" and arg[5:].strip().isdigit():
+                seed = int(arg[5:].strip())
+        if not args[0].isdigit():
+            print(f"$sample expects a number of options to keep, but {stage} does not have one...")
+            sys.exit()
+        source = Sample(source, int(args[0]), seed)
+
+    return source
+
+def parse_range(keyword):
+    args = get_function_args(keyword)
+
+    if len(args) < 2:
+        pass
+    if not args[0].isdigit() or not args[1].isdigit():
+        pass
+    start, end = int(args[0]), int(args[1])
+
+    step = 1 if end > start else -1
+    zfill = 0
+    for arg in args[2:]:
+        if len(arg) > len("step=") and arg[:5] == "step=" and arg[5:].strip().isdigit():
+            step = int(arg[5:].strip())
+        elif len(arg) > len("zfill=") and arg[:6] == "zfill=" and arg[6:].strip().isdigit():
+            zfill = int(arg[6:].strip())
+
+    my_range = range(start, end, step)
+    if zfill != 0: my_range = ZfillRange(my_range, zfill)
+
+    return my_range
+
+def make_request(side, url, params, data):
+    # Requests share the compiled params and bytes, nothing may mutate them
+    return {
+        "side": side,
+        "url": url,
+        "headers": plan[side]["headers"],
+        "params": params,
+        "data": data
+    }
+
+def request_key(request):
+    key = json.dumps([endpoints["method"], request["url"], request["params"], request["headers"]], sort_keys=True, default=str)
+    return hashlib.sha256(key.encode() + b"\n" + request["data"]).digest()
+
+def send_request(request, guarded=True):
+    if cassette is not None:
+        key = request_key(request)
+        if cassette.replay:
+            cached = cassette.get(key)
+            if cached is not None:
+                return cached
+
+    response, duration = send_guarded_request(request) if guarded else send_request_to_network(request)
+
+    # A request that never got a response has nothing to replay
+    if cassette is not None and response.status_code is not None:
+        cassette.put(key, response, duration)
+    return response, duration
+
+def retry_backoff(attempt, response):
+    retry = endpoints["retry"]
+    # Full jitter keeps retries from many threads from arriving together
+    backoff = random.uniform(0, min(retry["max_backoff"], retry["backoff"] * 2 ** attempt))
+    retry_after = response.headers.get("Retry-After", "") if response is not None else ""
+    if retry_after.strip().isdigit():
+        backoff = max(backoff, min(int(retry_after), retry["max_backoff"]))
+    return backoff
+
+def send_guarded_request(request):
+    side = request["side"]
+    retry = endpoints["retry"]
+    retries = retry["attempts"] if endpoints["method"] in IDEMPOTENT_METHODS or endpoints["method"] in retry["methods"] else 0
+    attempts = []
+    waited = 0
+    for attempt in range(retries + 1):
+        if side in breakers:
+            waited += breakers[side].wait()
+        if side in limiters:
+            waited += limiters[side].acquire()
+        response, error = None, None
+        start = time.perf_counter()
+        try:
+            response, duration = send_request_to_network(request)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = e
+            duration = time.perf_counter() - start
+        failed = error is not None or response.status_code in retry["statuses"]
+        if spending is not None:
+            spending.record(side, error is not None or response.status_code >= 500)
+        if side in breakers:
+            breakers[side].record(failed)
+        if not failed or attempt == retries:
+            break
+        backoff = retry_backoff(attempt, response)
+        attempts.append({
+            "status": response.status_code if response is not None else None,
+            "error": type(error).__name__ if error is not None else None,
+            "duration": duration,
+            "backoff": backoff
+        })
+        time.sleep(backoff)
+    if error is not None:
+        # Fails the test instead of the whole run, the breaker has already counted it and decides whether to pause
+        response = failed_response(error)
+    # Only the last attempt is compared, the retried ones are reported on their own
+    response.attempts = attempts
+    response.waited = waited
+    return response, duration
+
+def failed_response(error):
+    response = requests.Response()
+    response.status_code = None
+    response._content = b""
+    response.error = type(error).__name__
+    response.reason = str(error)
+    return response
+
+def response_status(response):
+    # The status code, or the error of a request that never got a response
+    return getattr(response, "error", None) or response.status_code
+
+def send_request_to_network(request):
+    start = time.perf_counter()
+    response = call_api(
+        request["side"],
+        request["url"],
+        headers=request["headers"],
+        params=request["params"],
+        data=request["data"],
         verify=False
     )
+    return response, time.perf_counter() - start
+
+def send_pair(legacy_request, migrated_request):
+    legacy_future = side_executor.submit(send_request, legacy_request)
+    migrated_response, migrated_duration = send_request(migrated_request)
+    legacy_response, legacy_duration = legacy_future.result()
+    return legacy_response, legacy_duration, migrated_response, migrated_duration
+
+def measure_pair(legacy_request, migrated_request):
+    if latency["samples"] == 1 and latency["warmup"] == 0:
+        legacy_response, legacy_duration, migrated_response, migrated_duration = send_pair(legacy_request, migrated_request)
+        return legacy_response, [legacy_duration], migrated_response, [migrated_duration]
+
+    for _ in range(latency["warmup"]):
+        send_request(legacy_request)
+        send_request(migrated_request)
+
+    responses = {}
+    durations = {"legacy": [], "migrated": []}
+    for sample in range(latency["samples"]):
+        # Alternate which side goes first so that neither one always runs right after the other
+        order = [legacy_request, migrated_request] if sample % 2 == 0 else [migrated_request, legacy_request]
+        for request in order:
+            response, duration = send_request(request)
+            responses.setdefault(request["side"], response)
+            durations[request["side"]].append(duration)
+    return responses["legacy"], durations["legacy"], responses["migrated"], durations["migrated"]
+
+def revalidate(request, response):
+    # Asks again with the ETag that was given, a server that honors If-None-Match answers 304 without the body
+    etag = response.headers.get("ETag")
+    if etag is None:
+        return
+    conditional_response, duration = send_request({**request, "headers": {**request["headers"], "If-None-Match": etag}})
+    response.revalidated = {"status": conditional_response.status_code, "bytes": len(conditional_response.content), "duration": duration}
+
+def measure_test(legacy_request, migrated_request):
+    measured = measure_pair(legacy_request, migrated_request)
+    legacy_response, _, migrated_response, _ = measured
+    if payload["conditional"] and legacy_response.status_code == 200 and migrated_response.status_code == 200:
+        legacy_future = side_executor.submit(revalidate, legacy_request, legacy_response)
+        revalidate(migrated_request, migrated_response)
+        legacy_future.result()
+    return measured
+
+def requests_per_test():
+    # Before any retries, and the revalidations are only sent when both sides return 200
+    return 2 * (latency["warmup"] + latency["samples"]) + (2 if payload["conditional"] else 0)
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * percent / 100
+    lower = math.floor(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+def mann_whitney_p_value(legacy_durations, migrated_durations):
+    # One sided Mann-Whitney U test, with the normal approximation, that migrated is slower than legacy
+    n_legacy = len(legacy_durations)
+    n_migrated = len(migrated_durations)
+    ranked = sorted([(duration, 0) for duration in legacy_durations] + [(duration, 1) for duration in migrated_durations])
+
+    migrated_rank_sum = 0
+    tie_correction = 0
+    i = 0
+    while i < len(ranked):
+        j = i
+        while j + 1 < len(ranked) and ranked[j + 1][0] == ranked[i][0]:
+            j += 1
+        average_rank = (i + j) / 2 + 1
+        migrated_rank_sum += average_rank * sum(side for _, side in ranked[i:j + 1])
+        ties = j - i + 1
+        tie_correction += ties ** 3 - ties
+        i = j + 1
+
+    u = migrated_rank_sum - n_migrated * (n_migrated + 1) / 2
+    n = n_legacy + n_migrated
+    variance = n_legacy * n_migrated / 12 * ((n + 1) - tie_correction / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (u - n_legacy * n_migrated / 2 - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+def format_latency(durations):
+    if len(durations) == 1:
+        return format_time(durations[0])
+    return f"p50 {format_time(percentile(durations, 50))}, p95 {format_time(percentile(durations, 95))}, p99 {format_time(percentile(durations, 99))}"
+
+def open_cassette(cassette_path, max_megabytes, replay):
+    global cassette
+    BYTES_IN_MEGABYTE = 1024 * 1024
+    cassette = Cassette(cassette_path, max_megabytes * BYTES_IN_MEGABYTE, replay)
+
+def start_executors(workers):
+    global concurrency, executor, side_executor
+    # Every run shares the same threads, a different size replaces them once the previous ones are done
+    if executor is not None:
+        if workers == concurrency:
+            return
+        executor.shutdown()
+        side_executor.shutdown()
+    concurrency = workers
+    executor = ThreadPoolExecutor(max_workers=workers)
+    side_executor = ThreadPoolExecutor(max_workers=workers)
+
+def start_process_executors(workers):
+    global executor, side_executor
+    # A forked process inherits the parent's executors but none of their threads, which would wait forever
+    executor = None
+    side_executor = None
+    start_executors(workers)
+
+def stable_requests():
+    return tuple(make_request(side, plan[side]["url"], plan[side]["params"], plan[side]["data"]) for side in ["legacy", "migrated"])
 
-    if legacy_response.status_code // 100 != 2 or migrated_response.status_code // 100 != 2 or legacy_response.status_code != migrated_response.status_code:
+def establish_baseline():
+    legacy_request, migrated_request = stable_requests()
+    legacy_response, _, migrated_response, _ = send_pair(legacy_request, migrated_request)
+
+    if legacy_response.status_code is None or migrated_response.status_code is None or legacy_response.status_code // 100 != 2 or migrated_response.status_code // 100 != 2 or legacy_response.status_code != migrated_response.status_code:
         if legacy_response.status_code != 200:
-            print(f"""Legacy responded to the stable call with a {legacy_response.status_code} when a 200 is required...
-                  Url: {legacy_url}
+            print(f"""Legacy responded to the stable call with a {response_status(legacy_response)} when a 200 is required...
+                  Url: {legacy_request['url']}
                   Headers: {headers}
-                  Params: {legacy_stable_query}
-                  Body: {legacy_stable_body}
+                  Params: {legacy_request['params']}
+                  Body: {legacy_request['data'].decode()}
             """)
         if migrated_response.status_code != 200:
-            print(f"""Migrated responded to the stable call with a {migrated_response.status_code} when a 200 is required...
-                  Url: {migrated_url}
+            print(f"""Migrated responded to the stable call with a {response_status(migrated_response)} when a 200 is required...
+                  Url: {migrated_request['url']}
                   Headers: {headers}
-                  Params: {migrated_stable_query}
-                  Body: {migrated_stable_body}
+                  Params: {migrated_request['params']}
+                  Body: {migrated_request['data'].decode()}
             """)
         sys.exit()
 
@@ -313,7 +1764,7 @@ def get_text_time_color(duration):
     return Fore.GREEN if duration < YELLOW_SECONDS else Fore.YELLOW if duration < RED_SECONDS else Fore.RED
 
 def get_text_code_color(code):
-    code_class = code // 100
+    code_class = code // 100 if code is not None else None
     if code_class == 1:
         return Fore.WHITE
     elif code_class == 2:
@@ -349,7 +1800,332 @@ def format_time(duration):
         ms = duration * MS_IN_SECOND % MS_IN_SECOND
         return f"{ms:.0f} ms"
 
-def run_test(legacy_url, migrated_url, attr, value, headers, legacy_params, migrated_params, legacy_body, migrated_body, discrepencies, verbose=True):
+def parse_json_path(json_path):
+    # root['items'][*]['id'] -> ['items', '*', 'id']
+    if type(json_path) != str or not json_path.startswith("root"):
+        return None
+    tokens = []
+    position = len("root")
+    while position < len(json_path):
+        match = JSON_PATH_TOKEN.match(json_path, position)
+        if match is None:
+            return None
+        key, index = match.groups()
+        if key is not None: tokens.append(key.replace("\\'", "'"))
+        elif index == "*": tokens.append(index)
+        else: tokens.append(int(index))
+        position = match.end()
+    return tokens
+
+def build_ignore_tree(ignore_paths):
+    tree = {}
+    for json_path in ignore_paths:
+        node = tree
+        tokens = parse_json_path(json_path)
+        for token in tokens[:-1]:
+            node = node.setdefault(token, {})
+            if node is IGNORED:
+                break
+        else:
+            if tokens:
+                node[tokens[-1]] = IGNORED
+    return tree
+
+def diff_json(legacy, migrated, ignore_tree=None):
+    removed = []
+    changes = {}
+    diff_json_recursively(legacy, migrated, "root", ignore_tree or None, removed, changes)
+    return removed, changes
+
+def diff_json_recursively(legacy, migrated, json_path, ignore_tree, removed, changes):
+    # Equal subtrees are compared in C without descending into them. 1, 1.0 and true are equal in Python but a type change,
+    # which only the serialized forms of two equal objects or arrays tell apart
+    if type(legacy) == type(migrated) and legacy == migrated:
+        if type(legacy) not in (dict, list) or json.dumps(legacy) == json.dumps(migrated):
+            return
+    if type(legacy) != type(migrated):
+        changes[json_path] = {"old_value": legacy, "new_value": migrated}
+    elif type(legacy) == dict:
+        for key, legacy_value in legacy.items():
+            sub_tree = ignore_tree.get(key) if ignore_tree is not None else None
+            if sub_tree is IGNORED:
+                continue
+            key_path = f"{json_path}[{key!r}]"
+            if key not in migrated:
+                removed.append(key_path)
+            else:
+                diff_json_recursively(legacy_value, migrated[key], key_path, sub_tree, removed, changes)
+    elif type(legacy) == list:
+        for index, (legacy_value, migrated_value) in enumerate(zip(legacy, migrated)):
+            sub_tree = (ignore_tree.get(index) or ignore_tree.get("*")) if ignore_tree is not None else None
+            if sub_tree is IGNORED:
+                continue
+            diff_json_recursively(legacy_value, migrated_value, f"{json_path}[{index}]", sub_tree, removed, changes)
+    else:
+        changes[json_path] = {"old_value": legacy, "new_value": migrated}
+
+def deepdiff_json(legacy, migrated, ignore_paths=[]):
+    from deepdiff import DeepDiff
+    exclude_regex_paths = ["^" + re.escape(json_path).replace(re.escape("[*]"), r"\[\d+\]") + "$" for json_path in ignore_paths]
+    diff = DeepDiff(legacy, migrated, exclude_regex_paths=exclude_regex_paths)
+    removed = list(diff.get("dictionary_item_removed", []))
+    changes = {**diff.get("values_changed", {}), **diff.get("type_changes", {})}
+    return removed, changes
+
+def decode_json(content):
+    # orjson rejects a few things the standard library accepts, such as NaN, and turns integers beyond 64 bits into floats.
+    # Any long run of digits, even one inside a string, sends the body to the standard library so no integer loses precision
+    if orjson is not None and LONG_DIGITS.search(content) is None:
+        try:
+            return orjson.loads(content)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(content)
+
+def body_preview(content):
+    BODY_PREVIEW_CHARS = 200
+    text = content.decode(errors="replace")
+    return text if len(text) <= BODY_PREVIEW_CHARS else text[:BODY_PREVIEW_CHARS] + "..."
+
+def is_json_array(content):
+    start = JSON_WHITESPACE.match(content).end()
+    return content[start:start + 1] == b"["
+
+def iter_json_array(text):
+    # Parses the items of a top level array one at a time instead of building the whole list
+    decoder = json.JSONDecoder()
+    position = JSON_WHITESPACE_TEXT.match(text, JSON_WHITESPACE_TEXT.match(text).end() + 1).end()
+    if text[position:position + 1] == "]":
+        return
+    while True:
+        item, position = decoder.raw_decode(text, position)
+        yield item
+        position = JSON_WHITESPACE_TEXT.match(text, position).end()
+        delimiter = text[position:position + 1]
+        position = JSON_WHITESPACE_TEXT.match(text, position + 1).end()
+        if delimiter == "]":
+            break
+        if delimiter != ",":
+            raise json.JSONDecodeError("Expecting ',' delimiter", text, position)
+    if position != len(text):
+        raise json.JSONDecodeError("Extra data", text, position)
+
+def diff_json_arrays(legacy_content, migrated_content, ignore_tree=None):
+    # Same as diff_json on two top level arrays, but only one pair of items is held at a time
+    removed = []
+    changes = {}
+    end = object()
+    legacy_text = legacy_content.decode(json.detect_encoding(legacy_content))
+    migrated_text = migrated_content.decode(json.detect_encoding(migrated_content))
+    for index, (legacy_value, migrated_value) in enumerate(itertools.zip_longest(iter_json_array(legacy_text), iter_json_array(migrated_text), fillvalue=end)):
+        # Like diff_json, items past the end of the shorter array are not compared
+        if legacy_value is end or migrated_value is end:
+            continue
+        sub_tree = (ignore_tree.get(index) or ignore_tree.get("*")) if ignore_tree else None
+        if sub_tree is IGNORED:
+            continue
+        diff_json_recursively(legacy_value, migrated_value, f"root[{index}]", sub_tree, removed, changes)
+    return removed, changes
+
+def compare_responses(legacy_response, migrated_response):
+    # Equal bytes need no parsing, and bodies are parsed straight from bytes instead of response.text
+    legacy_content = legacy_response.content
+    migrated_content = migrated_response.content
+    if legacy_content == migrated_content:
+        return [], {}
+    pause_gc()
+    try:
+        return compare_bodies(legacy_content, migrated_content)
+    finally:
+        resume_gc()
+
+def pause_gc():
+    # Parsed JSON has no reference cycles, so collections set off by allocating it only cost time.
+    # The collector is process wide, so it stays off until the last thread comparing bodies is done
+    with gc_pause["lock"]:
+        if gc_pause["comparing"] == 0:
+            gc_pause["collecting"] = gc.isenabled()
+            gc.disable()
+        gc_pause["comparing"] += 1
+
+def resume_gc():
+    with gc_pause["lock"]:
+        gc_pause["comparing"] -= 1
+        if gc_pause["comparing"] == 0 and gc_pause["collecting"]:
+            gc.enable()
+
+def compare_bodies(legacy_content, migrated_content):
+    if diff_rules["engine"] == "fast" and min(len(legacy_content), len(migrated_content)) >= diff_rules["incremental_bytes"] and is_json_array(legacy_content) and is_json_array(migrated_content):
+        try:
+            return diff_json_arrays(legacy_content, migrated_content, diff_rules["ignore_tree"])
+        except ValueError:
+            # An array that turns out not to be valid JSON is compared whole below
+            pass
+    try:
+        legacy_response_json = decode_json(legacy_content)
+        migrated_response_json = decode_json(migrated_content)
+    except ValueError:
+        # Bodies only get here when their bytes differ, so one that is not JSON, such as an HTML error page, changed whole
+        return [], {"root": {"old_value": body_preview(legacy_content), "new_value": body_preview(migrated_content)}}
+    if diff_rules["engine"] == "deepdiff":
+        return deepdiff_json(legacy_response_json, migrated_response_json, diff_rules["ignore"])
+    else:
+        return diff_json(legacy_response_json, migrated_response_json, diff_rules["ignore_tree"])
+
+def request_body(data):
+    # Replayed traffic can have no body or one that is not JSON
+    if len(data) == 0:
+        return None
+    try:
+        return json.loads(data)
+    except ValueError:
+        return data.decode(errors="replace")
+
+def format_size(size):
+    for unit in ["B", "KB", "MB"]:
+        if size < 1024 or unit == "MB":
+            return f"{size} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+def cache_lifetime(cache_control):
+    directives = [directive.strip().lower() for directive in cache_control.split(",")]
+    if "no-store" in directives or "no-cache" in directives:
+        return 0
+    for directive in directives:
+        name, _, seconds = directive.partition("=")
+        if name in ["s-maxage", "max-age"] and seconds.strip('"').isdigit():
+            return int(seconds.strip('"'))
+    return None
+
+def payload_discrepencies(legacy_response, migrated_response):
+    MIN_LARGER_BYTES = 1024
+    rows = []
+    if payload["size"] is not False:
+        sizes = {"body": (len(legacy_response.content), len(migrated_response.content))}
+        legacy_timings = getattr(legacy_response, "timings", None)
+        migrated_timings = getattr(migrated_response, "timings", None)
+        # Responses replayed from a cassette were never on the wire
+        if legacy_timings is not None and migrated_timings is not None:
+            sizes["wire"] = (legacy_timings["wire_bytes"], migrated_timings["wire_bytes"])
+        for path, (legacy_bytes, migrated_bytes) in sizes.items():
+            if migrated_bytes - legacy_bytes >= MIN_LARGER_BYTES and migrated_bytes >= payload["size"] * legacy_bytes:
+                ratio = f"x{migrated_bytes / legacy_bytes:.2f}" if legacy_bytes > 0 else "from empty"
+                rows.append({"kind": "size", "path": path, "legacy": format_size(legacy_bytes), "migrated": f"{format_size(migrated_bytes)} ({ratio})"})
+                # A larger wire size only adds something when the body itself was not larger, such as a lost compression
+                break
+
+    if payload["compression"]:
+        legacy_encoding = legacy_response.headers.get("Content-Encoding", "identity").lower()
+        migrated_encoding = migrated_response.headers.get("Content-Encoding", "identity").lower()
+        if legacy_encoding in COMPRESSED_ENCODINGS and migrated_encoding not in COMPRESSED_ENCODINGS:
+            rows.append({"kind": "compression", "legacy": legacy_encoding, "migrated": migrated_encoding})
+
+    if payload["cache"]:
+        for header in CACHE_HEADERS:
+            legacy_value = legacy_response.headers.get(header)
+            migrated_value = migrated_response.headers.get(header)
+            if legacy_value is None:
+                continue
+            if migrated_value is None:
+                rows.append({"kind": "cache", "path": header, "legacy": legacy_value, "migrated": f"Missing: {header}"})
+            elif header == "Cache-Control":
+                legacy_lifetime = cache_lifetime(legacy_value)
+                migrated_lifetime = cache_lifetime(migrated_value)
+                if legacy_lifetime is not None and (migrated_lifetime or 0) < legacy_lifetime:
+                    rows.append({"kind": "cache", "path": header, "legacy": legacy_value, "migrated": migrated_value})
+
+    legacy_revalidated = getattr(legacy_response, "revalidated", None)
+    migrated_revalidated = getattr(migrated_response, "revalidated", None)
+    if legacy_revalidated is not None and legacy_revalidated["status"] == 304:
+        if migrated_revalidated is None:
+            rows.append({"kind": "conditional", "legacy": "304", "migrated": "None (no ETag)"})
+        elif migrated_revalidated["status"] != 304:
+            rows.append({"kind": "conditional", "legacy": "304", "migrated": f"{migrated_revalidated['status']} ({format_size(migrated_revalidated['bytes'])})"})
+    return rows
+
+def test_result(request, response, durations):
+    return {
+        "url": request["url"],
+        "params": request["params"],
+        "body": request_body(request["data"]),
+        "status": response.status_code,
+        "error": getattr(response, "error", None),
+        "durations": durations,
+        # Responses replayed from a cassette were never timed
+        "timings": getattr(response, "timings", None),
+        "retries": getattr(response, "attempts", []),
+        "waited": getattr(response, "waited", 0),
+        "payload": {
+            "bytes": len(response.content),
+            "encoding": response.headers.get("Content-Encoding"),
+            "etag": response.headers.get("ETag"),
+            "cache_control": response.headers.get("Cache-Control"),
+            "revalidated": getattr(response, "revalidated", None)
+        }
+    }
+
+def report_test(index, attr, value, legacy_request, migrated_request, legacy_response, legacy_durations, migrated_response, migrated_durations, discrepencies, verbose=True):
+    legacy_duration = percentile(legacy_durations, 50)
+    migrated_duration = percentile(migrated_durations, 50)
+    legacy_formatted_time = format_latency(legacy_durations)
+    migrated_formatted_time = format_latency(migrated_durations)
+
+    passed = True
+    rows = []
+    removed, changes, slowdown, payload_rows = [], {}, None, []
+    if legacy_response.status_code is None or migrated_response.status_code is None:
+        rows.append({"kind": "error", "legacy": response_status(legacy_response), "migrated": response_status(migrated_response)})
+        passed = False
+    elif legacy_response.status_code != migrated_response.status_code:
+        rows.append({"kind": "status", "legacy": legacy_response.status_code, "migrated": migrated_response.status_code})
+        passed = False
+    elif legacy_response.status_code == 200 and migrated_response.status_code == 200:
+        passed = True
+        removed, changes = compare_responses(legacy_response, migrated_response)
+
+        if len(removed) > 0:
+            passed = False
+        for missing_attr in removed:
+            rows.append({"kind": "removed", "path": missing_attr, "legacy": "", "migrated": f"Missing: {missing_attr}"})
+
+        if len(changes) > 0:
+            passed = False
+        for changed_attr, change in changes.items():
+            rows.append({"kind": "changed", "path": changed_attr, "legacy": f"Changed: {changed_attr} from {change['old_value']}", "migrated": f"Changed: {changed_attr} to {change['new_value']}"})
+        
+        THIRTY_SECONDS = 30
+        time_ratio = migrated_duration / legacy_duration if legacy_duration > 0 else math.inf
+        slower = migrated_duration >= latency["threshold"] * legacy_duration or migrated_duration > THIRTY_SECONDS + legacy_duration
+        significance = ""
+        if slower and len(legacy_durations) > 1:
+            p_value = mann_whitney_p_value(legacy_durations, migrated_durations)
+            slower = p_value < latency["alpha"]
+            significance = f", p={p_value:.3f}"
+        if slower:
+            slowdown = f"+{format_time(migrated_duration - legacy_duration)} (x{time_ratio:.2f}{significance})"
+            rows.append({"kind": "time", "legacy": legacy_formatted_time, "migrated": f"{migrated_formatted_time} (x{time_ratio:.2f}{significance})"})
+            passed = False
+
+        payload_rows = payload_discrepencies(legacy_response, migrated_response)
+        if len(payload_rows) > 0:
+            passed = False
+        rows.extend(payload_rows)
+
+    result = {
+        "index": index,
+        "attr": attr,
+        "value": value,
+        "legacy": test_result(legacy_request, legacy_response, legacy_durations),
+        "migrated": test_result(migrated_request, migrated_response, migrated_durations),
+        "passed": passed,
+        "discrepencies": rows
+    }
+    discrepencies.add(result)
+    if verbose:
+        print_test(attr, value, legacy_response, legacy_duration, legacy_formatted_time, migrated_response, migrated_duration, migrated_formatted_time, removed, changes, slowdown, payload_rows)
+    return result
+
+def print_test(attr, value, legacy_response, legacy_duration, legacy_formatted_time, migrated_response, migrated_duration, migrated_formatted_time, removed, changes, slowdown, payload_rows):
     TIME_JUST = 13
     CODE_JUST = 4
     CODE_MISMATCH_JUST = 40
@@ -358,243 +2134,1484 @@ def run_test(legacy_url, migrated_url, attr, value, headers, legacy_params, migr
     print(Style.BRIGHT + f"{attr}: {get_text_value(value)}")
 
     print(f"\tLegacy:   ", end="")
-    legacy_start = time.time()
-    legacy_response = call_api(
-        legacy_url,
-        headers=headers,
-        params=legacy_params,
-        json=legacy_body,
-        verify=False
-    )
-    legacy_duration = time.time() - legacy_start
     legacy_time_color = get_text_time_color(legacy_duration)
-    legacy_formatted_time = format_time(legacy_duration)
-    print(legacy_time_color + f"{legacy_formatted_time}".ljust(TIME_JUST), end="")
+    time_just = max(TIME_JUST, len(legacy_formatted_time) + 1, len(migrated_formatted_time) + 1)
+    print(legacy_time_color + f"{legacy_formatted_time}".ljust(time_just), end="")
 
     legacy_status_color = get_text_code_color(legacy_response.status_code)
-    print(legacy_status_color + f"{legacy_response.status_code}".ljust(CODE_JUST), end="\n")
+    print(legacy_status_color + f"{response_status(legacy_response)}".ljust(CODE_JUST), end="\n")
 
     print(f"\tMigrated: ", end="")
-    migrated_start = time.time()
-    migrated_response = call_api(
-        migrated_url,
-        headers=headers,
-        params=migrated_params,
-        json=migrated_body,
-        verify=False
-    )
-    migrated_duration = time.time() - migrated_start
     migrated_time_color = get_text_time_color(migrated_duration)
-    migrated_formatted_time = format_time(migrated_duration)
-    print(migrated_time_color + f"{migrated_formatted_time}".ljust(TIME_JUST), end="")
+    print(migrated_time_color + f"{migrated_formatted_time}".ljust(time_just), end="")
 
     migrated_status_color = get_text_code_color(migrated_response.status_code)
-    print(migrated_status_color + f"{migrated_response.status_code}".ljust(CODE_JUST), end="")
+    print(migrated_status_color + f"{response_status(migrated_response)}".ljust(CODE_JUST), end="")
 
-    passed = True
-    if legacy_response.status_code != migrated_response.status_code:
+    if legacy_response.status_code is None or migrated_response.status_code is None:
+        print(Fore.RED + Style.BRIGHT + "REQUEST FAILED".rjust(CODE_MISMATCH_JUST), end="")
+    elif legacy_response.status_code != migrated_response.status_code:
         print(Fore.RED + Style.BRIGHT + "CODE MISMATCH".rjust(CODE_MISMATCH_JUST), end="")
-        discrepencies.add(attr, value, legacy_response.status_code, migrated_response.status_code)
-        passed = False
     elif legacy_response.status_code == 200 and migrated_response.status_code == 200:
-        passed = True
-        legacy_response_json = json.loads(legacy_response.text)
-        migrated_response_json = json.loads(migrated_response.text)
-        diff = DeepDiff(legacy_response_json, migrated_response_json)
-
-        removed = diff.get("dictionary_item_removed", {})
         if len(removed) > 0:
             print(Fore.RED + f"Removed: {len(removed)}".ljust(DISCREPENCIES_JUST), end="")
-            passed = False
         else:
             print("".ljust(DISCREPENCIES_JUST), end="")
-        for missing_attr in removed:
-            discrepencies.add(attr, value, "", f"Missing: {missing_attr}")
 
-        changes = {**diff.get("values_changed", {}), **diff.get("type_changes", {})}
         if len(changes) > 0:
             print(Fore.RED + f"Changed: {len(changes)}".ljust(DISCREPENCIES_JUST), end="")
-            passed = False
         else:
             print("".ljust(DISCREPENCIES_JUST), end="")
-        for changed_attr, change in changes.items():
-            discrepencies.add(attr, value, f"Changed: {changed_attr} from {change['old_value']}", f"Changed: {changed_attr} to {change['new_value']}")
-        
-        THIRTY_SECONDS = 30 * 1000
-        time_ratio = migrated_duration / legacy_duration
-        if (migrated_duration >= 1.25 * legacy_duration or migrated_duration >  THIRTY_SECONDS + legacy_duration):
-            print(Fore.RED + f"Time: +{format_time(migrated_duration - legacy_duration)} (x{time_ratio:.2f})".ljust(TIME_DIFF_JUST), end="")
-            discrepencies.add(attr, value, legacy_formatted_time, f"{migrated_formatted_time} (x{time_ratio:.2f})")
-            passed = False
+
+        if slowdown is not None:
+            print(Fore.RED + f"Time: {slowdown}".ljust(TIME_DIFF_JUST), end="")
         else:
             print("".ljust(TIME_DIFF_JUST), end="")
 
-    if passed: discrepencies.success()
-    else: discrepencies.fail()
+        for row in payload_rows:
+            print(Fore.RED + f"{CLUSTER_TITLES[row['kind']]}: {row['migrated']}".ljust(DISCREPENCIES_JUST) + " ", end="")
+
+    legacy_retries = len(getattr(legacy_response, "attempts", []))
+    migrated_retries = len(getattr(migrated_response, "attempts", []))
+    if legacy_retries > 0 or migrated_retries > 0:
+        print(Fore.YELLOW + f"Retried: {legacy_retries} legacy, {migrated_retries} migrated", end="")
     print()
 
-def test_path():
-    stable_legacy_params = get_stable_elements(query, in_legacy=True)
-    stable_migrated_params = get_stable_elements(query, in_legacy=False)
-    stable_legacy_body = get_stable_elements(body, in_legacy=True)
-    stable_migrated_body = get_stable_elements(body, in_legacy=False)
+def finish_test(index, attr, value, legacy_request, migrated_request, future, saved, discrepencies):
+    if saved is not None:
+        discrepencies.add(saved, journaled=True)
+        result = saved
+    else:
+        result = report_test(index, attr, value, legacy_request, migrated_request, *future.result(), discrepencies, verbose=not headless)
+    if spending is not None:
+        spending.observe(discrepencies.section, attr, result)
+    # Headless runs only report the pauses in their summary
+    if not headless:
+        for breaker in breakers.values():
+            breaker.report()
+
+def run_tests(tests, discrepencies):
+    # Keep up to `concurrency` variations in flight but report them in plan order
+    pending = deque()
+    for attr, value, legacy_request, migrated_request in tests:
+        index = next(plan_positions)
+        if index % shard["count"] != shard["index"]:
+            continue
+        saved = journal.pop(discrepencies.section, attr, value) if journal is not None else None
+        # Results saved by a previous run cost nothing, so they are always reported
+        if spending is not None and saved is None:
+            if spending.exhausted(len(pending)):
+                break
+            if not spending.sample(discrepencies.section, attr):
+                continue
+        future = executor.submit(measure_test, legacy_request, migrated_request) if saved is None else None
+        pending.append((index, attr, value, legacy_request, migrated_request, future, saved))
+        if len(pending) >= concurrency:
+            finish_test(*pending.popleft(), discrepencies)
+    while pending:
+        finish_test(*pending.popleft(), discrepencies)
+    return discrepencies
+
+def path_tests():
+    for path_pattern, path_variables in path.items():
+        for path_variable in itertools.islice(path_variables, 1, None):
+            yield (
+                path_pattern,
+                path_variable,
+                *(
+                    make_request(
+                        side,
+                        str(get_keyword_code(path_variable, in_legacy=side == "legacy")).join(plan[side]["path_parts"][path_pattern]),
+                        plan[side]["params"],
+                        plan[side]["data"]
+                    )
+                    for side in ["legacy", "migrated"]
+                )
+            )
 
-    # Test URL and path variables
-    path_discrepencies = Discrepencies()
+def query_variation(side, attr, value):
+    params = plan[side]["params_tree"]
+    value = get_keyword_code(value, in_legacy=side == "legacy")
+    return {key: value if key == attr else params[key] for key in params if (value if key == attr else params[key]) != "$omit"}
 
+def query_tests():
+    for attr, values in query.items():
+        if type(values) != Options:
+            continue
+        for value in itertools.islice(values, 1, None):
+            yield (
+                attr,
+                value,
+                *(make_request(side, plan[side]["url"], query_variation(side, attr, value), plan[side]["data"]) for side in ["legacy", "migrated"])
+            )
+
+def body_options(body_sub, keys=()):
+    for key, value in body_sub.items():
+        if type(value) == Options:
+            yield keys + (key,), value
+        elif type(value) == dict:
+            yield from body_options(value, keys + (key,))
+
+def body_tests():
+    for keys, options in body_options(body):
+        for option in itertools.islice(options, 1, None):
+            yield (
+                ".".join(keys),
+                option,
+                *(
+                    make_request(side, plan[side]["url"], plan[side]["params"], splice_body(plan[side], keys, get_keyword_code(option, in_legacy=side == "legacy")))
+                    for side in ["legacy", "migrated"]
+                )
+            )
+
+def combination_parameters():
+    parameters = []
     for path_pattern, path_variables in path.items():
-        for path_variable in path_variables[1:]:
-            temp_legacy_url = endpoints['legacy'].replace(path_pattern, str(get_keyword_code(path_variable, in_legacy=True)))
-            temp_legacy_url = get_stable_url(temp_legacy_url, in_legacy=True)
-            temp_migrated_url = endpoints['migrated'].replace(path_pattern, str(get_keyword_code(path_variable, in_legacy=False)))
-            temp_migrated_url = get_stable_url(temp_migrated_url, in_legacy=False)
+        parameters.append(("path", path_pattern, [path_pattern], path_variables))
+    for attr, values in query.items():
+        if type(values) == Options:
+            parameters.append(("query", f"query.{attr}", [attr], values))
 
-            run_test(temp_legacy_url, temp_migrated_url, path_pattern, path_variable, headers, stable_legacy_params, stable_migrated_params, stable_legacy_body, stable_migrated_body, path_discrepencies)
+    def body_parameters(body_sub, keys):
+        for key, value in body_sub.items():
+            if type(value) == Options:
+                parameters.append(("body", "body." + ".".join(keys + [key]), keys + [key], value))
+            elif type(value) == dict:
+                body_parameters(value, keys + [key])
+
+    body_parameters(body, [])
+    # Attributes with only a stable option never vary, so they are left out of the combinations
+    return [parameter for parameter in parameters if len(parameter[3]) > 1]
+
+def covering_rows(sizes, strength):
+    # Greedily builds rows, one at a time, until every combination of `strength` option indices is covered
+    MAX_CANDIDATES = 64
+    rng = random.Random(0)
+    strength = min(strength, len(sizes))
+    groups = list(itertools.combinations(range(len(sizes)), strength))
+    groups_by_attr = [[g for g, group in enumerate(groups) if attr in group] for attr in range(len(sizes))]
+    # Covered tuples are kept sparsely, so memory grows with the rows generated and not with the option space, which
+    # lazy sources can make far too large to hold one flag per tuple
+    covered = [set() for _ in groups]
+    remaining = [math.prod(sizes[attr] for attr in group) for group in groups]
+    cursors = [0] * len(groups)
+
+    def tuple_index(g, row):
+        index = 0
+        for attr in groups[g]:
+            index = index * sizes[attr] + row[attr]
+        return index
+
+    while any(remaining):
+        # Start from the first uncovered tuple of the group with the most left to cover
+        g = max(range(len(groups)), key=remaining.__getitem__)
+        while cursors[g] in covered[g]:
+            cursors[g] += 1
+        row = [None] * len(sizes)
+        index = cursors[g]
+        for attr in reversed(groups[g]):
+            index, row[attr] = divmod(index, sizes[attr])
+
+        free = [attr for attr in range(len(sizes)) if row[attr] is None]
+        rng.shuffle(free)
+        for attr in free:
+            candidates = range(sizes[attr]) if sizes[attr] <= MAX_CANDIDATES else rng.sample(range(sizes[attr]), MAX_CANDIDATES)
+            best_value, best_gain = 0, -1
+            for value in candidates:
+                row[attr] = value
+                gain = 0
+                for other in groups_by_attr[attr]:
+                    if all(row[member] is not None for member in groups[other]):
+                        gain += tuple_index(other, row) not in covered[other]
+                if gain > best_gain:
+                    best_value, best_gain = value, gain
+            row[attr] = best_value
+
+        for g in range(len(groups)):
+            index = tuple_index(g, row)
+            if index not in covered[g]:
+                covered[g].add(index)
+                remaining[g] -= 1
+        yield tuple(row)
+
+def combination_request(side, changes):
+    in_legacy = side == "legacy"
+    url = endpoints[side]
+    request_params = dict(plan[side]["params_tree"])
+    request_body = dict(plan[side]["body_tree"])
+    for (section, attr, keys, options), index in changes:
+        value = get_keyword_code(options[index], in_legacy)
+        if section == "path":
+            url = url.replace(attr, str(value))
+            continue
+        container = request_params if section == "query" else request_body
+        # Only the dicts on the way to a changed key are copied, the rest stay shared with the plan
+        for key in keys[:-1]:
+            container[key] = dict(container[key])
+            container = container[key]
+        container[keys[-1]] = value
+    return make_request(side, get_stable_url(url, in_legacy), strip_omits(request_params), json.dumps(strip_omits(request_body), allow_nan=False).encode())
+
+def combination_tests():
+    parameters = combination_parameters()
+    if len(parameters) == 0:
+        return
+    sizes = [len(options) for _, _, _, options in parameters]
+    if strategy["name"] == "exhaustive":
+        rows = itertools.product(*[range(size) for size in sizes])
+    else:
+        rows = covering_rows(sizes, strategy["strength"])
+
+    for row in rows:
+        changes = [(parameter, index) for parameter, index in zip(parameters, row) if index != 0]
+        # Every stable option at once is the baseline, which has already been tested
+        if len(changes) == 0:
+            continue
+        yield (
+            ", ".join(attr for (_, attr, _, _), _ in changes),
+            [options[index] for (_, _, _, options), index in changes],
+            combination_request("legacy", changes),
+            combination_request("migrated", changes)
+        )
+
+def test_path(discrepencies):
+    # Test URL and path variables
+    return run_tests(path_tests(), discrepencies)
 
-    return path_discrepencies
+def test_query(discrepencies):
+    # Test param queries
+    return run_tests(query_tests(), discrepencies)
+
+def test_body(discrepencies):
+    return run_tests(body_tests(), discrepencies)
+
+def test_combinations(discrepencies):
+    return run_tests(combination_tests(), discrepencies)
+
+def har_requests(file_path):
+    # Entries are parsed one at a time from a growing window of the file, so the capture is never loaded whole
+    CHUNK = 1024 * 1024
+    HAR_ENTRIES_TAIL = 256
+    decoder = json.JSONDecoder()
+    with open(file_path, 'r', encoding='utf-8') as file:
+        buffer = ""
+        match = None
+        while match is None:
+            chunk = file.read(CHUNK)
+            if not chunk:
+                print(f"The HAR file {file_path} has no log.entries array...")
+                sys.exit()
+            # Keep the end of the window in case "entries": [ is split between two chunks
+            buffer = buffer[-HAR_ENTRIES_TAIL:] + chunk
+            match = HAR_ENTRIES.search(buffer)
+        position = match.end()
+        index = 0
+        while True:
+            position = JSON_WHITESPACE_TEXT.match(buffer, position).end()
+            delimiter = buffer[position:position + 1]
+            if delimiter == "]":
+                return
+            if delimiter == ",":
+                position += 1
+                continue
+            entry = None
+            if delimiter == "{":
+                try:
+                    entry, position = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    pass
+            if entry is not None:
+                request = entry.get("request", {})
+                post_data = request.get("postData", {})
+                yield {
+                    "index": index,
+                    "method": request.get("method", "GET").upper(),
+                    "url": request.get("url", ""),
+                    "headers": {header["name"]: header["value"] for header in request.get("headers", [])},
+                    "data": post_data.get("text", "").encode(),
+                    "time": captured_time(entry["startedDateTime"], f"Entry {index} of {file_path}") if "startedDateTime" in entry else None
+                }
+                index += 1
+                continue
+            # The entry runs past the window, which doubles so a huge entry is not parsed over and over
+            chunk = file.read(max(CHUNK, len(buffer) - position))
+            if not chunk:
+                print(f"The HAR file {file_path} ends in the middle of entry {index}...")
+                sys.exit()
+            buffer = buffer[position:] + chunk
+            position = 0
 
-def test_query():
-    stable_legacy_url = get_stable_url(endpoints['legacy'], in_legacy=True)
-    stable_migrated_url = get_stable_url(endpoints['migrated'], in_legacy=False)
-    stable_legacy_params = get_stable_elements(query, in_legacy=True)
-    stable_migrated_params = get_stable_elements(query, in_legacy=False)
-    stable_legacy_body = get_stable_elements(body, in_legacy=True)
-    stable_migrated_body = get_stable_elements(body, in_legacy=False)
+def captured_time(timestamp, where):
+    try:
+        return datetime.fromisoformat(timestamp.replace("Z", "+00:00")).timestamp()
+    except (ValueError, AttributeError):
+        print(f"{where} has the time {timestamp}, which is not an ISO 8601 timestamp...")
+        sys.exit()
 
-    # Test param queries
-    param_discrepencies = Discrepencies()
-    for attr, values in query.items():
-        unstable_legacy_params = stable_legacy_params.copy()
-        unstable_migrated_params = stable_migrated_params.copy()
-        for value in values[1:]:
-            unstable_legacy_params[attr] = get_keyword_code(value, in_legacy=True)
-            unstable_migrated_params[attr] = get_keyword_code(value, in_legacy=False)
-            remove_omit_keys(unstable_legacy_params)
-            remove_omit_keys(unstable_migrated_params)
+def jsonl_requests(file_path):
+    with open(file_path, 'r', encoding='utf-8') as file:
+        for index, line in enumerate(file):
+            if not line.strip():
+                continue
+            try:
+                logged = json.loads(line)
+            except json.JSONDecodeError:
+                logged = None
+            if type(logged) != dict:
+                print(f"Line {index + 1} of {file_path} is not a JSON object...")
+                sys.exit()
+            data = logged.get("body", None)
+            if data is None:
+                data = ""
+            elif type(data) != str:
+                data = json.dumps(data)
+            logged_time = logged.get("time", None)
+            if type(logged_time) == str:
+                logged_time = captured_time(logged_time, f"Line {index + 1} of {file_path}")
+            yield {
+                "index": index,
+                "method": logged.get("method", "GET").upper(),
+                "url": logged.get("url", ""),
+                "headers": logged.get("headers", {}),
+                "data": data.encode(),
+                "time": logged_time
+            }
+
+def captured_requests():
+    for file_path in traffic["paths"]:
+        reader = har_requests if TRAFFIC_EXTENSIONS[os.path.splitext(file_path)[1].lower()] == "har" else jsonl_requests
+        for captured in reader(file_path):
+            captured["file"] = os.path.basename(file_path)
+            yield captured
+
+def endpoint_prefix(url):
+    # Everything before the first path variable, captured paths under it are moved under the other side's prefix
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}", parts.path.split("@")[0]
+
+def custom_mapping():
+    # Captured traffic holds legacy's values, migrated gets the value custom pairs with each of them
+    return {json.dumps(values[0]): values[1] for values in custom.values()}
+
+def custom_text_mapping():
+    # Path segments and query values are text, so they match the text of a custom value
+    return {str(values[0]): str(values[1]) for values in custom.values()}
+
+def map_custom(value, mapping):
+    if type(value) == dict:
+        return {key: map_custom(item, mapping) for key, item in value.items()}
+    if type(value) == list:
+        return [map_custom(item, mapping) for item in value]
+    return mapping.get(json.dumps(value), value)
+
+def map_custom_data(data, mapping):
+    if len(mapping) == 0 or len(data) == 0:
+        return data
+    try:
+        parsed = json.loads(data)
+    except ValueError:
+        return data
+    mapped = json.dumps(map_custom(parsed, mapping)).encode()
+    # Compared serialized, since values equal in Python such as true and 1 can still be mapped to each other
+    return data if mapped == json.dumps(parsed).encode() else mapped
+
+def traffic_headers(captured_headers, side):
+    kept = {name: value for name, value in captured_headers.items() if not name.startswith(":") and name.lower() not in CONNECTION_HEADERS}
+    configured = {name.lower() for name in plan[side]["headers"]}
+    return {**{name: value for name, value in kept.items() if name.lower() not in configured}, **plan[side]["headers"]}
+
+def traffic_tests(paced=True):
+    legacy_origin, legacy_prefix = endpoint_prefix(endpoints["legacy"])
+    migrated_origin, migrated_prefix = endpoint_prefix(endpoints["migrated"])
+    mapping = custom_mapping()
+    text_mapping = custom_text_mapping()
+    seen = set()
+    start = None
+    for captured in captured_requests():
+        url = urlsplit(captured["url"])
+        # Only the configured endpoint can be compared, the rest of the capture is someone else's traffic
+        if captured["method"] != endpoints["method"] or not url.path.startswith(legacy_prefix):
+            traffic["skipped"] += 1
+            continue
+        params = parse_qsl(url.query, keep_blank_values=True)
+        if traffic["dedupe"]:
+            key = hashlib.sha256(json.dumps([url.path, params]).encode() + b"\n" + captured["data"]).digest()
+            if key in seen:
+                traffic["duplicates"] += 1
+                continue
+            seen.add(key)
+        if paced and traffic["pace"] > 0 and captured["time"] is not None:
+            if start is None:
+                start = (time.monotonic(), captured["time"])
+            delay = start[0] + (captured["time"] - start[1]) / traffic["pace"] - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        traffic["replayed"] += 1
+        rest = url.path[len(legacy_prefix):]
+        migrated_rest = "/".join(text_mapping.get(segment, segment) for segment in rest.split("/"))
+        yield (
+            url.path + ("?" + url.query if url.query else ""),
+            f"{captured['file']}#{captured['index'] + 1}",
+            {"side": "legacy", "url": legacy_origin + legacy_prefix + rest, "headers": traffic_headers(captured["headers"], "legacy"), "params": params, "data": captured["data"]},
+            {"side": "migrated", "url": migrated_origin + migrated_prefix + migrated_rest, "headers": traffic_headers(captured["headers"], "migrated"), "params": [(name, text_mapping.get(value, value)) for name, value in params], "data": map_custom_data(captured["data"], mapping)}
+        )
+
+def test_traffic(discrepencies):
+    return run_tests(traffic_tests(), discrepencies)
+
+def load_mix():
+    # None stands for the stable request, every other choice is an attribute to send a random variation of
+    choices = [None] + combination_parameters()
+    names = ["$stable"] + [".".join(keys) for _, _, keys, _ in choices[1:]]
+    weights = [load["weights"].get(name, 1) for name in names]
+    return [choice for choice, weight in zip(choices, weights) if weight > 0], [weight for weight in weights if weight > 0]
+
+def load_requests(choice, rng):
+    if choice is None:
+        return stable_requests()
+    changes = [(choice, rng.randrange(1, len(choice[3])))]
+    return combination_request("legacy", changes), combination_request("migrated", changes)
+
+def send_load_request(request, scheduled):
+    started = time.perf_counter()
+    try:
+        response, _ = send_request(request, guarded=False)
+        error = response.status_code >= 500
+    except requests.RequestException:
+        error = True
+    finished = time.perf_counter()
+    # Latency is measured from when the request should have been sent so that queueing on our side is not hidden
+    return request["side"], finished - scheduled, finished - started, error, finished
+
+def run_load_level(rps, mix, weights, load_executor, rng):
+    total_requests = max(1, round(rps * load["duration"]))
+    interval = 1 / rps
+    futures = []
+    max_lag = 0
+    start = time.perf_counter()
+    for i in range(total_requests):
+        scheduled = start + i * interval
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            max_lag = max(max_lag, -delay)
+        legacy_request, migrated_request = load_requests(rng.choices(mix, weights)[0], rng)
+        futures.append(load_executor.submit(send_load_request, legacy_request, scheduled))
+        futures.append(load_executor.submit(send_load_request, migrated_request, scheduled))
+
+    level = {"rps": rps, "max_lag": max_lag, "legacy": {"latencies": [], "service": [], "errors": 0}, "migrated": {"latencies": [], "service": [], "errors": 0}}
+    last_finished = start
+    for future in futures:
+        side, elapsed, service, error, finished = future.result()
+        level[side]["latencies"].append(elapsed)
+        level[side]["service"].append(service)
+        level[side]["errors"] += error
+        last_finished = max(last_finished, finished)
+    for side in ["legacy", "migrated"]:
+        level[side]["throughput"] = len(level[side]["latencies"]) / (last_finished - start)
+    return level
+
+def latency_histogram(latencies):
+    BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, math.inf]
+    MS_IN_SECOND = 1000
+    counts = [0] * len(BUCKETS_MS)
+    for seconds in latencies:
+        counts[bisect.bisect_left(BUCKETS_MS, seconds * MS_IN_SECOND)] += 1
+    return list(zip(BUCKETS_MS, counts))
+
+def print_load_level(level):
+    LABEL_JUST = 16
+    SIDE_JUST = 24
+    BAR_WIDTH = 20
+    legacy = level["legacy"]
+    migrated = level["migrated"]
+    print(Style.BRIGHT + f"\n{level['rps']} requests per second for {format_time(load['duration'])}")
+    print("".ljust(LABEL_JUST) + "Legacy".ljust(SIDE_JUST) + "Migrated")
+    print("Throughput".ljust(LABEL_JUST) + f"{legacy['throughput']:.1f} rps".ljust(SIDE_JUST) + f"{migrated['throughput']:.1f} rps")
+    print("Error Rate".ljust(LABEL_JUST) + f"{100 * legacy['errors'] / len(legacy['latencies']):.2f}%".ljust(SIDE_JUST) + f"{100 * migrated['errors'] / len(migrated['latencies']):.2f}%")
+    for percent in [50, 95, 99]:
+        print(f"p{percent}".ljust(LABEL_JUST) + format_time(percentile(legacy["latencies"], percent)).ljust(SIDE_JUST) + format_time(percentile(migrated["latencies"], percent)))
+    print("Max".ljust(LABEL_JUST) + format_time(max(legacy["latencies"])).ljust(SIDE_JUST) + format_time(max(migrated["latencies"])))
+    if level["max_lag"] >= 0.001:
+        print(Fore.YELLOW + f"Sending fell up to {format_time(level['max_lag'])} behind schedule, which is included in the latencies above")
+
+    legacy_histogram = latency_histogram(legacy["latencies"])
+    migrated_histogram = latency_histogram(migrated["latencies"])
+    most = max(count for _, count in legacy_histogram + migrated_histogram)
+    for (bucket, legacy_count), (_, migrated_count) in zip(legacy_histogram, migrated_histogram):
+        if legacy_count == 0 and migrated_count == 0:
+            continue
+        label = f"<= {bucket} ms" if bucket != math.inf else "> 10 s"
+        legacy_bar = "#" * math.ceil(BAR_WIDTH * legacy_count / most)
+        migrated_bar = "#" * math.ceil(BAR_WIDTH * migrated_count / most)
+        print(label.ljust(LABEL_JUST) + f"{legacy_bar} {legacy_count}".ljust(SIDE_JUST) + f"{migrated_bar} {migrated_count}")
+
+def load_report(levels):
+    report = ""
+    for level in levels:
+        legacy = level["legacy"]
+        migrated = level["migrated"]
+        report += f"## {level['rps']} requests per second for {format_time(load['duration'])}\n"
+        report += "||Legacy|Migrated|\n"
+        report += "|:-:|:-:|:-:|\n"
+        report += f"|Throughput|{legacy['throughput']:.1f} rps|{migrated['throughput']:.1f} rps|\n"
+        report += f"|Error Rate|{100 * legacy['errors'] / len(legacy['latencies']):.2f}%|{100 * migrated['errors'] / len(migrated['latencies']):.2f}%|\n"
+        for percent in [50, 95, 99]:
+            report += f"|p{percent}|{format_time(percentile(legacy['latencies'], percent))}|{format_time(percentile(migrated['latencies'], percent))}|\n"
+        report += f"|Max|{format_time(max(legacy['latencies']))}|{format_time(max(migrated['latencies']))}|\n"
+        report += f"|Service p50|{format_time(percentile(legacy['service'], 50))}|{format_time(percentile(migrated['service'], 50))}|\n"
+        report += "\n|Latency|Legacy|Migrated|\n"
+        report += "|:-:|:-:|:-:|\n"
+        for (bucket, legacy_count), (_, migrated_count) in zip(latency_histogram(legacy["latencies"]), latency_histogram(migrated["latencies"])):
+            if legacy_count > 0 or migrated_count > 0:
+                report += f"|{f'<= {bucket} ms' if bucket != math.inf else '> 10 s'}|{legacy_count}|{migrated_count}|\n"
+        report += "\n"
+    return report
+
+def run_load_test():
+    mix, weights = load_mix()
+    if len(mix) == 0:
+        print(f"The load weights leave out the stable request and every attribute, so there is nothing to send...")
+        sys.exit()
+    if endpoints["pool"]["size"] is None:
+        open_sessions({**endpoints["pool"], "size": load["workers"]})
+    rng = random.Random(load["seed"])
+    levels = []
+    with ThreadPoolExecutor(max_workers=load["workers"]) as load_executor:
+        for rps in load["rps"]:
+            level = run_load_level(rps, mix, weights, load_executor, rng)
+            print_load_level(level)
+            levels.append(level)
+    return levels
+
+def collect_metrics(results_file_path):
+    metrics = {
+        side: {
+            "requests": 0,
+            "retries": 0,
+            "waited": 0,
+            "untimed": 0,
+            "connections": {"opened": 0, "reused": 0},
+            "bytes": {"request": 0, "response": 0, "wire": 0},
+            "phases": {phase: array("d") for phase in PHASES + ["other"]}
+        }
+        for side in ["legacy", "migrated"]
+    }
+    for result in read_results(results_file_path, partial=True):
+        for side in ["legacy", "migrated"]:
+            timings = result[side].get("timings")
+            side_metrics = metrics[side]
+            side_metrics["requests"] += 1
+            side_metrics["retries"] += len(result[side].get("retries", []))
+            side_metrics["waited"] += result[side].get("waited", 0)
+            if timings is None:
+                side_metrics["untimed"] += 1
+                continue
+            side_metrics["connections"]["reused" if timings["reused"] else "opened"] += 1
+            side_metrics["bytes"]["request"] += timings["request_bytes"]
+            side_metrics["bytes"]["response"] += timings["response_bytes"]
+            side_metrics["bytes"]["wire"] += timings["wire_bytes"]
+            for phase, values in side_metrics["phases"].items():
+                values.append(timings[phase])
+    return metrics
+
+def phase_summary(values):
+    if len(values) == 0:
+        return {"count": 0}
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "sum": sum(ordered),
+        "mean": sum(ordered) / len(ordered),
+        "p50": percentile(ordered, 50),
+        "p90": percentile(ordered, 90),
+        "p99": percentile(ordered, 99),
+        "max": ordered[-1]
+    }
+
+def openmetrics_report(metrics, labels):
+    label_text = ",".join(f'{name}="{value}"' for name, value in labels.items())
+    lines = [
+        "# TYPE dejavu_requests counter",
+        "# HELP dejavu_requests Requests sent to each side, one per test",
+    ]
+    for side, side_metrics in metrics.items():
+        lines.append(f'dejavu_requests_total{{{label_text},side="{side}"}} {side_metrics["requests"]}')
+    lines += ["# TYPE dejavu_retries counter", "# HELP dejavu_retries Attempts that failed and were retried, they are not part of any other metric"]
+    for side, side_metrics in metrics.items():
+        lines.append(f'dejavu_retries_total{{{label_text},side="{side}"}} {side_metrics["retries"]}')
+    lines += ["# TYPE dejavu_throttled_seconds counter", "# UNIT dejavu_throttled_seconds seconds", "# HELP dejavu_throttled_seconds Time spent waiting on the rate limit and circuit breaker"]
+    for side, side_metrics in metrics.items():
+        lines.append(f'dejavu_throttled_seconds_total{{{label_text},side="{side}"}} {side_metrics["waited"]}')
+    lines += ["# TYPE dejavu_connections counter", "# HELP dejavu_connections Requests that opened a new connection or reused a pooled one"]
+    for side, side_metrics in metrics.items():
+        for state, count in side_metrics["connections"].items():
+            lines.append(f'dejavu_connections_total{{{label_text},side="{side}",state="{state}"}} {count}')
+    lines += ["# TYPE dejavu_payload_bytes counter", "# UNIT dejavu_payload_bytes bytes", "# HELP dejavu_payload_bytes Request bodies sent, response bodies decoded and response bodies read off the wire"]
+    for side, side_metrics in metrics.items():
+        for kind, count in side_metrics["bytes"].items():
+            lines.append(f'dejavu_payload_bytes_total{{{label_text},side="{side}",kind="{kind}"}} {count}')
+    lines += ["# TYPE dejavu_request_phase_seconds histogram", "# UNIT dejavu_request_phase_seconds seconds", "# HELP dejavu_request_phase_seconds Time spent in each phase of a request"]
+    for side, side_metrics in metrics.items():
+        for phase, values in side_metrics["phases"].items():
+            phase_labels = f'{label_text},side="{side}",phase="{phase}"'
+            ordered = sorted(values)
+            for bucket in PHASE_BUCKETS:
+                lines.append(f'dejavu_request_phase_seconds_bucket{{{phase_labels},le="{bucket}"}} {bisect.bisect_right(ordered, bucket)}')
+            lines.append(f'dejavu_request_phase_seconds_bucket{{{phase_labels},le="+Inf"}} {len(ordered)}')
+            lines.append(f'dejavu_request_phase_seconds_count{{{phase_labels}}} {len(ordered)}')
+            lines.append(f'dejavu_request_phase_seconds_sum{{{phase_labels}}} {sum(ordered)}')
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+def write_metrics(results_file_path, run_prefix, config_path, central_time):
+    # Timings of every request are in the results file, these are the totals for dashboards
+    metrics = collect_metrics(results_file_path)
+    labels = {"config": os.path.basename(config_path)}
+    with open(run_prefix + ".metrics.txt", 'w') as file:
+        file.write(openmetrics_report(metrics, labels))
+    with open(run_prefix + ".metrics.json", 'w') as file:
+        json.dump({
+            "config": config_path,
+            "time": central_time.isoformat(),
+            "results": os.path.basename(results_file_path),
+            "sides": {
+                side: {
+                    "requests": side_metrics["requests"],
+                    "retries": side_metrics["retries"],
+                    "throttled_seconds": side_metrics["waited"],
+                    "untimed": side_metrics["untimed"],
+                    "connections": side_metrics["connections"],
+                    "bytes": side_metrics["bytes"],
+                    "phases": {phase: phase_summary(values) for phase, values in side_metrics["phases"].items()}
+                }
+                for side, side_metrics in metrics.items()
+            }
+        }, file, indent=4)
+    return metrics
+
+def record_history(results_file_path, config_digest, config_path, central_time, interrupted):
+    history = History(HISTORY_FILE_PATH)
+    run = history.record(config_digest, config_path, central_time, interrupted, read_results(results_file_path, partial=True))
+    history.close()
+    return run
+
+def make_sections(stream=None, journal=None):
+    if traffic is not None:
+        return [("Traffic", "traffic replay", Discrepencies("traffic", stream, journal), test_traffic)]
+    if strategy["name"] == "one-at-a-time":
+        return [
+            ("Path", "path", Discrepencies("path", stream, journal), test_path),
+            ("Params", "params", Discrepencies("params", stream, journal), test_query),
+            ("Body", "body", Discrepencies("body", stream, journal), test_body)
+        ]
+    return [("Combinations", f"{strategy['name']} combinations", Discrepencies("combinations", stream, journal), test_combinations)]
+
+def describe_request(request):
+    prepared = requests.Request(endpoints["method"], request["url"], params=request["params"]).prepare()
+    return f"{endpoints['method']} {prepared.url} {request['data'].decode()}"
+
+def print_plan(sections):
+    SAMPLE_TESTS = 3
+    SECTION_TESTS = {"path": path_tests, "params": query_tests, "body": body_tests, "combinations": combination_tests, "traffic": lambda: traffic_tests(paced=False)}
+    total_tests = 0
+    baseline_requests = 0
+    if traffic is None:
+        baseline_requests = 2
+        legacy_request, migrated_request = stable_requests()
+        print(Style.BRIGHT + "Baseline")
+        print(f"\tLegacy:   {describe_request(legacy_request)}")
+        print(f"\tMigrated: {describe_request(migrated_request)}")
+    for title, _, discrepencies, _ in sections:
+        tests = 0
+        for attr, value, legacy_request, migrated_request in SECTION_TESTS[discrepencies.section]():
+            index = next(plan_positions)
+            if index % shard["count"] != shard["index"]:
+                continue
+            if tests < SAMPLE_TESTS:
+                print(Style.BRIGHT + f"{title}: {attr}: {get_text_value(value)}")
+                print(f"\tLegacy:   {describe_request(legacy_request)}")
+                print(f"\tMigrated: {describe_request(migrated_request)}")
+            tests += 1
+        if tests > SAMPLE_TESTS:
+            print(f"... and {tests - SAMPLE_TESTS} more {title.lower()} tests")
+        print(Style.BRIGHT + f"{title}: {tests} tests\n")
+        total_tests += tests
+    print(Style.BRIGHT + f"Total Tests:    {total_tests}")
+    print(Style.BRIGHT + f"Total Requests: {baseline_requests + total_tests * requests_per_test()}{', including the baseline' if baseline_requests > 0 else ''}")
+
+def run_sections(sections, stream, journal):
+    global spending
+    spending = Spending(budget)
+    interrupted = False
+    try:
+        for _, _, discrepencies, run_section in sections:
+            run_section(discrepencies)
+    except KeyboardInterrupt:
+        interrupted = True
+        print(Style.BRIGHT + Fore.YELLOW + f"\nInterrupted, reporting the tests that finished...")
+    finally:
+        stream.close()
+        journal.close()
+    # A finished run has nothing left to resume, one stopped by its budget can be resumed with a new one
+    if not interrupted and spending.stopped is None:
+        journal.remove()
+    return interrupted
+
+def parse_shard(value):
+    match = re.fullmatch(r"\s*(\d+)\s*/\s*(\d+)\s*", value)
+    if match is None:
+        print(f"--shard must look like i/N, such as 1/4, but {value} was given...")
+        sys.exit()
+    index, count = int(match.group(1)), int(match.group(2))
+    if count < 1 or index < 1 or index > count:
+        print(f"--shard must be between 1/N and N/N, but {value} was given...")
+        sys.exit()
+    return index - 1, count
+
+def set_shard(index, count):
+    shard["index"] = index
+    shard["count"] = count
+
+def run_shard(config_path, index, count, workers, resume, results_file_path, journal_file_path, log_file_path, replay_traffic):
+    # Runs in a worker process, which may have been spawned fresh without any of the parent's state
+    global journal, traffic
+    traffic = replay_traffic
+    sys.stdout = open(log_file_path, 'w', buffering=1)
+    # A forked worker inherits the parent's pooled sockets, which must not be shared between processes
+    host_sessions.clear()
+    start_process_executors(workers)
+    validate_input(read_json(config_path))
+    set_shard(index, count)
+    stream = ResultStream(results_file_path)
+    journal = Journal(journal_file_path, resume=resume)
+    interrupted = run_sections(make_sections(stream, journal), stream, journal)
+    sys.stdout.close()
+    return interrupted, journal.resumed, connection_counts(), spending.summary()
+
+def run_workers(config_path, count, workers, resume, run_prefix, journal_prefix, config_digest):
+    results_file_paths = [f"{run_prefix}.shard-{index + 1}-of-{count}.results.ndjson" for index in range(count)]
+    journal_file_paths = [f"{journal_prefix}.shard-{index + 1}-of-{count}-{config_digest}.journal.ndjson" for index in range(count)]
+    log_file_paths = [f"{run_prefix}.shard-{index + 1}-of-{count}.log" for index in range(count)]
+    print(Style.BRIGHT + f"Running {count} shards, each shard's output is in `{run_prefix}.shard-*.log`...")
+    with ProcessPoolExecutor(max_workers=count) as pool:
+        futures = [
+            pool.submit(run_shard, config_path, index, count, workers, resume, results_file_paths[index], journal_file_paths[index], log_file_paths[index], traffic)
+            for index in range(count)
+        ]
+        try:
+            outcomes = [future.result() for future in futures]
+        except KeyboardInterrupt:
+            # The shards get the same Ctrl-C and stop on their own
+            print(Style.BRIGHT + Fore.YELLOW + f"\nInterrupted, reporting the tests that finished...")
+            outcomes = [future.result() for future in futures]
+    return results_file_paths, outcomes
+
+def merge_results(results_file_paths, results_file_path, sections):
+    stream = ResultStream(results_file_path)
+    by_section = {discrepencies.section: discrepencies for _, _, discrepencies, _ in sections}
+    for discrepencies in by_section.values():
+        discrepencies.stream = stream
+    # Every results file is in plan order, so merging on the plan index keeps the whole plan in order
+    for result in heapq.merge(*[read_results(file_path, partial=True) for file_path in results_file_paths], key=lambda result: result["index"]):
+        if result["section"] not in by_section:
+            print(f"{result['section']} results cannot be merged into a {strategy['name']} run, check the config matches the one the shards ran...")
+            sys.exit()
+        by_section[result["section"]].add(result, journaled=True)
+    stream.close()
+
+def enable_color():
+    global Fore, Back, Style
+    from colorama import Fore, Back, Style, init
+    init(autoreset=True)
 
-            run_test(stable_legacy_url, stable_migrated_url, attr, value, headers, unstable_legacy_params, unstable_migrated_params, stable_legacy_body, stable_migrated_body, param_discrepencies)
+def start_headless():
+    global headless, progress
+    OUTPUT_BUFFER_BYTES = 256 * 1024
+    headless = True
+    progress = Progress()
+    # Everything goes through one large buffer that is flushed by progress lines, not by every line printed
+    sys.stdout.flush()
+    sys.stdout = open(sys.stdout.fileno(), 'w', buffering=OUTPUT_BUFFER_BYTES, encoding=sys.stdout.encoding, errors=sys.stdout.errors, closefd=False)
+    atexit.register(sys.stdout.flush)
+
+def print_totals(sections):
+    total_discrepencies = sum(len(discrepencies) for _, _, discrepencies, _ in sections)
+    tests_passed = sum(discrepencies.passed for _, _, discrepencies, _ in sections)
+    tests_failed = sum(discrepencies.failed for _, _, discrepencies, _ in sections)
+    total_tests = tests_passed + tests_failed
+    total_tests_len = len(str(total_tests))
+    if progress is not None:
+        progress.summary()
+    print(Style.BRIGHT + f"Total Discrepencies: {total_discrepencies}")
+    print(Style.BRIGHT + Fore.GREEN + f"Tests Passed: {f"{tests_passed}".ljust(total_tests_len)}")
+    print(Style.BRIGHT + Fore.RED +   f"Tests Failed: {f"{tests_failed}".ljust(total_tests_len)}")
+    print(Style.BRIGHT +              f"Total Tests:  {total_tests}")
 
-    return param_discrepencies
+def totals_report(sections, interrupted):
+    total_discrepencies = sum(len(discrepencies) for _, _, discrepencies, _ in sections)
+    tests_passed = sum(discrepencies.passed for _, _, discrepencies, _ in sections)
+    tests_failed = sum(discrepencies.failed for _, _, discrepencies, _ in sections)
+    total_tests = tests_passed + tests_failed
+    return f"""{"**This run was interrupted**, only the tests that finished are reported." + chr(10) + chr(10) if interrupted else ""}**Tests Passed**: <span style="color: green;">{tests_passed} ({(100 * tests_passed / max(total_tests, 1)):.2f}%)</span>
 
-def test_body():
-    stable_legacy_url = get_stable_url(endpoints['legacy'], in_legacy=True)
-    stable_migrated_url = get_stable_url(endpoints['migrated'], in_legacy=False)
-    stable_legacy_params = get_stable_elements(query, in_legacy=True)
-    stable_migrated_params = get_stable_elements(query, in_legacy=False)
-    stable_legacy_body = get_stable_elements(body, in_legacy=True)
-    stable_migrated_body = get_stable_elements(body, in_legacy=False)
+**Tests Failed**: <span style="color: red;">{tests_failed} ({(100 * tests_failed / max(total_tests, 1)):.2f}%)</span>
 
-    body_sub = body.copy()
+**Total Discrepencies**: {total_discrepencies}
 
-    body_discrepencies = Discrepencies()
+**Distinct Discrepencies**: {sum(len(discrepencies.clusters) for _, _, discrepencies, _ in sections)}
+"""
 
-    def test_body_recursively(legacy_sub, migrated_sub, body_sub, attr=""):
-        for key, value in body_sub.items():
-            if type(value) == list:
-                for option in value[1:]:
-                    legacy_sub[key] = get_keyword_code(option, in_legacy=True)
-                    migrated_sub[key] = get_keyword_code(option, in_legacy=False)
-                    if legacy_sub[key] == "$omit": del legacy_sub[key]
-                    if migrated_sub[key] == "$omit": del migrated_sub[key]
-                    run_test(
-                        stable_legacy_url,
-                        stable_migrated_url,
-                        f"{attr}.{key}" if attr else f"{key}",
-                        option,
-                        headers,
-                        stable_legacy_params,
-                        stable_migrated_params,
-                        stable_legacy_body,
-                        stable_migrated_body,
-                        body_discrepencies
-                    )
-                legacy_sub[key] = get_keyword_code(value[0], in_legacy=True)
-                migrated_sub[key] = get_keyword_code(value[0], in_legacy=False)
-                if legacy_sub[key] == "$omit": del legacy_sub[key]
-                if migrated_sub[key] == "$omit": del migrated_sub[key]
-            elif type(value) == dict:
-                test_body_recursively(legacy_sub[key], migrated_sub[key], body_sub[key], f"{attr}.{key}" if attr else f"{key}")
+def planned_tests():
+    # Only the one-at-a-time sections know how many tests each attribute has without generating them
+    if traffic is not None or strategy["name"] != "one-at-a-time":
+        return {}
+    planned = {("path", path_pattern): len(path_variables) - 1 for path_pattern, path_variables in path.items()}
+    planned.update({("params", attr): len(values) - 1 for attr, values in query.items() if type(values) == Options})
+    planned.update({("body", ".".join(keys)): len(options) - 1 for keys, options in body_options(body)})
+    return {key: tests for key, tests in planned.items() if tests > 0}
+
+def sampled_attributes(summaries, planned):
+    # Every attribute that was not exhaustively tested, with the shards' spending added together
+    attributes = {}
+    for summary in summaries:
+        for state in summary["attributes"]:
+            merged = attributes.setdefault((state["section"], state["attr"]), {"seen": 0, "tested": 0, "converged": False})
+            merged["seen"] += state["seen"]
+            merged["tested"] += state["tested"]
+            merged["converged"] = merged["converged"] or state["converged"]
+    stopped = any(summary["stopped"] is not None for summary in summaries)
+    sampled = []
+    for section, attr in list(attributes) + [key for key in planned if key not in attributes]:
+        merged = attributes.get((section, attr), {"seen": 0, "tested": 0, "converged": False})
+        tests = planned.get((section, attr))
+        reasons = []
+        if merged["seen"] > merged["tested"]:
+            reasons.append("converged")
+        if stopped and tests is not None and merged["seen"] < tests:
+            reasons.append("out of budget")
+        if len(reasons) > 0:
+            sampled.append({"section": section, "attr": attr, "tested": merged["tested"], "tests": tests, "reasons": reasons})
+    return sampled
+
+def spending_file_path(results_file_path):
+    return results_file_path.removesuffix(".results.ndjson") + ".spending.json"
+
+def write_spending(results_file_path, summary, interrupted):
+    # Saved next to a shard's results so merge can report what every shard sampled and whether it finished
+    with open(spending_file_path(results_file_path), 'w') as file:
+        json.dump({**summary, "interrupted": interrupted}, file, default=str)
+
+def read_spending(results_file_paths):
+    summaries = []
+    for results_file_path in results_file_paths:
+        file_path = spending_file_path(results_file_path)
+        if os.path.isfile(file_path):
+            summaries.append(read_json(file_path))
+        else:
+            print(Style.BRIGHT + Fore.YELLOW + f"{os.path.basename(file_path)} is missing, so what that shard sampled cannot be reported...")
+    return summaries
+
+def print_sampling(summaries, planned):
+    stopped = [summary["stopped"] for summary in summaries if summary["stopped"] is not None]
+    if len(stopped) > 0:
+        print(Style.BRIGHT + Fore.YELLOW + f"Budget:       stopped because {stopped[0]}")
+    sampled = sampled_attributes(summaries, planned)
+    if len(sampled) > 0:
+        print(Style.BRIGHT + Fore.YELLOW + f"Sampled:      {', '.join(attribute['attr'] for attribute in sampled)}")
+
+def sampling_report(summaries, planned):
+    stopped = [summary["stopped"] for summary in summaries if summary["stopped"] is not None]
+    sampled = sampled_attributes(summaries, planned)
+    report = ""
+    if len(stopped) > 0:
+        report += f"\n**Budget**: the run stopped early because {stopped[0]}, the tests after that were not run\n"
+    if len(sampled) > 0:
+        report += "\n**Sampled**: these attributes were not exhaustively tested\n\n"
+        report += "|Section|Attribute|Tested|Of|Why|\n"
+        report += "|:-:|:-:|:-:|:-:|:-:|\n"
+        for attribute in sampled:
+            report += f"|{attribute['section']}|`{attribute['attr']}`|{attribute['tested']}|{attribute['tests'] if attribute['tests'] is not None else ''}|{', '.join(attribute['reasons'])}|\n"
+    return report
+
+def report_time():
+    # pytz brings its own time zone database, which Windows does not have for zoneinfo
+    import pytz
+    return datetime.now(pytz.timezone("America/Chicago"))
+
+def write_report(output_file_path, results, sections, central_time, command, config_path, replicate_json):
+    header = f"""# Results
+This test was run on **{central_time.strftime("%b %d %I:%M %p %Y")}** and results sent to `{os.path.basename(output_file_path)}`.
+
+{results}"""
+
+    footer = f"""# Replicate Me
+This test was run on **{central_time.strftime("%b %d %I:%M %p %Y")}**
 
-    test_body_recursively(stable_legacy_body, stable_migrated_body, body_sub)
-    return body_discrepencies
+```
+{command}
+```
 
-if __name__ == "__main__":
+### `{config_path}`
+```json
+{replicate_json}
+```
+"""
+
+    with open(output_file_path, 'w') as file:
+        file.write(header)
+        if sections is not None:
+            write_sections(file, [(title, name, discrepencies) for title, name, discrepencies, _ in sections])
+        file.write(footer)
+
+    shutil.copyfile(output_file_path, "results.md")
+
+def find_configs(patterns):
+    config_paths = []
+    for pattern in patterns:
+        matches = glob.glob(os.path.join(pattern, "*.json")) if os.path.isdir(pattern) else glob.glob(pattern)
+        for config_path in sorted(matches):
+            config_path = os.path.normpath(config_path)
+            if config_path not in config_paths:
+                config_paths.append(config_path)
+    return config_paths
+
+def run_config(config_path, resume=False, workers=1, load=False, command=None):
+    # The one run of a config, from the command line or as one config of a batch
+    global journal, plan_positions
     start = time.time()
+    config = read_json(config_path)
+    replicate_json = json.dumps(config, indent=4)
+    config_digest = config_hash(config)
+    reset_input()
+    validate_input(config)
+    plan_positions = itertools.count()
+    opened, reused = connection_counts()
 
-    parser = argparse.ArgumentParser(description="Process some JSON files.")
-    parser.add_argument('config', type=str, help="Path to the JSON configuration file")
-    args = parser.parse_args()
+    central_time = report_time()
+    formatted_time = central_time.strftime("%Y-%m-%d_%H;%M;%S")
+    input_file_prefix, _ = os.path.splitext(os.path.basename(config_path))
+    if shard["count"] > 1:
+        input_file_prefix += f".shard-{shard['index'] + 1}-of-{shard['count']}"
+    os.makedirs("results", exist_ok=True)
+    run_prefix = os.path.join("results", input_file_prefix + "-" + formatted_time)
+    output_file_path = run_prefix + ".results.md"
+    results_file_path = run_prefix + ".results.ndjson"
+    journal_file_path = os.path.join("results", input_file_prefix + "-" + config_digest + ".journal.ndjson")
+
+    # Replayed traffic is made of real requests, the stable request of the config may not even be one
+    if traffic is None:
+        establish_baseline()
+
+    interrupted = False
+    resumed = 0
+    sections = None
+    shard_connections = []
+    if load:
+        load_levels = run_load_test()
+    elif workers > 1:
+        results_file_paths, outcomes = run_workers(config_path, workers, concurrency, resume, run_prefix, os.path.join("results", input_file_prefix), config_digest)
+        interrupted = any(shard_interrupted for shard_interrupted, _, _, _ in outcomes)
+        resumed = sum(shard_resumed for _, shard_resumed, _, _ in outcomes)
+        shard_connections = [connections for _, _, connections, _ in outcomes]
+        spending_summaries = [summary for _, _, _, summary in outcomes]
+        sections = make_sections()
+        merge_results(results_file_paths, results_file_path, sections)
+        for file_path in results_file_paths:
+            os.remove(file_path)
+    else:
+        stream = ResultStream(results_file_path)
+        journal = Journal(journal_file_path, resume=resume)
+        if resume:
+            print(Style.BRIGHT + f"Resuming from `{journal_file_path}` with {len(journal)} finished tests...")
+        sections = make_sections(stream, journal)
+        interrupted = run_sections(sections, stream, journal)
+        resumed = journal.resumed
+        spending_summaries = [spending.summary()]
+    now_opened, now_reused = connection_counts()
+    connections_opened = now_opened - opened + sum(shard_opened for shard_opened, _ in shard_connections)
+    connections_reused = now_reused - reused + sum(shard_reused for _, shard_reused in shard_connections)
 
-    init(autoreset=True)
-    
-    args.config = os.path.normpath(args.config)
-    config = read_json(args.config)
+    end = time.time()
 
-    replicate_json = json.dumps(config, indent=4)
+    print(Style.BRIGHT + f"\nTotal Execution Time: {format_time(end - start)}")
+    if not load:
+        print_totals(sections)
+        if resume:
+            print(Style.BRIGHT +          f"Resumed:      {resumed}")
+        if traffic is not None and workers == 1:
+            print(Style.BRIGHT +          f"Traffic:      {traffic['replayed']} replayed, {traffic['duplicates']} duplicates and {traffic['skipped']} requests to other endpoints skipped")
+        print_sampling(spending_summaries, planned_tests() if shard["count"] == 1 else {})
+    print(Style.BRIGHT +              f"Connections:  {connections_opened} opened, {connections_reused} reused")
+    for side, breaker in breakers.items():
+        if breaker.opened > 0:
+            print(Style.BRIGHT + Fore.YELLOW + f"Breaker:      {side} paused {breaker.opened} times")
+
+    if load:
+        results = f"""**Total Execution Time**: {format_time(end - start)}
+
+**Connections**: {connections_opened} opened, {connections_reused} reused
+
+Latencies are measured from when each request was scheduled to be sent.
+
+{load_report(load_levels)}"""
+    else:
+        metrics = write_metrics(results_file_path, run_prefix, config_path, central_time)
+        # A single shard is only part of a run, merging the shards records the whole run
+        stopped = any(summary["stopped"] is not None for summary in spending_summaries)
+        if shard["count"] == 1:
+            record_history(results_file_path, config_digest, config_path, central_time, interrupted or stopped)
+        else:
+            write_spending(results_file_path, spending_summaries[0], interrupted)
+        retries = {side: side_metrics["retries"] for side, side_metrics in metrics.items()}
+        results = totals_report(sections, interrupted) + f"""
+**Total Execution Time**: {format_time(end - start)}
 
-    validate_input(config)
+**Connections**: {connections_opened} opened, {connections_reused} reused
 
-    establish_baseline()
+**Every Result**: `{os.path.basename(results_file_path)}`
 
-    path_discrepencies = test_path()
-    param_discrepencies = test_query()
-    body_discrepencies = test_body()
+**Metrics**: `{os.path.basename(run_prefix)}.metrics.txt` and `{os.path.basename(run_prefix)}.metrics.json`
+{chr(10) + f"**Retries**: {retries['legacy']} legacy and {retries['migrated']} migrated attempts failed and were retried, only the last attempt of each request is compared" + chr(10) if any(retries.values()) else ""}{chr(10) + f"**Shard**: {shard['index'] + 1} of {shard['count']}, merge every shard with `python dejavu.py merge`" + chr(10) if shard["count"] > 1 else ""}{chr(10) + f"**Resumed**: {resumed} tests from a previous run" + chr(10) if resume else ""}{chr(10) + f"**Traffic**: {', '.join(f'`{file_path}`' for file_path in traffic['paths'])} replayed {'as fast as possible' if traffic['pace'] == 0 else 'at x' + format(traffic['pace'], 'g') + ' its captured pace'}" + (f", {traffic['replayed']} requests replayed, {traffic['duplicates']} duplicates and {traffic['skipped']} requests to other endpoints skipped" if workers == 1 else "") + chr(10) if traffic is not None else ""}{sampling_report(spending_summaries, planned_tests() if shard["count"] == 1 else {})}
+"""
 
-    total_discrepencies = len(path_discrepencies) + len(param_discrepencies) + len(body_discrepencies)
-    tests_passed = path_discrepencies.passed + param_discrepencies.passed + body_discrepencies.passed
-    tests_failed = path_discrepencies.failed + param_discrepencies.failed + body_discrepencies.failed
-    total_tests = tests_passed + tests_failed
-    total_tests_len = len(str(total_tests))
+    write_report(output_file_path, results, sections, central_time, command or f"python dejavu.py {config_path}", config_path, replicate_json)
+    return {
+        "config": config_path,
+        "report": output_file_path,
+        "passed": sum(discrepencies.passed for _, _, discrepencies, _ in sections or []),
+        "failed": sum(discrepencies.failed for _, _, discrepencies, _ in sections or []),
+        "discrepencies": sum(len(discrepencies) for _, _, discrepencies, _ in sections or []),
+        "interrupted": interrupted,
+        "error": False
+    }
+
+def run_batch_config(config_path, resume, log_file_path=None):
+    # A config that fails validation or its baseline exits, which only ends that config's run
+    start = time.time()
+    stdout = sys.stdout
+    if log_file_path is not None:
+        sys.stdout = open(log_file_path, 'w', buffering=1)
+    opened, reused = connection_counts()
+    outcome = {"config": config_path, "report": None, "passed": 0, "failed": 0, "discrepencies": 0, "interrupted": False, "error": True}
+    try:
+        outcome = run_config(config_path, resume)
+    except SystemExit:
+        pass
+    except KeyboardInterrupt:
+        outcome["interrupted"] = True
+    finally:
+        if log_file_path is not None:
+            sys.stdout.close()
+            sys.stdout = stdout
+    now_opened, now_reused = connection_counts()
+    outcome["opened"] = now_opened - opened
+    outcome["reused"] = now_reused - reused
+    outcome["time"] = time.time() - start
+    return outcome
+
+def print_batch_outcome(outcome):
+    name = os.path.basename(outcome["config"])
+    if outcome["error"]:
+        print(Style.BRIGHT + Fore.YELLOW + f"{name}: did not finish, see its output...")
+    else:
+        color = Fore.GREEN if outcome["failed"] == 0 else Fore.RED
+        print(Style.BRIGHT + color + f"{name}: {outcome['passed']} passed, {outcome['failed']} failed, {outcome['discrepencies']} discrepencies in {format_time(outcome['time'])}")
+
+def batch_report(outcomes):
+    report = "|Config|Passed|Failed|Discrepencies|Time|Connections|Report|\n"
+    report += "|:-:|:-:|:-:|:-:|:-:|:-:|:-:|\n"
+    for outcome in outcomes:
+        if outcome["error"]:
+            report += f"|`{outcome['config']}`|||||{outcome['opened']} opened, {outcome['reused']} reused|Did not finish|\n"
+        else:
+            report += f"|`{outcome['config']}`|{outcome['passed']}|{outcome['failed']}|{outcome['discrepencies']}|{format_time(outcome['time'])}|{outcome['opened']} opened, {outcome['reused']} reused|`{os.path.basename(outcome['report'])}`|\n"
+    return report
+
+def batch_main():
+    start = time.time()
+
+    parser = argparse.ArgumentParser(prog="dejavu.py batch", description="Run many config files in one process, sharing connections to the same hosts.")
+    parser.add_argument('configs', type=str, nargs='+', help="Config files, directories of config files or glob patterns such as 'configs/*.json'")
+    parser.add_argument('--concurrency', type=int, default=1, help="Number of variations of a config to test at once")
+    parser.add_argument('--workers', type=int, default=1, help="Number of configs to run at once, each in its own process")
+    parser.add_argument('--record', type=str, help="Path to a cassette file to record every response to")
+    parser.add_argument('--replay', type=str, help="Path to a cassette file to serve responses from instead of the endpoints")
+    parser.add_argument('--cassette-size', type=int, default=1024, help="Maximum size of the cassette in megabytes before the least recently used responses are evicted")
+    parser.add_argument('--resume', action='store_true', help="Skip the tests previous interrupted runs of the configs finished and report their saved results")
+    parser.add_argument('--headless', action='store_true', help="Print a progress line every few seconds and a summary instead of every test, without colors")
+    args = parser.parse_args(sys.argv[2:])
+
+    if args.concurrency < 1:
+        print(f"--concurrency must be atleast 1, but {args.concurrency} was given...")
+        sys.exit()
+    if args.workers < 1:
+        print(f"--workers must be atleast 1, but {args.workers} was given...")
+        sys.exit()
+    if args.record and args.replay:
+        print(f"Only one of --record and --replay can be given...")
+        sys.exit()
+    if args.workers > 1 and (args.record or args.replay):
+        print(f"--workers cannot be used with --record or --replay...")
+        sys.exit()
+    if args.cassette_size < 1:
+        print(f"--cassette-size must be atleast 1, but {args.cassette_size} was given...")
+        sys.exit()
+    config_paths = find_configs(args.configs)
+    if len(config_paths) == 0:
+        print(f"No config files were found in {args.configs}...")
+        sys.exit()
+
+    if args.headless:
+        start_headless()
+    else:
+        enable_color()
+    os.makedirs("results", exist_ok=True)
+    central_time = report_time()
+    formatted_time = central_time.strftime("%Y-%m-%d_%H;%M;%S")
+
+    outcomes = []
+    interrupted = False
+    if args.workers == 1:
+        start_executors(args.concurrency)
+        if args.record or args.replay:
+            open_cassette(args.record or args.replay, args.cassette_size, replay=bool(args.replay))
+        for config_path in config_paths:
+            print(Style.BRIGHT + f"\n# {config_path}")
+            outcome = run_batch_config(config_path, args.resume)
+            outcomes.append(outcome)
+            if outcome["interrupted"]:
+                interrupted = True
+                break
+        if cassette is not None:
+            cassette.close()
+    else:
+        print(Style.BRIGHT + f"Running {len(config_paths)} configs, {args.workers} at a time, each config's output is in `results/<config>-{formatted_time}.log`...")
+        # Every worker process keeps its sessions between the configs it runs
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=start_process_executors, initargs=(args.concurrency,)) as pool:
+            futures = [
+                pool.submit(run_batch_config, config_path, args.resume, os.path.join("results", os.path.splitext(os.path.basename(config_path))[0] + "-" + formatted_time + ".log"))
+                for config_path in config_paths
+            ]
+            try:
+                for future in futures:
+                    outcomes.append(future.result())
+                    print_batch_outcome(outcomes[-1])
+            except KeyboardInterrupt:
+                interrupted = True
+                print(Style.BRIGHT + Fore.YELLOW + f"\nInterrupted, reporting the configs that finished...")
+                for future in futures:
+                    future.cancel()
+                outcomes = [future.result() for future in futures if not future.cancelled()]
 
     end = time.time()
 
+    tests_passed = sum(outcome["passed"] for outcome in outcomes)
+    tests_failed = sum(outcome["failed"] for outcome in outcomes)
+    total_tests = tests_passed + tests_failed
+    total_discrepencies = sum(outcome["discrepencies"] for outcome in outcomes)
+    connections_opened = sum(outcome["opened"] for outcome in outcomes)
+    connections_reused = sum(outcome["reused"] for outcome in outcomes)
+    unfinished = sum(outcome["error"] for outcome in outcomes)
+
+    print(Style.BRIGHT + f"\nBatch of {len(config_paths)} configs")
+    for outcome in outcomes:
+        print_batch_outcome(outcome)
     print(Style.BRIGHT + f"\nTotal Execution Time: {format_time(end - start)}")
     print(Style.BRIGHT + f"Total Discrepencies: {total_discrepencies}")
-    print(Style.BRIGHT + Fore.GREEN + f"Tests Passed: {f"{tests_passed}".ljust(total_tests_len)}")
-    print(Style.BRIGHT + Fore.RED +   f"Tests Failed: {f"{tests_failed}".ljust(total_tests_len)}")
+    print(Style.BRIGHT + Fore.GREEN + f"Tests Passed: {tests_passed}")
+    print(Style.BRIGHT + Fore.RED +   f"Tests Failed: {tests_failed}")
     print(Style.BRIGHT +              f"Total Tests:  {total_tests}")
+    print(Style.BRIGHT +              f"Unfinished:   {unfinished + len(config_paths) - len(outcomes)} configs")
+    print(Style.BRIGHT +              f"Connections:  {connections_opened} opened, {connections_reused} reused")
 
-    utc_now = datetime.now(pytz.utc)
-    central_tz = pytz.timezone("America/Chicago")
-    central_time = utc_now.replace(tzinfo=pytz.utc).astimezone(central_tz)
-
-    formatted_time = central_time.strftime("%Y-%m-%d_%H;%M;%S")
-    input_file_prefix, _ = os.path.splitext(os.path.basename(args.config))
-    output_file = input_file_prefix + "-" + formatted_time + ".results.md"
-    output_file_path = os.path.join("results", output_file)
-
-    output = f"""# Results
-This test was run on **{central_time.strftime("%b %d %I:%M %p %Y")}** and results sent to `{output_file}`.
+    output_file_path = os.path.join("results", "batch-" + formatted_time + ".results.md")
+    with open(output_file_path, 'w') as file:
+        file.write(f"""# Batch Results
+This batch was run on **{central_time.strftime("%b %d %I:%M %p %Y")}** over **{len(config_paths)}** configs and results sent to `{os.path.basename(output_file_path)}`.
 
-**Tests Passed**: <span style="color: green;">{tests_passed} ({(100 * tests_passed / total_tests):.2f}%)</span>
+{"**This batch was interrupted**, only the configs that finished are reported." + chr(10) + chr(10) if interrupted else ""}**Tests Passed**: <span style="color: green;">{tests_passed} ({(100 * tests_passed / max(total_tests, 1)):.2f}%)</span>
 
-**Tests Failed**: <span style="color: red;">{tests_failed} ({(100 * tests_failed / total_tests):.2f}%)</span>
+**Tests Failed**: <span style="color: red;">{tests_failed} ({(100 * tests_failed / max(total_tests, 1)):.2f}%)</span>
 
 **Total Execution Time**: {format_time(end - start)}
 
 **Total Discrepencies**: {total_discrepencies}
-            
-## Path
-{path_discrepencies.tablify("path")}
-## Params
-{param_discrepencies.tablify("params")} 
-## Body
-{body_discrepencies.tablify("body")}
-# Replicate Me
-This test was run on **{central_time.strftime("%b %d %I:%M %p %Y")}**
 
+**Connections**: {connections_opened} opened, {connections_reused} reused
+
+{batch_report(outcomes)}
+# Replicate Me
 ```
-python dejavu.py {args.config}
+python dejavu.py batch {" ".join(args.configs)}{f" --workers {args.workers}" if args.workers > 1 else ""}
 ```
+""")
+    shutil.copyfile(output_file_path, "results.md")
 
-### `{args.config}`
-```json
-{replicate_json}
-```
+def merge_main():
+    start = time.time()
+
+    parser = argparse.ArgumentParser(prog="dejavu.py merge", description="Merge the results of sharded runs into one report.")
+    parser.add_argument('config', type=str, help="Path to the JSON configuration file the shards ran")
+    parser.add_argument('results', type=str, nargs='+', help="Paths to the .results.ndjson file of every shard")
+    parser.add_argument('--traffic', action='store_true', help="The shards replayed traffic with --traffic instead of testing the config's variations")
+    args = parser.parse_args(sys.argv[2:])
+
+    if args.traffic:
+        global traffic
+        traffic = {"paths": [], "pace": 0, "dedupe": True, "replayed": 0, "duplicates": 0, "skipped": 0}
+
+    enable_color()
+
+    args.config = os.path.normpath(args.config)
+    config = read_json(args.config)
+    replicate_json = json.dumps(config, indent=4)
+    config_digest = config_hash(config)
+    validate_input(config)
+
+    for file_path in args.results:
+        if not os.path.isfile(file_path):
+            print(f"Results file {file_path} does not exist...")
+            sys.exit()
+
+    central_time = report_time()
+    formatted_time = central_time.strftime("%Y-%m-%d_%H;%M;%S")
+    input_file_prefix, _ = os.path.splitext(os.path.basename(args.config))
+    os.makedirs("results", exist_ok=True)
+    run_prefix = os.path.join("results", input_file_prefix + "-" + formatted_time + ".merged")
+    output_file_path = run_prefix + ".results.md"
+    results_file_path = run_prefix + ".results.ndjson"
+
+    sections = make_sections()
+    merge_results(args.results, results_file_path, sections)
+    spending_summaries = read_spending(args.results)
+    interrupted = any(summary["interrupted"] for summary in spending_summaries)
+    stopped = any(summary["stopped"] is not None for summary in spending_summaries)
+
+    end = time.time()
+    print(Style.BRIGHT + f"\nMerged {len(args.results)} results files in {format_time(end - start)}")
+    print_totals(sections)
+    print_sampling(spending_summaries, planned_tests())
+
+    write_metrics(results_file_path, run_prefix, args.config, central_time)
+    record_history(results_file_path, config_digest, args.config, central_time, interrupted or stopped)
+    results = totals_report(sections, interrupted) + f"""
+**Merged From**: {", ".join(f"`{os.path.basename(file_path)}`" for file_path in args.results)}
+
+**Every Result**: `{os.path.basename(results_file_path)}`
+
+**Metrics**: `{os.path.basename(run_prefix)}.metrics.txt` and `{os.path.basename(run_prefix)}.metrics.json`
+{sampling_report(spending_summaries, planned_tests())}
 """
+    write_report(output_file_path, results, sections, central_time, f"python dejavu.py merge {args.config} {' '.join(args.results)}{' --traffic' if args.traffic else ''}", args.config, replicate_json)
+
+def describe_test(test):
+    section, attr, value = json.loads(test)
+    return f"{section} {attr}: {get_report_value(value)}"
+
+def variation_drift(row, baseline_rows, threshold):
+    drift = []
+    migrated_baseline = [baseline_row["migrated_seconds"] for baseline_row in baseline_rows if baseline_row["migrated_seconds"] is not None]
+    legacy_baseline = [baseline_row["legacy_seconds"] for baseline_row in baseline_rows if baseline_row["legacy_seconds"] is not None]
+    if row["migrated_seconds"] is not None and len(migrated_baseline) > 0:
+        usual = statistics.median(migrated_baseline)
+        if row["migrated_seconds"] >= threshold * usual and row["migrated_seconds"] > usual:
+            # Legacy slowing down just as much points at the network or the test machine rather than migrated
+            legacy = ""
+            if row["legacy_seconds"] is not None and len(legacy_baseline) > 0 and statistics.median(legacy_baseline) > 0:
+                legacy = f", legacy x{row['legacy_seconds'] / statistics.median(legacy_baseline):.2f}"
+            ratio = f"x{row['migrated_seconds'] / usual:.2f}" if usual > 0 else "from 0 ms"
+            drift.append(("Slower", format_time(usual), f"{format_time(row['migrated_seconds'])} ({ratio}{legacy})"))
+    usual_status = statistics.mode(baseline_row["migrated_status"] for baseline_row in baseline_rows)
+    if row["migrated_status"] != usual_status:
+        drift.append(("Status Code", usual_status, row["migrated_status"]))
+    seen = set(fingerprint for baseline_row in baseline_rows for fingerprint in baseline_row["fingerprints"].split("\n") if fingerprint)
+    new = [fingerprint for fingerprint in row["fingerprints"].split("\n") if fingerprint and fingerprint not in seen]
+    if len(new) > 0:
+        drift.append(("New Discrepency", "", ", ".join(f"`{fingerprint}`" for fingerprint in new)))
+    return drift
+
+def drift_main():
+    start = time.time()
+
+    parser = argparse.ArgumentParser(prog="dejavu.py drift", description="Compare the latest run of a config with the runs before it and flag the variations that drifted.")
+    parser.add_argument('config', type=str, help="Path to the JSON configuration file that was run")
+    parser.add_argument('--runs', type=int, default=10, help="Number of earlier runs that make up each variation's rolling baseline")
+    parser.add_argument('--min-runs', type=int, default=3, help="Number of earlier runs a variation needs before it is compared")
+    parser.add_argument('--threshold', type=float, default=1.25, help="How many times its baseline migrated's median latency must be to be flagged")
+    args = parser.parse_args(sys.argv[2:])
+
+    if args.runs < 1:
+        print(f"--runs must be atleast 1, but {args.runs} was given...")
+        sys.exit()
+    if args.min_runs < 1 or args.min_runs > args.runs:
+        print(f"--min-runs must be between 1 and --runs, but {args.min_runs} was given...")
+        sys.exit()
+    if args.threshold < 1:
+        print(f"--threshold must be atleast 1, but {args.threshold} was given...")
+        sys.exit()
+    if not os.path.isfile(HISTORY_FILE_PATH):
+        print(f"There is no history in {HISTORY_FILE_PATH} yet, every run of a config is saved there...")
+        sys.exit()
+
+    enable_color()
+
+    args.config = os.path.normpath(args.config)
+    config = read_json(args.config)
+    config_digest = config_hash(config)
+    history = History(HISTORY_FILE_PATH)
+    runs = history.runs(config_digest, args.runs + 1)
+    if len(runs) < 2:
+        print(f"Drift needs atleast 2 runs of this exact {args.config} in the history, but there are {len(runs)}...")
+        sys.exit()
+
+    (latest, latest_time, latest_interrupted), earlier_runs = runs[0], runs[1:]
+    current = history.run_tests(latest)
+    baseline = {}
+    for run, _, _ in earlier_runs:
+        for test, row in history.run_tests(run).items():
+            baseline.setdefault(test, []).append(row)
+
+    drifted = []
+    skipped = 0
+    for test, row in current.items():
+        baseline_rows = baseline.get(test, [])
+        if len(baseline_rows) < args.min_runs:
+            skipped += 1
+            continue
+        drift = variation_drift(row, baseline_rows, args.threshold)
+        if len(drift) > 0:
+            drifted.append((test, drift))
+
+    rows = []
+    for test, drift in drifted:
+        # Oldest first, so the trend reads left to right
+        trend = " ".join(format_time(row["migrated_seconds"]) if row["migrated_seconds"] is not None else "-" for row in reversed(history.variation(config_digest, test, args.runs + 1)))
+        print(Style.BRIGHT + describe_test(test))
+        for kind, usual, now in drift:
+            print(Fore.RED + f"\t{kind}: {usual} -> {now}" if usual != "" else Fore.RED + f"\t{kind}: {now}")
+            rows.append(f"|{describe_test(test)}|{kind}|{usual}|{now}|{trend}|\n")
+        print(f"\tMigrated: {trend}")
+    history.close()
 
+    end = time.time()
+    compared = len(current) - skipped
+    print(Style.BRIGHT + f"\nCompared run {latest} from {latest_time} with up to {len(earlier_runs)} runs before it in {format_time(end - start)}")
+    print(Style.BRIGHT + (Fore.RED if len(drifted) > 0 else Fore.GREEN) + f"Drifted:  {len(drifted)} of {compared} variations")
+    print(Style.BRIGHT +              f"Skipped:  {skipped} variations with fewer than {args.min_runs} earlier runs")
+
+    central_time = report_time()
+    input_file_prefix, _ = os.path.splitext(os.path.basename(args.config))
+    output_file_path = os.path.join("results", input_file_prefix + "-" + central_time.strftime("%Y-%m-%d_%H;%M;%S") + ".drift.md")
     with open(output_file_path, 'w') as file:
-        file.write(output)
+        file.write(f"""# Drift
+Run **{latest}** of `{args.config}` from **{latest_time}** compared with up to **{len(earlier_runs)}** runs before it. A variation drifted when migrated's median latency is atleast **x{args.threshold}** its median over those runs, migrated returns a different status code than it usually did, or a discrepency shows up that none of those runs had.
+{chr(10) + "**The latest run was interrupted**, only the variations it finished are compared." + chr(10) if latest_interrupted else ""}
+**Drifted**: {len(drifted)} of {compared} variations
+
+**Skipped**: {skipped} variations with fewer than {args.min_runs} earlier runs
+
+""")
+        if len(rows) > 0:
+            file.write("|Variation|Drift|Baseline|Latest|Migrated Trend|\n|:-:|:-:|:-:|:-:|:-:|\n")
+            file.writelines(rows)
+        else:
+            file.write("No variation drifted...\n")
+    print(Style.BRIGHT + f"Report:   `{output_file_path}`")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "merge":
+        merge_main()
+        sys.exit()
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        batch_main()
+        sys.exit()
+    if len(sys.argv) > 1 and sys.argv[1] == "drift":
+        drift_main()
+        sys.exit()
+
+    parser = argparse.ArgumentParser(description="Process some JSON files.", epilog="Run `python dejavu.py merge config.json RESULTS...` to merge the results of sharded runs, `python dejavu.py batch CONFIGS...` to run many configs at once and `python dejavu.py drift config.json` to compare the latest run with the runs before it.")
+    parser.add_argument('config', type=str, help="Path to the JSON configuration file")
+    parser.add_argument('--concurrency', type=int, default=1, help="Number of variations to test at once")
+    parser.add_argument('--record', type=str, help="Path to a cassette file to record every response to")
+    parser.add_argument('--replay', type=str, help="Path to a cassette file to serve responses from instead of the endpoints")
+    parser.add_argument('--cassette-size', type=int, default=1024, help="Maximum size of the cassette in megabytes before the least recently used responses are evicted")
+    parser.add_argument('--resume', action='store_true', help="Skip the tests a previous interrupted run of the same config finished and report their saved results")
+    parser.add_argument('--shard', type=str, help="Only run shard i of N of the test plan, such as 1/4")
+    parser.add_argument('--workers', type=int, default=1, help="Number of processes to split the test plan across")
+    parser.add_argument('--plan', action='store_true', help="Print the tests and a sample of their requests without sending anything")
+    parser.add_argument('--load', action='store_true', help="Load test both endpoints at the rates in the load attribute instead of testing each variation once")
+    parser.add_argument('--headless', action='store_true', help="Print a progress line every few seconds and a summary instead of every test, without colors")
+    parser.add_argument('--traffic', type=str, nargs='+', help="HAR files or JSONL access logs whose requests to the legacy endpoint are replayed against both endpoints instead of the config's variations")
+    parser.add_argument('--pace', type=float, default=0, help="Replay --traffic at its captured pacing sped up this many times, such as 1 for the original pacing, instead of as fast as possible")
+    parser.add_argument('--keep-duplicates', action='store_true', help="Replay identical --traffic requests every time they were captured instead of once")
+    args = parser.parse_args()
+
+    if args.concurrency < 1:
+        print(f"--concurrency must be atleast 1, but {args.concurrency} was given...")
+        sys.exit()
+    if args.record and args.replay:
+        print(f"Only one of --record and --replay can be given...")
+        sys.exit()
+    if args.resume and args.load:
+        print(f"--resume cannot be used with --load...")
+        sys.exit()
+    if args.cassette_size < 1:
+        print(f"--cassette-size must be atleast 1, but {args.cassette_size} was given...")
+        sys.exit()
+    if args.workers < 1:
+        print(f"--workers must be atleast 1, but {args.workers} was given...")
+        sys.exit()
+    if args.workers > 1 and (args.shard or args.load or args.record or args.replay):
+        print(f"--workers cannot be used with --shard, --load, --record or --replay...")
+        sys.exit()
+    if args.shard and args.load:
+        print(f"--shard cannot be used with --load...")
+        sys.exit()
+    if args.traffic and args.load:
+        print(f"--traffic cannot be used with --load...")
+        sys.exit()
+    if args.pace < 0:
+        print(f"--pace must be 0 for as fast as possible or a positive speed up, but {args.pace} was given...")
+        sys.exit()
+    if args.traffic:
+        for file_path in args.traffic:
+            if not os.path.isfile(file_path):
+                print(f"Traffic file {file_path} does not exist...")
+                sys.exit()
+            if os.path.splitext(file_path)[1].lower() not in TRAFFIC_EXTENSIONS:
+                print(f"Traffic files must be HAR files or JSONL access logs ending in one of {list(TRAFFIC_EXTENSIONS)}, but {file_path} does not...")
+                sys.exit()
+        traffic = {"paths": args.traffic, "pace": args.pace, "dedupe": not args.keep_duplicates, "replayed": 0, "duplicates": 0, "skipped": 0}
+    if args.shard:
+        set_shard(*parse_shard(args.shard))
+    start_executors(args.concurrency)
+    if args.record or args.replay:
+        open_cassette(args.record or args.replay, args.cassette_size, replay=bool(args.replay))
+
+    if args.headless:
+        start_headless()
+    else:
+        enable_color()
+    
+    args.config = os.path.normpath(args.config)
+    if args.plan:
+        validate_input(read_json(args.config))
+        print_plan(make_sections())
+        sys.exit()
 
-    with open("results.md", "w") as file:
-        file.write(output)
\ No newline at end of file
+    command = " ".join(["python dejavu.py", args.config] + [
+        flag for flag, given in [
+            ("--load", args.load),
+            (f"--shard {args.shard}", args.shard),
+            (f"--workers {args.workers}", args.workers > 1),
+            (f"--traffic {' '.join(args.traffic or [])}", args.traffic),
+            (f"--pace {args.pace:g}", args.traffic and args.pace > 0),
+            ("--keep-duplicates", args.traffic and args.keep_duplicates)
+        ] if given
+    ])
+    run_config(args.config, args.resume, args.workers, args.load, command)
+    if cassette is not None:
+        cassette.close()
+        print(Style.BRIGHT +          f"Cassette:     {cassette.hits} replayed, {cassette.recorded} recorded, {len(cassette)} stored")
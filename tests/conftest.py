@@ -0,0 +1,125 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dejavu
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with self.server.lock:
+            self.server.received.append((self.command, self.path, dict(self.headers), data))
+        answer = self.server.respond(self.command, self.path, self.headers, data)
+        if answer is None:
+            # Hangs up without answering, which the client sees as a dropped connection
+            self.close_connection = True
+            return
+        status, headers, content = answer
+        self.send_response(status)
+        for name, value in {"Content-Type": "application/json", **headers}.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(content)
+
+    do_GET = do_PUT = do_PATCH = do_DELETE = do_HEAD = do_POST
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, respond):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.respond = respond
+        self.received = []
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/items"
+
+
+def echo(method, path, headers, data):
+    # Answers with what it was sent, so every variation of the request is a variation of the response
+    return 200, {}, json.dumps({"method": method, "path": path, "body": data.decode()}).encode()
+
+
+@pytest.fixture
+def stubs():
+    # A legacy and a migrated endpoint, each answering with the function it was given
+    servers = []
+    def stubs(legacy=echo, migrated=echo):
+        servers.extend([StubServer(legacy), StubServer(migrated)])
+        return servers[-2], servers[-1]
+    yield stubs
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def run_dejavu(tmp_path):
+    # Runs dejavu.py like a user would, from a directory of its own so its results/ folder is the test's
+    # The merge and drift commands only print a summary and have no --headless
+    def run_dejavu(*args, timeout=120, headless=True):
+        return subprocess.run(
+            [sys.executable, os.path.abspath(dejavu.__file__), *args, *(["--headless"] if headless else [])],
+            cwd=tmp_path, capture_output=True, text=True, timeout=timeout
+        )
+    yield run_dejavu
+
+
+def stub_config(legacy, migrated, **config):
+    # Only what the stubs answer should fail tests, not a migrated stub that happened to be a bit slower once
+    return {
+        "endpoints": {"legacy": legacy.url, "migrated": migrated.url, "method": "POST"},
+        "latency": {"threshold": 1000},
+        **config
+    }
+
+
+def write_config(directory, config, name="config.json"):
+    file_path = os.path.join(directory, name)
+    with open(file_path, 'w') as file:
+        json.dump(config, file)
+    return file_path
+
+
+def result_files(directory, suffix):
+    results_directory = os.path.join(directory, "results")
+    return sorted(os.path.join(results_directory, name) for name in os.listdir(results_directory) if name.endswith(suffix))
+
+
+def read_results(file_path):
+    with open(file_path) as file:
+        return [json.loads(line) for line in file]
+
+
+@pytest.fixture
+def configure():
+    # Every test starts from the default config, like every config of a batch run does
+    def configure(config):
+        dejavu.reset_input()
+        dejavu.validate_input({
+            "endpoints": {"legacy": "http://127.0.0.1:1/legacy", "migrated": "http://127.0.0.1:1/migrated", "method": "POST"},
+            **config
+        })
+    yield configure
+    dejavu.reset_input()
+    dejavu.breakers.clear()
+    dejavu.limiters.clear()
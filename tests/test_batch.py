@@ -0,0 +1,62 @@
+import glob
+import os
+
+from conftest import echo, read_results, result_files, stub_config, write_config
+
+
+def report(directory, config_name):
+    file_path, = glob.glob(os.path.join(directory, "results", f"{config_name}-*.results.md"))
+    with open(file_path) as file:
+        return file.read()
+
+
+def test_batch_runs_every_config_on_shared_pools(tmp_path, stubs, run_dejavu):
+    legacy, migrated = stubs()
+    write_config(tmp_path, stub_config(legacy, migrated, body={"id": [1, 2, 3]}), "first.json")
+    write_config(tmp_path, stub_config(legacy, migrated, query={"page": [1, 2]}), "second.json")
+    completed = run_dejavu("batch", "first.json", "second.json")
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+    assert "first.json: 2 passed, 0 failed" in completed.stdout
+    assert "second.json: 1 passed, 0 failed" in completed.stdout
+    # The second config talks to the same hosts, so it only reuses the first config's connections
+    assert "**Connections**: 0 opened" in report(tmp_path, "second")
+    assert len(result_files(tmp_path, ".results.md")) == 3
+
+
+def test_a_broken_config_does_not_stop_the_batch(tmp_path, stubs, run_dejavu):
+    legacy, migrated = stubs()
+    write_config(tmp_path, {"endpoints": {"legacy": legacy.url}}, "broken.json")
+    write_config(tmp_path, stub_config(legacy, migrated, body={"id": [1, 2]}), "working.json")
+    completed = run_dejavu("batch", "broken.json", "working.json")
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+    assert "broken.json: did not finish" in completed.stdout
+    assert "working.json: 1 passed, 0 failed" in completed.stdout
+
+
+def test_configs_do_not_leak_into_each_other(tmp_path, stubs, run_dejavu):
+    legacy, migrated = stubs()
+    write_config(tmp_path, stub_config(legacy, migrated, body={"id": [1, 2]}, headers={"X-Only-First": "1"}), "first.json")
+    write_config(tmp_path, stub_config(legacy, migrated, body={"id": [1, 2]}), "second.json")
+    completed = run_dejavu("batch", "first.json", "second.json")
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+    sent_headers = [headers for _, _, headers, _ in legacy.received]
+    assert ["X-Only-First" in headers for headers in sent_headers] == [True, True, False, False]
+
+
+def test_batch_reports_like_a_single_run(tmp_path, stubs, run_dejavu):
+    # Both go through run_config, so a batch config's report has the same lines, such as retries
+    seen = set()
+    def flaky(method, path, headers, data):
+        if data not in seen:
+            seen.add(data)
+            return 503, {"Retry-After": "0"}, b"{}"
+        return echo(method, path, headers, data)
+
+    legacy, migrated = stubs(migrated=flaky)
+    config = stub_config(legacy, migrated, body={"id": [1, 2]})
+    config["endpoints"].update({"method": "PUT", "retry": {"attempts": 2, "backoff": 0.01}})
+    write_config(tmp_path, config, "flaky.json")
+    completed = run_dejavu("batch", "flaky.json")
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+    assert "**Retries**: 0 legacy and 1 migrated attempts failed and were retried" in report(tmp_path, "flaky")
+    assert [result["passed"] for result in read_results(result_files(tmp_path, ".results.ndjson")[0])] == [True]
@@ -0,0 +1,35 @@
+import json
+import os
+import subprocess
+import sys
+
+import dejavu
+
+BENCHMARK_FILE_PATH = os.path.join(os.path.dirname(os.path.abspath(dejavu.__file__)), "benchmark.py")
+
+
+def run_benchmark(directory, *args):
+    return subprocess.run([sys.executable, BENCHMARK_FILE_PATH, *args], cwd=directory, capture_output=True, text=True, timeout=300)
+
+
+def test_suite_saves_comparable_runs(tmp_path):
+    completed = run_benchmark(tmp_path, "suite", "--variations", "10", "40", "--divergence", "0.5", "--output", "first.json")
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+    with open(tmp_path / "first.json") as file:
+        suite = json.load(file)
+    assert [run["variations"] for run in suite["runs"]] == [10, 40]
+    for run in suite["runs"]:
+        assert run["tests"] == run["variations"]
+        assert 0 < run["failed"] < run["tests"]
+        assert run["tests_per_second"] > 0 and run["peak_rss_bytes"] > 0
+    assert suite["settings"]["divergence"] == 0.5
+
+    completed = run_benchmark(tmp_path, "suite", "--variations", "10", "--divergence", "0.5", "--headless", "--output", "second.json", "--compare", "first.json")
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+    assert "used different settings" in completed.stdout
+    assert "Compared to" in completed.stdout
+
+
+def test_diff_benchmark_runs_both_engines(tmp_path):
+    completed = run_benchmark(tmp_path, "diff", "--items", "200", "--repeat", "1")
+    assert completed.returncode == 0, completed.stdout + completed.stderr
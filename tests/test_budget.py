@@ -0,0 +1,100 @@
+import dejavu
+from conftest import read_results, result_files, stub_config, write_config
+
+
+def spending_result(*fingerprints):
+    return {"discrepencies": [{"kind": "changed", "fingerprint": fingerprint} for fingerprint in fingerprints]}
+
+
+def sampled_positions(spending, outcomes):
+    positions = []
+    for position, fingerprints in enumerate(outcomes, 1):
+        if spending.sample("body", "id"):
+            positions.append(position)
+            spending.observe("body", "id", spending_result(*fingerprints))
+    return positions
+
+
+def test_spending_probes_a_converged_attribute_at_doublings(configure):
+    configure({"budget": {"converge": 3}})
+    spending = dejavu.Spending(dejavu.budget)
+    positions = sampled_positions(spending, [["changed root['a']"]] * 100)
+    # One new kind, then three tests in a row without one, then only probes
+    assert positions == [1, 2, 3, 4, 8, 16, 32, 64]
+    assert spending.summary()["attributes"] == [{"section": "body", "attr": "id", "seen": 100, "tested": 8, "converged": True}]
+
+
+def test_spending_explores_again_when_a_probe_finds_something_new(configure):
+    configure({"budget": {"converge": 2}})
+    spending = dejavu.Spending(dejavu.budget)
+    outcomes = [[]] * 100
+    outcomes[15] = ["changed root['late']"]
+    assert sampled_positions(spending, outcomes) == [1, 2, 4, 8, 16, 17, 18, 36, 72]
+
+
+def test_spending_without_converge_tests_everything(configure):
+    configure({})
+    spending = dejavu.Spending(dejavu.budget)
+    assert sampled_positions(spending, [[]] * 50) == list(range(1, 51))
+
+
+def test_spending_stops_at_the_request_budget(configure):
+    configure({"budget": {"requests": 10}})
+    spending = dejavu.Spending(dejavu.budget)
+    for _ in range(8):
+        spending.record("legacy", False)
+    assert not spending.exhausted(in_flight=0)
+    assert spending.exhausted(in_flight=1)
+    assert "10 requests" in spending.stopped
+
+
+def test_spending_stops_at_the_error_rate(configure):
+    configure({"budget": {"error_rate": 0.5}})
+    spending = dejavu.Spending(dejavu.budget)
+    for failed in [True, False] * 10:
+        spending.record("migrated", failed)
+    assert not spending.exhausted(in_flight=0)
+    spending.record("migrated", True)
+    assert spending.exhausted(in_flight=0)
+    assert spending.stopped.startswith("migrated")
+
+
+def test_sampled_attributes(configure):
+    configure({"query": {"n": ["$range(0, 100)"]}, "body": {"id": [1, 2, 3]}})
+    planned = dejavu.planned_tests()
+    assert planned == {("params", "n"): 99, ("body", "id"): 2}
+    summaries = [
+        {"stopped": "the time budget of 1 s ran out", "attributes": [{"section": "params", "attr": "n", "seen": 40, "tested": 10, "converged": True}]},
+        {"stopped": None, "attributes": [{"section": "params", "attr": "n", "seen": 40, "tested": 12, "converged": True}]},
+    ]
+    assert dejavu.sampled_attributes(summaries, planned) == [
+        {"section": "params", "attr": "n", "tested": 22, "tests": 99, "reasons": ["converged", "out of budget"]},
+        {"section": "body", "attr": "id", "tested": 0, "tests": 2, "reasons": ["out of budget"]},
+    ]
+
+
+def test_budget_stops_the_run_and_reports_it(tmp_path, stubs, run_dejavu):
+    legacy, migrated = stubs()
+    write_config(tmp_path, stub_config(legacy, migrated, query={"n": ["$range(0, 200)"]}, budget={"requests": 20}))
+    completed = run_dejavu("config.json")
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+    assert len(legacy.received) + len(migrated.received) <= 22
+    assert 0 < len(read_results(result_files(tmp_path, ".results.ndjson")[0])) <= 10
+    report_file_path, = result_files(tmp_path, ".results.md")
+    with open(report_file_path) as file:
+        report = file.read()
+    assert "**Budget**: the run stopped early because" in report
+    assert "|params|`n`|" in report and "|199|out of budget|" in report
+
+
+def test_converged_attributes_are_sampled(tmp_path, stubs, run_dejavu):
+    legacy, migrated = stubs()
+    write_config(tmp_path, stub_config(legacy, migrated, query={"n": ["$range(0, 100)"]}, budget={"converge": 3}))
+    completed = run_dejavu("config.json")
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+    results = read_results(result_files(tmp_path, ".results.ndjson")[0])
+    # Nothing new in the first three tests, then only probes at doublings
+    assert [result["value"] for result in results] == [1, 2, 3, 6, 12, 24, 48, 96]
+    report_file_path, = result_files(tmp_path, ".results.md")
+    with open(report_file_path) as file:
+        assert "|params|`n`|8|99|converged|" in file.read()
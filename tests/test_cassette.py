@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from conftest import read_results, result_files, stub_config, write_config
+
+import dejavu
+
+
+def cassette_response(number):
+    response = requests.Response()
+    response.status_code = 200 + number % 3
+    response.headers = CaseInsensitiveDict({"X-Number": str(number)})
+    response._content = b"x" * number
+    return response
+
+
+def cassette_key(number):
+    return hashlib.sha256(str(number).encode()).digest()
+
+
+def test_cassette_round_trip(tmp_path):
+    file_path = str(tmp_path / "cassette.bin")
+    cassette = dejavu.Cassette(file_path, 1024 * 1024, replay=False)
+    for number in range(20):
+        cassette.put(cassette_key(number), cassette_response(number), number / 10)
+    cassette.close()
+
+    cassette = dejavu.Cassette(file_path, 1024 * 1024, replay=True)
+    assert len(cassette) == 20
+    response, elapsed = cassette.get(cassette_key(7))
+    assert (response.status_code, response.headers["X-Number"], response.content, elapsed) == (201, "7", b"x" * 7, 0.7)
+    assert cassette.get(cassette_key(20)) is None
+    cassette.close()
+
+
+def test_cassette_recovers_from_a_killed_recording(tmp_path):
+    file_path = str(tmp_path / "cassette.bin")
+    killed = f"""
+import sys, os, hashlib, requests
+sys.path.insert(0, {os.path.dirname(os.path.abspath(dejavu.__file__))!r})
+import dejavu
+cassette = dejavu.Cassette({file_path!r}, 1024 * 1024, replay=False)
+for number in range(10):
+    response = requests.Response()
+    response.status_code = 200
+    response._content = b"x" * number
+    cassette.put(hashlib.sha256(str(number).encode()).digest(), response, 0.1)
+cassette.file.write(b"half of a record")
+cassette.file.flush()
+os._exit(1)
+"""
+    subprocess.run([sys.executable, "-c", killed])
+    assert not os.path.exists(file_path + ".idx")
+
+    cassette = dejavu.Cassette(file_path, 1024 * 1024, replay=True)
+    assert len(cassette) == 10
+    assert cassette.get(cassette_key(9))[0].content == b"x" * 9
+    cassette.put(cassette_key(3), cassette_response(30), 0.2)
+    cassette.close()
+
+    # An index that is missing or behind the records is rebuilt from them, newer records win
+    os.remove(file_path + ".idx")
+    cassette = dejavu.Cassette(file_path, 1024 * 1024, replay=True)
+    assert len(cassette) == 10
+    assert cassette.get(cassette_key(3))[0].content == b"x" * 30
+    cassette.close()
+
+
+def test_cassette_evicts_least_recently_used(tmp_path):
+    file_path = str(tmp_path / "cassette.bin")
+    # Room for exactly the first three records, whose bodies are as long as their number
+    record_sizes = [dejavu.Cassette.RECORD.size + len(json.dumps({"X-Number": str(number)})) + number for number in [100, 101, 102]]
+    cassette = dejavu.Cassette(file_path, sum(record_sizes), replay=False)
+    for number in [100, 101, 102]:
+        cassette.put(cassette_key(number), cassette_response(number), 0)
+    cassette.get(cassette_key(100))
+    cassette.put(cassette_key(103), cassette_response(103), 0)
+    assert cassette.get(cassette_key(101)) is None
+    assert cassette.get(cassette_key(100)) is not None
+    cassette.close()
+
+
+def test_a_file_that_is_not_a_cassette_is_refused(tmp_path):
+    file_path = str(tmp_path / "cassette.bin")
+    with open(file_path, 'wb') as file:
+        file.write(b"something else entirely")
+    with pytest.raises(SystemExit):
+        dejavu.Cassette(file_path, 1024 * 1024, replay=True)
+    with open(file_path, 'rb') as file:
+        assert file.read() == b"something else entirely"
+
+
+def test_replay_answers_without_the_endpoints(tmp_path, stubs, run_dejavu):
+    legacy, migrated = stubs()
+    write_config(tmp_path, stub_config(legacy, migrated, body={"id": [1, 2, 3]}), "record.json")
+    completed = run_dejavu("record.json", "--record", "cassette.bin")
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+    sent = len(legacy.received) + len(migrated.received)
+
+    write_config(tmp_path, stub_config(legacy, migrated, body={"id": [1, 2, 3]}), "replay.json")
+    completed = run_dejavu("replay.json", "--replay", "cassette.bin")
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+    assert "Cassette:     6 replayed, 0 recorded, 6 stored" in completed.stdout
+    assert len(legacy.received) + len(migrated.received) == sent
+    recorded, replayed = [read_results(file_path) for file_path in result_files(tmp_path, ".results.ndjson")]
+    assert [(result["value"], result["passed"]) for result in replayed] == [(result["value"], result["passed"]) for result in recorded]
@@ -0,0 +1,52 @@
+import pytest
+
+import dejavu
+
+
+def changed(path, old, new):
+    return {"kind": "changed", "path": path, "legacy": f"Changed: {path} from {old}", "migrated": f"Changed: {path} to {new}"}
+
+
+def failed(value, *discrepencies):
+    return {"attr": "id", "value": value, "passed": False, "discrepencies": list(discrepencies)}
+
+
+@pytest.mark.parametrize("json_path, collapsed", [
+    ("root['items'][12]['id']", "root['items'][*]['id']"),
+    ("root[0][1]", "root[*][*]"),
+    ("root['[3]']", "root['[3]']"),
+    ("root[\"it's [2]\"][4]", "root[\"it's [2]\"][*]"),
+    ("root['id']", "root['id']"),
+])
+def test_collapse_indices(json_path, collapsed):
+    assert dejavu.collapse_indices(json_path) == collapsed
+
+
+def test_fingerprint_ignores_array_positions_and_inputs():
+    assert dejavu.fingerprint(changed("root['items'][0]['id']", 1, 2)) == dejavu.fingerprint(changed("root['items'][7]['id']", 3, 4)) == "changed root['items'][*]['id']"
+    assert dejavu.fingerprint({"kind": "status", "legacy": 200, "migrated": 500}) != dejavu.fingerprint({"kind": "status", "legacy": 200, "migrated": 422})
+    assert dejavu.fingerprint({"kind": "time", "legacy": "1 ms", "migrated": "9 ms"}) == dejavu.fingerprint({"kind": "time", "legacy": "2 ms", "migrated": "3 s"})
+
+
+def test_discrepencies_cluster_by_fingerprint():
+    discrepencies = dejavu.Discrepencies("body")
+    # One test that changed every item of an array counts once towards the cluster
+    discrepencies.add(failed(1, *[changed(f"root['items'][{index}]['id']", index, -index) for index in range(50)]))
+    for value in range(2, 6):
+        discrepencies.add(failed(value, changed("root['items'][0]['id']", 0, value)))
+    discrepencies.add(failed(6, {"kind": "status", "legacy": 200, "migrated": 500}))
+    discrepencies.add({"attr": "id", "value": 7, "passed": True, "discrepencies": []})
+
+    assert len(discrepencies) == 55
+    assert (discrepencies.passed, discrepencies.failed) == (1, 6)
+    rows = list(discrepencies.tablify("body"))
+    assert len(rows) == 4
+    assert rows[2] == "|Changed|`root['items'][*]['id']`|5|Changed: root['items'][0]['id'] from 0|Changed: root['items'][0]['id'] to 0|`id`: `1`, `id`: `2`, `id`: `3`, ...|\n"
+    assert rows[3] == "|Status Code||1|200|500|`id`: `6`|\n"
+
+
+def test_discrepencies_without_failures():
+    discrepencies = dejavu.Discrepencies("body")
+    assert list(discrepencies.tablify("body")) == ["No testing done for **body**..."]
+    discrepencies.add({"attr": "id", "value": 7, "passed": True, "discrepencies": []})
+    assert list(discrepencies.tablify("body")) == ["No discrepencies found in the **body testing**..."]
@@ -0,0 +1,41 @@
+import json
+
+from conftest import echo, read_results, result_files, stub_config, write_config
+
+
+def diverging(method, path, headers, data):
+    # The migrated endpoint rejects one variation, so every run has passing and failing tests
+    if json.loads(data).get("id") == "":
+        return 422, {}, b'{"error": "id"}'
+    return echo(method, path, headers, data)
+
+
+def make_config(legacy, migrated):
+    return stub_config(legacy, migrated, query={"n": ["$range(0, 6)"]}, body={"id": [5, "", "5", None], "name": ["Hayden", None, "x"]})
+
+
+def outcomes(file_path):
+    return [(result["attr"], result["value"], result["passed"]) for result in read_results(file_path)]
+
+
+def test_concurrent_run_reports_like_a_sequential_one(tmp_path, stubs, run_dejavu):
+    legacy, migrated = stubs(migrated=diverging)
+    for concurrency in ["1", "4"]:
+        write_config(tmp_path, make_config(legacy, migrated), f"concurrency-{concurrency}.json")
+        completed = run_dejavu(f"concurrency-{concurrency}.json", "--concurrency", concurrency)
+        assert completed.returncode == 0, completed.stdout + completed.stderr
+    sequential, concurrent = result_files(tmp_path, ".results.ndjson")
+    assert outcomes(concurrent) == outcomes(sequential)
+    assert ("id", "", False) in outcomes(concurrent)
+
+
+def test_workers_finish_with_their_own_executors(tmp_path, stubs, run_dejavu):
+    # The parent's baseline leaves an idle thread behind, a shard that kept the parent's executor would wait on it forever
+    legacy, migrated = stubs(migrated=diverging)
+    write_config(tmp_path, make_config(legacy, migrated))
+    completed = run_dejavu("config.json", "--workers", "2", timeout=60)
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+    merged, = [file_path for file_path in result_files(tmp_path, ".results.ndjson") if ".shard-" not in file_path]
+    assert sorted(map(repr, outcomes(merged))) == sorted(map(repr, [
+        ("n", value, True) for value in range(1, 6)
+    ] + [("id", "", False), ("id", "5", True), ("id", None, True), ("name", None, True), ("name", "x", True)]))
@@ -0,0 +1,106 @@
+import json
+import random
+
+import pytest
+import requests
+
+import dejavu
+
+
+def random_json(rng, depth=0, arrays=True):
+    # Few distinct values, so the two sides often agree, and several that are equal in Python but not in type
+    choice = rng.random()
+    if depth > 2 or choice < 0.4:
+        return rng.choice([0, 1, 1.0, True, False, "1", None, 2.5, "text"])
+    if choice < 0.7 and arrays:
+        return [random_json(rng, depth + 1) for _ in range(rng.randint(0, 3))]
+    return {key: random_json(rng, depth + 1, arrays) for key in rng.sample("abc", rng.randint(0, 3))}
+
+
+def mutate(rng, tree):
+    # deepdiff reports objects with too few keys in common as a whole, so only leaves change and at most one key goes missing
+    if type(tree) == dict:
+        mutated = {key: mutate(rng, value) for key, value in tree.items()}
+        if len(mutated) > 2 and rng.random() < 0.3:
+            del mutated[rng.choice(list(mutated))]
+        return mutated
+    return random_json(rng, depth=3) if rng.random() < 0.3 else tree
+
+
+def similar_pairs(count):
+    # deepdiff matches array items by hash, which misses 0 becoming false, so only objects are compared with it
+    rng = random.Random(0)
+    for _ in range(count):
+        legacy = {key: random_json(rng, arrays=False) for key in "abc"}
+        yield legacy, mutate(rng, legacy)
+
+
+def test_fast_engine_matches_deepdiff():
+    pytest.importorskip("deepdiff")
+    for legacy, migrated in similar_pairs(1000):
+        removed, changes = dejavu.diff_json(legacy, migrated)
+        deepdiff_removed, deepdiff_changes = dejavu.deepdiff_json(legacy, migrated)
+        assert (sorted(removed), sorted(changes)) == (sorted(deepdiff_removed), sorted(deepdiff_changes)), (legacy, migrated)
+
+
+@pytest.mark.parametrize("legacy, migrated, path", [
+    ({"flag": True}, {"flag": 1}, "root['flag']"),
+    ({"count": 0}, {"count": False}, "root['count']"),
+    ({"total": 1}, {"total": 1.0}, "root['total']"),
+    ([{"items": [1, 2]}], [{"items": [1, 2.0]}], "root[0]['items'][1]"),
+])
+def test_type_changes_are_reported(legacy, migrated, path):
+    assert dejavu.diff_json(legacy, migrated) == ([], {path: {"old_value": legacy_leaf(legacy, path), "new_value": legacy_leaf(migrated, path)}})
+    if type(legacy) == list:
+        assert dejavu.diff_json_arrays(json.dumps(legacy).encode(), json.dumps(migrated).encode()) == dejavu.diff_json(legacy, migrated)
+
+
+def legacy_leaf(tree, path):
+    return eval(path, {"root": tree})
+
+
+def test_equal_bodies_with_reordered_keys_are_unchanged():
+    assert dejavu.diff_json({"a": 1, "b": [1, {"c": True}]}, {"b": [1, {"c": True}], "a": 1}) == ([], {})
+
+
+def test_diff_json_arrays_matches_diff_json():
+    rng = random.Random(0)
+    for _ in range(2000):
+        legacy = [random_json(rng) for _ in range(rng.randint(0, 4))]
+        migrated = [random_json(rng) for _ in range(rng.randint(0, 4))]
+        expected = dejavu.diff_json(legacy, migrated)
+        assert dejavu.diff_json_arrays(json.dumps(legacy).encode(), json.dumps(migrated, indent=1).encode()) == expected
+
+
+def test_diff_json_ignores_paths():
+    ignore_tree = dejavu.build_ignore_tree(["root['updated']", "root['items'][*]['etag']"])
+    legacy = {"updated": 1, "items": [{"etag": "a", "id": 1}, {"etag": "b", "id": 2}]}
+    migrated = {"updated": 2, "items": [{"etag": "c", "id": 1}, {"etag": "d", "id": 3}]}
+    assert dejavu.diff_json(legacy, migrated, ignore_tree) == ([], {"root['items'][1]['id']": {"old_value": 2, "new_value": 3}})
+
+
+@pytest.mark.parametrize("text, items", [
+    ("[]", []),
+    (" [ ] ", []),
+    ("[1]", [1]),
+    ('[1, "two", {"three": [3]}, null]', [1, "two", {"three": [3]}, None]),
+    ("\n[\n  1,\n  2\n]\n", [1, 2]),
+])
+def test_iter_json_array(text, items):
+    assert list(dejavu.iter_json_array(text)) == items
+
+
+@pytest.mark.parametrize("text", ["[1 2]", "[1,", "[1] 2", "[1,]"])
+def test_iter_json_array_rejects_invalid_arrays(text):
+    with pytest.raises(ValueError):
+        list(dejavu.iter_json_array(text))
+
+
+def test_compare_responses_reports_a_type_change():
+    def response(content):
+        response = requests.Response()
+        response.status_code = 200
+        response._content = content
+        return response
+
+    assert dejavu.compare_responses(response(b'{"flag": true, "id": 5}'), response(b'{"id": 5, "flag": 1}')) == ([], {"root['flag']": {"old_value": True, "new_value": 1}})
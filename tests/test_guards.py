@@ -0,0 +1,70 @@
+import json
+
+from conftest import echo, read_results, result_files, stub_config, write_config
+
+import dejavu
+
+
+def test_token_bucket_allows_a_burst_then_waits():
+    bucket = dejavu.TokenBucket(rps=100, burst=3)
+    assert [bucket.acquire() for _ in range(3)] == [0, 0, 0]
+    assert bucket.acquire() > 0
+
+
+def test_circuit_breaker_opens_after_failures_in_a_row(capsys):
+    breaker = dejavu.CircuitBreaker("legacy", failures=3, cooldown=0.01)
+    for failed in [True, True, False, True, True]:
+        breaker.record(failed)
+    assert breaker.opened == 0
+    breaker.record(True)
+    assert breaker.opened == 1
+    # A failure right after the cooldown opens it again straight away
+    breaker.record(True)
+    assert breaker.opened == 2
+    # Worker threads only count, the main thread reports between tests
+    assert capsys.readouterr().out == ""
+    breaker.report()
+    assert "paused 2 times" in capsys.readouterr().out
+    breaker.report()
+    assert capsys.readouterr().out == ""
+
+
+def dropping(method, path, headers, data):
+    if json.loads(data)["id"] == 2:
+        return None
+    return echo(method, path, headers, data)
+
+
+def test_a_dropped_connection_fails_its_test_and_the_run_goes_on(tmp_path, stubs, run_dejavu):
+    legacy, migrated = stubs(migrated=dropping)
+    config = stub_config(legacy, migrated, body={"id": [1, 2, 3, 4]})
+    config["endpoints"].update({"retry": {"attempts": 1}, "breaker": {"failures": 3, "cooldown": 1}})
+    write_config(tmp_path, config)
+    completed = run_dejavu("config.json")
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+    assert len(result_files(tmp_path, ".results.md")) == 1
+    results = {result["value"]: result for result in read_results(result_files(tmp_path, ".results.ndjson")[0])}
+    assert [results[value]["passed"] for value in [2, 3, 4]] == [False, True, True]
+    assert results[2]["discrepencies"] == [{"kind": "error", "legacy": 200, "migrated": "ConnectionError", "fingerprint": "error 200 ConnectionError"}]
+    assert results[2]["migrated"]["status"] is None
+
+
+def test_retried_attempts_are_recorded_and_only_the_last_is_compared(tmp_path, stubs, run_dejavu):
+    seen = set()
+    def flaky(method, path, headers, data):
+        # Every request fails the first time it is sent
+        if data not in seen:
+            seen.add(data)
+            return 503, {"Retry-After": "0"}, b"{}"
+        return echo(method, path, headers, data)
+
+    legacy, migrated = stubs(migrated=flaky)
+    config = stub_config(legacy, migrated, body={"id": [1, 2, 3]})
+    config["endpoints"].update({"method": "PUT", "retry": {"attempts": 2, "backoff": 0.01}})
+    write_config(tmp_path, config)
+    completed = run_dejavu("config.json")
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+    results = read_results(result_files(tmp_path, ".results.ndjson")[0])
+    assert [result["passed"] for result in results] == [True, True]
+    assert all([attempt["status"] for attempt in result["migrated"]["retries"]] == [503] for result in results)
+    assert all(result["legacy"]["retries"] == [] for result in results)
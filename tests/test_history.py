@@ -0,0 +1,51 @@
+import sqlite3
+import time
+
+from conftest import echo, result_files, stub_config, write_config
+
+
+def test_drift_flags_variations_that_changed(tmp_path, stubs, run_dejavu):
+    regressed = {"now": False}
+    def migrated_respond(method, path, headers, data):
+        n = path.split("n=")[-1]
+        if regressed["now"] and n == "3":
+            return 500, {}, b'{"error": "down"}'
+        if regressed["now"] and n == "5":
+            time.sleep(0.3)
+        if regressed["now"] and n == "7":
+            return 200, {}, b'{"new": true}'
+        return echo(method, path, headers, data)
+
+    legacy, migrated = stubs(migrated=migrated_respond)
+    write_config(tmp_path, stub_config(legacy, migrated, query={"n": ["$range(0, 10)"]}))
+    for run in range(4):
+        regressed["now"] = run == 3
+        completed = run_dejavu("config.json")
+        assert completed.returncode == 0, completed.stdout + completed.stderr
+
+    connection = sqlite3.connect(tmp_path / "results" / "history.sqlite")
+    assert connection.execute("SELECT COUNT(*), COUNT(DISTINCT config_hash) FROM runs").fetchone() == (4, 1)
+    assert connection.execute("SELECT COUNT(*) FROM tests GROUP BY run").fetchall() == [(9,)] * 4
+    assert connection.execute("""SELECT migrated_status FROM tests WHERE test = '["params", "n", 3]' ORDER BY run""").fetchall() == [(200,), (200,), (200,), (500,)]
+    connection.close()
+
+    # Timings of local stubs are noisy, so only a large slow down is certain to be flagged
+    completed = run_dejavu("drift", "config.json", "--threshold", "4", headless=False)
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+    assert "Drifted:  3 of 9 variations" in completed.stdout
+    assert "\tStatus Code: 200 -> 500" in completed.stdout
+    assert "params n: 5\n\tSlower: " in completed.stdout
+    assert "params n: 7\n\tNew Discrepency: " in completed.stdout
+    drift_file_path, = result_files(tmp_path, ".drift.md")
+    with open(drift_file_path) as file:
+        assert "|params n: 3|Status Code|200|500|" in file.read()
+
+
+def test_drift_needs_two_runs(tmp_path, stubs, run_dejavu):
+    legacy, migrated = stubs()
+    write_config(tmp_path, stub_config(legacy, migrated))
+    completed = run_dejavu("drift", "config.json", headless=False)
+    assert "There is no history" in completed.stdout
+    run_dejavu("config.json")
+    completed = run_dejavu("drift", "config.json", headless=False)
+    assert "needs atleast 2 runs" in completed.stdout
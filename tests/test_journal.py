@@ -0,0 +1,85 @@
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import dejavu
+from conftest import echo, read_results, result_files, stub_config, write_config
+
+
+def journal_result(value, attr="a"):
+    return {"section": "body", "attr": attr, "value": value, "passed": True, "discrepencies": []}
+
+
+def test_journal_resumes_finished_tests(tmp_path):
+    file_path = str(tmp_path / "run.journal.ndjson")
+    journal = dejavu.Journal(file_path)
+    for value in [1, 2, 2, "$omit"]:
+        journal.write(journal_result(value))
+    journal.close()
+
+    journal = dejavu.Journal(file_path, resume=True)
+    assert len(journal) == 4
+    assert journal.pop("body", "a", 1)["value"] == 1
+    # The same option tested twice is resumed twice, and only twice
+    assert journal.pop("body", "a", 2) is not None
+    assert journal.pop("body", "a", 2) is not None
+    assert journal.pop("body", "a", 2) is None
+    assert journal.pop("body", "b", 1) is None
+    assert journal.resumed == 3
+    journal.close()
+
+
+def test_journal_resume_drops_a_half_written_line(tmp_path):
+    file_path = str(tmp_path / "run.journal.ndjson")
+    journal = dejavu.Journal(file_path)
+    journal.write(journal_result(1))
+    journal.close()
+    with open(file_path, 'a') as file:
+        file.write('{"section": "body", "attr": "a", "val')
+
+    journal = dejavu.Journal(file_path, resume=True)
+    assert len(journal) == 1
+    journal.write(journal_result(2))
+    journal.close()
+
+    journal = dejavu.Journal(file_path, resume=True)
+    assert journal.pop("body", "a", 1) is not None
+    assert journal.pop("body", "a", 2) is not None
+    journal.close()
+
+
+def test_journal_without_resume_starts_over(tmp_path):
+    file_path = str(tmp_path / "run.journal.ndjson")
+    journal = dejavu.Journal(file_path)
+    journal.write(journal_result(1))
+    journal.close()
+    assert len(dejavu.Journal(file_path)) == 0
+
+
+def test_interrupted_run_resumes_where_it_stopped(tmp_path, stubs, run_dejavu):
+    def slow(method, path, headers, data):
+        time.sleep(0.01)
+        return echo(method, path, headers, data)
+
+    legacy, migrated = stubs(slow, slow)
+    write_config(tmp_path, stub_config(legacy, migrated, query={"n": ["$range(0, 300)"]}))
+    process = subprocess.Popen([sys.executable, os.path.abspath(dejavu.__file__), "config.json", "--headless"], cwd=tmp_path, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    time.sleep(2)
+    process.send_signal(signal.SIGINT)
+    process.communicate(timeout=60)
+    journal_file_path, = result_files(tmp_path, ".journal.ndjson")
+    finished = len(read_results(journal_file_path))
+    assert 0 < finished < 299
+
+    time.sleep(1)
+    sent = len(legacy.received)
+    completed = run_dejavu("config.json", "--resume")
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+    assert f"Resumed:      {finished}" in completed.stdout
+    # Only the stable request and the tests that had not finished are sent again
+    assert len(legacy.received) - sent == 1 + 299 - finished
+    resumed_results = read_results(result_files(tmp_path, ".results.ndjson")[-1])
+    assert sorted(result["value"] for result in resumed_results) == list(range(1, 300))
+    assert result_files(tmp_path, ".journal.ndjson") == []
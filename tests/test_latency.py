@@ -0,0 +1,44 @@
+import json
+import time
+
+from conftest import echo, read_results, result_files, stub_config, write_config
+
+import dejavu
+
+
+def test_mann_whitney_p_value():
+    fast = [0.010, 0.011, 0.012, 0.013, 0.014, 0.015, 0.016, 0.017]
+    slow = [0.030, 0.031, 0.032, 0.033, 0.034, 0.035, 0.036, 0.037]
+    # One sided, small when migrated is slower
+    assert dejavu.mann_whitney_p_value(fast, slow) < 0.01
+    assert dejavu.mann_whitney_p_value(slow, fast) > 0.99
+    assert 0.3 < dejavu.mann_whitney_p_value(fast, fast) < 0.7
+    assert dejavu.mann_whitney_p_value([0.1] * 5, [0.1] * 5) == 1.0
+
+
+def test_percentile():
+    assert dejavu.percentile([3, 1, 2], 50) == 2
+    assert dejavu.percentile([1, 2, 3, 4], 50) == 2.5
+    assert dejavu.percentile([1, 2, 3, 4, 5], 95) == 4.8
+    assert dejavu.percentile([7], 99) == 7
+
+
+def delayed(seconds, slow_id=None, slow_seconds=None):
+    def respond(method, path, headers, data):
+        time.sleep(slow_seconds if json.loads(data)["id"] == slow_id else seconds)
+        return echo(method, path, headers, data)
+    return respond
+
+
+def test_only_a_significantly_slower_variation_fails(tmp_path, stubs, run_dejavu):
+    # Both sides take long enough that scheduling noise cannot reach the threshold
+    legacy, migrated = stubs(legacy=delayed(0.02), migrated=delayed(0.02, slow_id=2, slow_seconds=0.06))
+    write_config(tmp_path, stub_config(legacy, migrated, body={"id": [0, 1, 2, 3]}, latency={"warmup": 1, "samples": 6, "alpha": 0.05, "threshold": 1.25}))
+    completed = run_dejavu("config.json")
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+    results = read_results(result_files(tmp_path, ".results.ndjson")[0])
+    assert [(result["value"], result["passed"]) for result in results] == [(1, True), (2, False), (3, True)]
+    assert [discrepency["kind"] for discrepency in results[1]["discrepencies"]] == ["time"]
+    assert all(len(result[side]["durations"]) == 6 for result in results for side in ["legacy", "migrated"])
+    # One baseline request and a warmup and six samples for each of the three tests
+    assert len(legacy.received) == len(migrated.received) == 1 + 3 * 7
@@ -0,0 +1,41 @@
+import glob
+import json
+import math
+import os
+
+from conftest import echo, stub_config, write_config
+
+import dejavu
+
+
+def test_latency_histogram():
+    histogram = dict(dejavu.latency_histogram([0.0005, 0.001, 0.0015, 0.3, 20]))
+    assert (histogram[1], histogram[2], histogram[500], histogram[math.inf]) == (2, 1, 1, 1)
+    assert sum(histogram.values()) == 5
+
+
+def test_load_mix_leaves_out_weightless_choices(configure):
+    configure({"body": {"id": [1, 2, 3], "name": ["a", "b"]}, "load": {"weights": {"$stable": 0, "name": 0, "id": 3}}})
+    mix, weights = dejavu.load_mix()
+    assert [choice[2] for choice in mix] == [["id"]]
+    assert weights == [3]
+
+
+def test_load_sends_at_every_rate_and_counts_errors(tmp_path, stubs, run_dejavu):
+    def failing(method, path, headers, data):
+        if json.loads(data)["name"] == "b":
+            return 503, {}, b"{}"
+        return echo(method, path, headers, data)
+
+    legacy, migrated = stubs(migrated=failing)
+    write_config(tmp_path, stub_config(legacy, migrated, body={"id": [1, 2, 3], "name": ["a", "b"]}, load={"rps": [20, 40], "duration": 0.5, "workers": 8, "weights": {"$stable": 0, "id": 0}}))
+    completed = run_dejavu("config.json", "--load")
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+    # The baseline, then half a second at 20 and at 40 requests per second, only ever varying name
+    assert len(legacy.received) == len(migrated.received) == 1 + 10 + 20
+    assert all(json.loads(data)["name"] == "b" for _, _, _, data in legacy.received[1:])
+    report_path, = glob.glob(os.path.join(tmp_path, "results", "config-*.results.md"))
+    with open(report_path) as file:
+        report = file.read()
+    assert "## 20 requests per second" in report and "## 40 requests per second" in report
+    assert report.count("|Error Rate|0.00%|100.00%|") == 2
@@ -0,0 +1,38 @@
+import json
+import re
+
+from conftest import result_files, stub_config, write_config
+
+
+def samples(text, name):
+    return [(labels, float(value)) for labels, value in re.findall(rf"^{name}\{{(.*)\}} (\S+)$", text, re.MULTILINE)]
+
+
+def test_metrics_total_every_request(tmp_path, stubs, run_dejavu):
+    legacy, migrated = stubs()
+    write_config(tmp_path, stub_config(legacy, migrated, query={"n": ["$range(0, 5)"]}, body={"id": [5, None]}))
+    completed = run_dejavu("config.json")
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+
+    metrics_file_path, = result_files(tmp_path, ".metrics.json")
+    with open(metrics_file_path) as file:
+        metrics = json.load(file)
+    assert metrics["results"].endswith(".results.ndjson")
+    for side, server in [("legacy", legacy), ("migrated", migrated)]:
+        side_metrics = metrics["sides"][side]
+        # The baseline request is not a test, so it is not counted
+        assert side_metrics["requests"] == 5 == len(server.received) - 1
+        assert side_metrics["retries"] == 0
+        assert sum(side_metrics["connections"].values()) == 5
+        assert side_metrics["bytes"]["request"] == sum(len(data) for _, _, _, data in server.received[1:])
+        assert set(side_metrics["phases"]) >= {"dns", "connect", "tls", "send", "ttfb", "transfer"}
+        assert side_metrics["phases"]["ttfb"]["count"] == 5
+
+    openmetrics_file_path, = result_files(tmp_path, ".metrics.txt")
+    with open(openmetrics_file_path) as file:
+        text = file.read()
+    assert text.endswith("# EOF\n")
+    assert samples(text, "dejavu_requests_total") == [('config="config.json",side="legacy"', 5), ('config="config.json",side="migrated"', 5)]
+    buckets = [value for labels, value in samples(text, "dejavu_request_phase_seconds_bucket") if 'side="legacy",phase="ttfb"' in labels]
+    assert buckets == sorted(buckets) and buckets[-1] == 5
+    assert ('config="config.json",side="legacy",phase="ttfb"', 5) in samples(text, "dejavu_request_phase_seconds_count")
@@ -0,0 +1,55 @@
+import gzip
+import json
+
+from conftest import read_results, result_files, stub_config, write_config
+
+ETAG = '"v1"'
+
+
+def legacy_respond(method, path, headers, data):
+    # Compressed, cacheable and revalidated with a 304 like a well behaved server
+    if headers.get("If-None-Match") == ETAG:
+        return 304, {"ETag": ETAG}, b""
+    return 200, {"Content-Encoding": "gzip", "ETag": ETAG, "Cache-Control": "max-age=600"}, gzip.compress(json.dumps({"items": ["x"] * (1000 if b"wide" in data else 10)}).encode())
+
+
+def migrated_respond(method, path, headers, data):
+    items = ["x"] * (1000 if b"big" in data or b"wide" in data else 10)
+    return 200, {"Cache-Control": "max-age=60"}, json.dumps({"items": items}).encode()
+
+
+def payload_discrepencies(result):
+    return sorted((discrepency["kind"], discrepency.get("path"), discrepency["migrated"]) for discrepency in result["discrepencies"] if discrepency["kind"] not in ["changed", "removed"])
+
+
+def test_payload_checks_report_what_migrated_lost(tmp_path, stubs, run_dejavu):
+    legacy, migrated = stubs(legacy_respond, migrated_respond)
+    write_config(tmp_path, stub_config(legacy, migrated, body={"size": ["small", "big", "wide"]}, payload={"conditional": True}))
+    completed = run_dejavu("config.json")
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+
+    big, wide = read_results(result_files(tmp_path, ".results.ndjson")[0])
+    lost = [
+        ("cache", "Cache-Control", "max-age=60"),
+        ("cache", "ETag", "Missing: ETag"),
+        ("compression", None, "identity"),
+        ("conditional", None, "None (no ETag)"),
+    ]
+    assert payload_discrepencies(big) == lost + [("size", "body", "4.9 KB (x82.15)")]
+    # The same body sent without compression is only larger on the wire
+    assert [discrepency["kind"] for discrepency in wide["discrepencies"]] == ["size", "compression", "cache", "cache", "conditional"]
+    assert payload_discrepencies(wide)[-1][:2] == ("size", "wire")
+    assert big["legacy"]["payload"]["encoding"] == "gzip"
+    # Every test, but not the baseline, is sent again with the ETag legacy returned
+    assert [headers.get("If-None-Match") for _, _, headers, _ in legacy.received] == [None] + [None, ETAG] * 2
+    assert len(migrated.received) == 3
+
+
+def test_payload_checks_can_be_turned_off(tmp_path, stubs, run_dejavu):
+    legacy, migrated = stubs(legacy_respond, migrated_respond)
+    write_config(tmp_path, stub_config(legacy, migrated, body={"size": ["small", "big"]}, payload={"size": False, "compression": False, "cache": False}))
+    completed = run_dejavu("config.json")
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+    for result in read_results(result_files(tmp_path, ".results.ndjson")[0]):
+        assert payload_discrepencies(result) == []
+    assert len(legacy.received) == 2
@@ -0,0 +1,53 @@
+import copy
+import json
+
+import pytest
+
+import dejavu
+from conftest import stub_config, write_config
+
+
+def expected_body(side, keys, value):
+    # What a variation's body was before it was spliced into the stable bytes, and what combination_request still builds
+    tree = copy.deepcopy(dejavu.plan[side]["body_tree"])
+    container = tree
+    for key in keys[:-1]:
+        container = container[key]
+    container[keys[-1]] = value
+    return json.dumps(dejavu.strip_omits(tree), allow_nan=False).encode()
+
+
+def test_stable_body_matches_json_dumps(configure):
+    configure({"body": {"a": ["$omit", 1], "b": {"c": ["$omit", 2], "d": "z"}, "e": [None, 3]}})
+    for side in ["legacy", "migrated"]:
+        assert dejavu.plan[side]["data"] == json.dumps(dejavu.strip_omits(dejavu.plan[side]["body_tree"])).encode()
+
+
+@pytest.mark.parametrize("body", [
+    {"a": [1, "$omit", "x"], "b": {"c": ["$omit", 2, None], "d": "z", "e": [True, "$omit"]}, "f": ["$omit", 5], "g": ["s", "$omit"]},
+    {"only": ["$omit", 1, "$omit"]},
+    {"first": ["$omit", 1], "second": ["$omit", 2], "third": ["$omit", 3]},
+    {"nested": {"deeper": {"value": [1, "$omit", 2.5, "é", [1, 2], {"x": None}]}}, "after": ["$omit", "$range(0, 3)"]},
+    {"k": ["$key", "$omit", 7], "l": "plain"},
+])
+def test_spliced_bodies_match_json_dumps(configure, body):
+    configure({"custom": {"$key": ["legacy value", "migrated value"]}, "body": body})
+    tests = list(dejavu.body_tests())
+    assert len(tests) > 0
+    for attr, option, legacy_request, migrated_request in tests:
+        keys = tuple(attr.split("."))
+        assert legacy_request["data"] == expected_body("legacy", keys, dejavu.get_keyword_code(option, in_legacy=True))
+        assert migrated_request["data"] == expected_body("migrated", keys, dejavu.get_keyword_code(option, in_legacy=False))
+
+
+def test_plan_sends_nothing(tmp_path, stubs, run_dejavu):
+    legacy, migrated = stubs()
+    write_config(tmp_path, stub_config(legacy, migrated, query={"n": ["$range(0, 10)"]}, body={"id": [5, "", None]}))
+    completed = run_dejavu("config.json", "--plan")
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+    assert legacy.received == [] and migrated.received == []
+    assert f"Legacy:   POST {legacy.url}?n=0 " in completed.stdout
+    assert "... and 6 more params tests" in completed.stdout
+    assert "Params: 9 tests" in completed.stdout and "Body: 2 tests" in completed.stdout
+    assert "Total Tests:    11" in completed.stdout
+    assert "Total Requests: 24, including the baseline" in completed.stdout
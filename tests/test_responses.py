@@ -0,0 +1,85 @@
+import gc
+import json
+import subprocess
+import sys
+
+import pytest
+import requests
+
+import dejavu
+from conftest import stub_config, write_config
+
+
+def response(content):
+    response = requests.Response()
+    response.status_code = 200
+    response._content = content
+    return response
+
+
+@pytest.mark.parametrize("content, value", [
+    (b'{"a": [1, 2.5, "\\u00e9"]}', {"a": [1, 2.5, "é"]}),
+    (b"[NaN]", None),
+    (b"123456789012345678901234567890", 123456789012345678901234567890),
+    (b'{"id": -9223372036854775809, "max": 18446744073709551616}', {"id": -9223372036854775809, "max": 18446744073709551616}),
+    ('"é"'.encode("utf-16"), "é"),
+])
+def test_decode_json_falls_back_to_the_standard_library(content, value):
+    decoded = dejavu.decode_json(content)
+    if value is None:
+        assert decoded[0] != decoded[0]
+    else:
+        assert decoded == value
+
+
+def test_equal_bodies_are_not_parsed(configure, monkeypatch):
+    configure({})
+    def decode_json(content):
+        raise AssertionError("Equal bodies were parsed")
+    monkeypatch.setattr(dejavu, "decode_json", decode_json)
+    assert dejavu.compare_responses(response(b'{"a": 1}'), response(b'{"a": 1}')) == ([], {})
+
+
+def test_collector_is_paused_while_comparing(configure, monkeypatch):
+    configure({})
+    collecting = []
+    compare_bodies = dejavu.compare_bodies
+    def spy(legacy_content, migrated_content):
+        collecting.append(gc.isenabled())
+        return compare_bodies(legacy_content, migrated_content)
+    monkeypatch.setattr(dejavu, "compare_bodies", spy)
+    assert gc.isenabled()
+    assert dejavu.compare_responses(response(b'{"a": 1}'), response(b'{"a": 2}'))[1] != {}
+    assert collecting == [False]
+    assert gc.isenabled()
+
+
+def test_large_arrays_are_diffed_incrementally(configure, monkeypatch):
+    configure({"diff": {"incremental": 0, "ignore": ["root[*]['etag']"]}})
+    legacy = [{"id": index, "etag": index} for index in range(100)]
+    migrated = [{"id": index if index != 42 else -1, "etag": -index} for index in range(100)]
+    monkeypatch.setattr(dejavu, "decode_json", None)
+    assert dejavu.compare_responses(response(json.dumps(legacy).encode()), response(json.dumps(migrated).encode())) == (
+        [], {"root[42]['id']": {"old_value": 42, "new_value": -1}}
+    )
+
+
+def test_invalid_array_is_compared_whole(configure):
+    configure({"diff": {"incremental": 0}})
+    assert dejavu.compare_responses(response(b"[1, 2"), response(b"[1, 3]")) == ([], {"root": {"old_value": "[1, 2", "new_value": "[1, 3]"}})
+
+
+def test_import_leaves_optional_dependencies_alone():
+    completed = subprocess.run([sys.executable, "-c", "import sys, dejavu; print(sorted(name for name in ['colorama', 'deepdiff', 'pytz'] if name in sys.modules))"], cwd=dejavu.__file__.rsplit("/", 1)[0], capture_output=True, text=True)
+    assert completed.stdout.strip() == "[]", completed.stderr
+
+
+def test_headless_prints_a_summary_instead_of_every_test(tmp_path, stubs, run_dejavu):
+    legacy, migrated = stubs()
+    write_config(tmp_path, stub_config(legacy, migrated, query={"n": ["$range(0, 20)"]}))
+    headless = run_dejavu("config.json")
+    verbose = run_dejavu("config.json", headless=False)
+    assert headless.returncode == verbose.returncode == 0, headless.stderr + verbose.stderr
+    assert "n: 7\n" in verbose.stdout and "n: 7\n" not in headless.stdout
+    assert "\x1b[" not in headless.stdout
+    assert "Total Tests:  19" in headless.stdout
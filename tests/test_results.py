@@ -0,0 +1,57 @@
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import dejavu
+from conftest import echo, read_results, result_files, stub_config, write_config
+
+
+def rejecting(method, path, headers, data):
+    if b'"id": ""' in data:
+        return 422, {}, b'{"error": "id"}'
+    return echo(method, path, headers, data)
+
+
+def test_every_test_is_streamed_and_reported(tmp_path, stubs, run_dejavu):
+    legacy, migrated = stubs(migrated=rejecting)
+    write_config(tmp_path, stub_config(legacy, migrated, body={"id": [5, "", None], "name": ["x", "$omit"]}))
+    completed = run_dejavu("config.json")
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+
+    results_file_path, = result_files(tmp_path, ".results.ndjson")
+    results = read_results(results_file_path)
+    assert [(result["section"], result["attr"], result["value"]) for result in results] == [
+        ("body", "id", ""), ("body", "id", None), ("body", "name", "$omit")
+    ]
+    failed = [result for result in results if not result["passed"]]
+    assert [result["value"] for result in failed] == [""]
+    assert failed[0]["discrepencies"][0]["kind"] == "status"
+
+    report_file_path, = result_files(tmp_path, ".results.md")
+    with open(report_file_path) as file:
+        report = file.read()
+    assert ">2 (66.67%)<" in report and ">1 (33.33%)<" in report
+    assert f"**Every Result**: `{os.path.basename(results_file_path)}`" in report
+    with open(tmp_path / "results.md") as file:
+        assert file.read() == report
+
+
+def test_interrupted_run_reports_finished_tests(tmp_path, stubs):
+    def slow(method, path, headers, data):
+        time.sleep(0.05)
+        return echo(method, path, headers, data)
+
+    legacy, migrated = stubs(slow, slow)
+    write_config(tmp_path, stub_config(legacy, migrated, query={"n": ["$range(0, 100000)"]}))
+    process = subprocess.Popen([sys.executable, os.path.abspath(dejavu.__file__), "config.json", "--headless"], cwd=tmp_path, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    time.sleep(3)
+    process.send_signal(signal.SIGINT)
+    stdout, stderr = process.communicate(timeout=60)
+
+    results = read_results(result_files(tmp_path, ".results.ndjson")[0])
+    assert 0 < len(results) < 99999, stdout + stderr
+    report_file_path, = result_files(tmp_path, ".results.md")
+    with open(report_file_path) as file:
+        assert f">{len(results)} (100.00%)<" in file.read()
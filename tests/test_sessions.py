@@ -0,0 +1,30 @@
+import re
+
+from conftest import stub_config, write_config
+
+
+def connections(stdout):
+    opened, reused = re.search(r"Connections:\s+(\d+) opened, (\d+) reused", stdout).groups()
+    return int(opened), int(reused)
+
+
+def test_requests_reuse_pooled_connections(tmp_path, stubs, run_dejavu):
+    legacy, migrated = stubs()
+    write_config(tmp_path, stub_config(legacy, migrated, body={"id": ["$range(0, 20)"]}))
+    completed = run_dejavu("config.json", "--concurrency", "3")
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+    opened, reused = connections(completed.stdout)
+    # The baseline and 19 tests, one request to each side, on at most 3 connections to each side
+    assert opened + reused == 40
+    assert opened <= 6
+
+
+def test_a_pool_without_keep_alive_opens_a_connection_per_request(tmp_path, stubs, run_dejavu):
+    legacy, migrated = stubs()
+    config = stub_config(legacy, migrated, body={"id": ["$range(0, 5)"]})
+    config["endpoints"]["pool"] = {"size": 2, "keep_alive": False}
+    write_config(tmp_path, config)
+    completed = run_dejavu("config.json")
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+    assert connections(completed.stdout) == (10, 0)
+    assert all(headers["Connection"] == "close" for _, _, headers, _ in legacy.received)
@@ -0,0 +1,60 @@
+import pytest
+
+import dejavu
+from conftest import echo, read_results, result_files, stub_config, write_config
+
+
+@pytest.mark.parametrize("value, shard", [("1/1", (0, 1)), ("2/4", (1, 4)), (" 3 / 3 ", (2, 3))])
+def test_parse_shard(value, shard):
+    assert dejavu.parse_shard(value) == shard
+
+
+@pytest.mark.parametrize("value", ["1", "0/2", "3/2", "1/0", "a/b", "-1/2"])
+def test_parse_shard_rejects_bad_shards(value):
+    with pytest.raises(SystemExit):
+        dejavu.parse_shard(value)
+
+
+def rejecting(method, path, headers, data):
+    if b'"id": ""' in data:
+        return 422, {}, b'{"error": "id"}'
+    return echo(method, path, headers, data)
+
+
+def finished_tests(file_path):
+    return sorted(repr((result["section"], result["attr"], result["value"], result["passed"])) for result in read_results(file_path))
+
+
+def test_shards_split_the_plan_and_merge_into_one_run(tmp_path, stubs, run_dejavu):
+    legacy, migrated = stubs(migrated=rejecting)
+    config = stub_config(legacy, migrated, query={"n": ["$range(0, 7)"]}, body={"id": [5, "", None], "name": ["x", "$omit"]})
+    write_config(tmp_path, config, "whole.json")
+    write_config(tmp_path, config)
+
+    for shard in ["1/2", "2/2"]:
+        completed = run_dejavu("config.json", "--shard", shard)
+        assert completed.returncode == 0, completed.stdout + completed.stderr
+    completed = run_dejavu("whole.json")
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+
+    first, second = result_files(tmp_path, ".results.ndjson")[:2]
+    assert ".shard-1-of-2" in first and ".shard-2-of-2" in second
+    whole, = [file_path for file_path in result_files(tmp_path, ".results.ndjson") if "whole-" in file_path]
+    assert set(finished_tests(first)).isdisjoint(finished_tests(second))
+    assert sorted(finished_tests(first) + finished_tests(second)) == finished_tests(whole)
+
+    completed = run_dejavu("merge", "config.json", first, second, headless=False)
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+    merged, = [file_path for file_path in result_files(tmp_path, ".results.ndjson") if ".merged" in file_path]
+    assert finished_tests(merged) == finished_tests(whole)
+    report_file_path, = [file_path for file_path in result_files(tmp_path, ".results.md") if ".merged" in file_path]
+    with open(report_file_path) as file:
+        report = file.read()
+    assert ">1 (11.11%)<" in report and "**Merged From**" in report
+
+
+def test_merge_refuses_a_missing_results_file(tmp_path, stubs, run_dejavu):
+    legacy, migrated = stubs()
+    write_config(tmp_path, stub_config(legacy, migrated))
+    completed = run_dejavu("merge", "config.json", "missing.results.ndjson", headless=False)
+    assert "does not exist" in completed.stdout
@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+import dejavu
+
+
+def test_options_chain_literals_and_sources():
+    options = dejavu.preprocess([1, "$range(0, 3)", "x", "$range(4, 11, step=3, zfill=3)"])
+    assert list(options) == [1, 0, 1, 2, "x", "004", "007", "010"]
+    assert len(options) == 8
+    assert [options[index] for index in range(len(options))] == list(options)
+    assert options[-1] == "010"
+    with pytest.raises(IndexError):
+        options[8]
+
+
+def test_huge_ranges_are_never_expanded():
+    options = dejavu.preprocess(["$range(0, 10000000000, zfill=11)"])
+    assert len(options) == 10000000000
+    assert options[9999999999] == "09999999999"
+
+
+@pytest.mark.parametrize("lines", [0, 1, 1023, 1024, 1025, 5000])
+def test_file_source_reads_any_line(tmp_path, lines):
+    file_path = tmp_path / "ids.txt"
+    file_path.write_text("".join(f"id-{number}\n" for number in range(lines)))
+    options = dejavu.preprocess([f"$file({file_path})"])
+    assert len(options) == lines
+    assert list(options) == [f"id-{number}" for number in range(lines)]
+    for index in [0, lines // 2, lines - 1]:
+        if lines > 0:
+            assert options[index] == f"id-{index}"
+
+
+def test_file_source_without_a_last_newline(tmp_path):
+    file_path = tmp_path / "ids.txt"
+    file_path.write_bytes(b"a\r\nb\r\nc")
+    assert list(dejavu.preprocess([f"$file({file_path})"])) == ["a", "b", "c"]
+
+
+def test_jsonl_source_parses_every_line(tmp_path):
+    file_path = tmp_path / "addresses.jsonl"
+    values = [{"zip": "53703"}, [1, 2], None, "text"]
+    file_path.write_text("".join(json.dumps(value) + "\n" for value in values))
+    options = dejavu.preprocess([f"$jsonl({file_path})"])
+    assert list(options) == values
+    assert options[1] == [1, 2]
+
+
+def test_sample_is_repeatable_and_in_order():
+    first = list(dejavu.preprocess(["$range(0, 1000000) | $sample(50)"]))
+    assert first == list(dejavu.preprocess(["$range(0, 1000000) | $sample(50)"]))
+    assert first == sorted(set(first)) and len(first) == 50
+    assert first != list(dejavu.preprocess(["$range(0, 1000000) | $sample(50, seed=7)"]))
+    assert list(dejavu.preprocess(["$range(0, 3) | $sample(10)"])) == [0, 1, 2]
+
+
+@pytest.mark.parametrize("keyword", ["$range", "$file(missing.txt)", "$range(0, 3) | $shuffle()", "$range(0, 3) | $sample(many)"])
+def test_bad_sources_exit(keyword):
+    with pytest.raises(SystemExit):
+        dejavu.preprocess([keyword])
+
+
+def test_body_tests_read_sources_lazily(configure, tmp_path):
+    file_path = tmp_path / "ids.txt"
+    file_path.write_text("".join(f"{number}\n" for number in range(100000)))
+    configure({"body": {"id": ["stable", f"$file({file_path})"], "page": ["$range(0, 100000000)"]}})
+    tests = dejavu.body_tests()
+    assert [next(tests)[:2] for _ in range(2)] == [("id", "0"), ("id", "1")]
@@ -0,0 +1,73 @@
+import itertools
+import time
+import tracemalloc
+
+import pytest
+
+import dejavu
+
+
+def assert_covers(sizes, strength, rows):
+    for group in itertools.combinations(range(len(sizes)), min(strength, len(sizes))):
+        covered = set(tuple(row[attr] for attr in group) for row in rows)
+        assert covered == set(itertools.product(*[range(sizes[attr]) for attr in group])), group
+
+
+@pytest.mark.parametrize("sizes, strength", [
+    ([2, 2], 2),
+    ([2, 2, 2], 2),
+    ([3, 4, 2, 5], 2),
+    ([1, 3, 3], 2),
+    ([10, 2, 7, 3, 3, 2], 2),
+    ([2, 3, 2, 2], 3),
+    ([3, 3, 3, 3, 3], 3),
+    ([4, 2, 3], 5),
+    ([100, 80, 3], 2),
+])
+def test_covering_rows_cover_every_combination(sizes, strength):
+    rows = list(dejavu.covering_rows(sizes, strength))
+    assert all(len(row) == len(sizes) and all(0 <= value < size for value, size in zip(row, sizes)) for row in rows)
+    assert_covers(sizes, strength, rows)
+    assert len(rows) == len(set(rows))
+
+
+def test_pairwise_is_smaller_than_exhaustive():
+    sizes = [3] * 6
+    rows = list(dejavu.covering_rows(sizes, 2))
+    assert_covers(sizes, 2, rows)
+    assert len(rows) < 3 ** 6 / 10
+
+
+def test_covering_rows_start_lazily_on_huge_option_spaces():
+    # Two lazy sources of 100k options each have 10^10 pairs, which must never be allocated up front
+    tracemalloc.start()
+    start = time.perf_counter()
+    rows = list(itertools.islice(dejavu.covering_rows([100000, 100000, 3], 2), 200))
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert len(set(rows)) == 200
+    assert peak < 10 * 1024 * 1024
+    assert seconds < 10
+
+
+def test_combination_tests_cover_every_pair(configure):
+    configure({"strategy": "pairwise", "query": {"a": [1, 2, 3], "b": ["x", "y"]}, "body": {"c": [True, False, None], "d": {"e": [1, "$omit"]}}})
+    values = {"query.a": [1, 2, 3], "query.b": ["x", "y"], "body.c": [True, False, None], "body.d.e": [1, "$omit"]}
+    rows = []
+    for attrs, options, _, _ in dejavu.combination_tests():
+        changed = dict(zip(attrs.split(", "), options))
+        rows.append(tuple(values[attr].index(changed[attr]) if attr in changed else 0 for attr in values))
+    # The all stable row is the baseline, which is never a combination test
+    assert_covers([len(options) for options in values.values()], 2, rows + [(0, 0, 0, 0)])
+
+
+def test_exhaustive_tests_every_combination(configure):
+    configure({"strategy": "exhaustive", "query": {"a": [1, 2, 3]}, "body": {"c": [True, False], "d": [1, 2]}})
+    assert len(list(dejavu.combination_tests())) == 3 * 2 * 2 - 1
+
+
+def test_pairwise_over_lazy_ranges_starts_right_away(configure):
+    configure({"strategy": "pairwise", "query": {"a": ["$range(0, 100000)"], "b": ["$range(0, 100000)"]}})
+    tests = list(itertools.islice(dejavu.combination_tests(), 5))
+    assert len(tests) == 5
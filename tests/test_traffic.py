@@ -0,0 +1,104 @@
+import json
+
+import pytest
+import requests
+
+import dejavu
+from conftest import echo, read_results, result_files, stub_config, write_config
+
+
+def write_har(file_path, entries):
+    with open(file_path, 'w', encoding='utf-8') as file:
+        json.dump({"log": {"version": "1.2", "creator": {"name": "test"}, "entries": entries}}, file)
+
+
+def har_entry(method, url, text="", started="2026-10-01T12:00:00.000Z"):
+    return {
+        "startedDateTime": started,
+        "request": {"method": method, "url": url, "headers": [{"name": "X-Test", "value": "1"}], "postData": {"text": text}},
+        "response": {"status": 200}
+    }
+
+
+def test_har_requests(tmp_path):
+    file_path = str(tmp_path / "capture.har")
+    # Larger than the window the entries are read through, so it has to grow
+    huge = json.dumps({"blob": "y" * (3 * 1024 * 1024)})
+    write_har(file_path, [
+        har_entry("post", "https://api.example.com/items/1", '{"id": 1}'),
+        har_entry("GET", "https://api.example.com/items/2?expand=true", started="2026-10-01T12:00:01.500Z"),
+        har_entry("PUT", "https://api.example.com/items/3", huge),
+    ])
+    captured = list(dejavu.har_requests(file_path))
+    assert [request["method"] for request in captured] == ["POST", "GET", "PUT"]
+    assert captured[0]["data"] == b'{"id": 1}'
+    assert captured[0]["headers"] == {"X-Test": "1"}
+    assert captured[1]["time"] - captured[0]["time"] == 1.5
+    assert captured[2]["data"] == huge.encode()
+
+
+def test_har_requests_without_entries(tmp_path):
+    file_path = str(tmp_path / "empty.har")
+    write_har(file_path, [])
+    assert list(dejavu.har_requests(file_path)) == []
+
+
+@pytest.mark.parametrize("line", ["[1, 2]", "not json", '{"url": "http://x/items", "time": "yesterday"}'])
+def test_jsonl_requests_rejects_bad_lines(tmp_path, line):
+    file_path = str(tmp_path / "access.jsonl")
+    with open(file_path, 'w') as file:
+        file.write(line + "\n")
+    with pytest.raises(SystemExit):
+        list(dejavu.jsonl_requests(file_path))
+
+
+def test_map_custom_data_maps_values_equal_in_python():
+    mapping = {json.dumps(True): 1}
+    assert dejavu.map_custom_data(b'{"a": true}', mapping) == b'{"a": 1}'
+    # Unmapped bodies keep their exact bytes
+    assert dejavu.map_custom_data(b'{"a":  2}', mapping) == b'{"a":  2}'
+
+
+def test_compare_responses_reports_bodies_that_are_not_json():
+    def response(content):
+        response = requests.Response()
+        response.status_code = 200
+        response._content = content
+        return response
+
+    assert dejavu.compare_responses(response(b"<html>error</html>"), response(b'{"a": 1}')) == ([], {"root": {"old_value": "<html>error</html>", "new_value": '{"a": 1}'}})
+    assert dejavu.compare_responses(response(b"same"), response(b"same")) == ([], {})
+
+
+def test_traffic_is_replayed_against_both_endpoints(tmp_path, stubs, run_dejavu):
+    def html_error(method, path, headers, data):
+        if path.endswith("/2"):
+            return 502, {"Content-Type": "text/html"}, b"<html>bad gateway</html>"
+        return echo(method, path, headers, data)
+
+    legacy, migrated = stubs(migrated=html_error)
+    write_config(tmp_path, stub_config(legacy, migrated, custom={"$user": ["old-user", "new-user"]}))
+    with open(tmp_path / "access.jsonl", 'w') as file:
+        for logged in [
+            {"method": "POST", "url": "https://api.example.com/items/1?owner=old-user", "body": {"user": "old-user"}},
+            {"method": "POST", "url": "https://api.example.com/items/1?owner=old-user", "body": {"user": "old-user"}},
+            {"method": "POST", "url": "https://api.example.com/items/2", "body": "not json"},
+            {"method": "GET", "url": "https://api.example.com/items/3"},
+            {"method": "POST", "url": "https://api.example.com/other/4"},
+        ]:
+            file.write(json.dumps(logged) + "\n")
+
+    completed = run_dejavu("config.json", "--traffic", "access.jsonl")
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+    # No baseline is sent, only the two distinct requests to the endpoint
+    assert [(path, data) for _, path, _, data in legacy.received] == [("/items/1?owner=old-user", b'{"user": "old-user"}'), ("/items/2", b"not json")]
+    assert [(path, data) for _, path, _, data in migrated.received] == [("/items/1?owner=new-user", b'{"user": "new-user"}'), ("/items/2", b"not json")]
+
+    results = read_results(result_files(tmp_path, ".results.ndjson")[0])
+    assert [(result["section"], result["attr"], result["value"]) for result in results] == [
+        ("traffic", "/items/1?owner=old-user", "access.jsonl#1"), ("traffic", "/items/2", "access.jsonl#3")
+    ]
+    assert [discrepency["kind"] for discrepency in results[1]["discrepencies"]] == ["status"]
+    report_file_path, = result_files(tmp_path, ".results.md")
+    with open(report_file_path) as file:
+        assert "1 duplicates and 2 requests to other endpoints skipped" in file.read()